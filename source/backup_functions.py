@@ -0,0 +1,1223 @@
+import concurrent.futures, contextlib, threading, datetime, hashlib, sqlite3, tarfile, shutil, struct, lzma, gzip, time, json, os, re
+try: import zstandard  # Optional, for zstd compressed archive backups.
+except ImportError: zstandard = None
+try: import psutil  # Optional, to prune backups with idle I/O priority.
+except ImportError: psutil = None
+try: import fcntl  # For reflink copies, Linux only.
+except ImportError: fcntl = None
+
+copy_buffer_size = 8 * 1024 * 1024  # Read/write buffer size when copy_file_range isn't available.
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024: break
+        size /= 1024
+    return f"{size:.1f}{unit}"
+
+class Progress:
+    """
+    Thread safe progress counter for copy, backup, restore, and delete jobs.
+    callback(progress) gets called from worker threads after each file.
+    """
+
+    def __init__(self, files_total=0, bytes_total=0, callback=None):
+        self.files_total, self.bytes_total = files_total, bytes_total
+        self.files_done = self.bytes_done = 0
+        self.bytes_stored = 0  # Bytes actually written to backups folder, less than bytes_done if files are deduplicated/compressed.
+        self.callback = callback
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, bytes_done, files_done=1):
+        with self.lock:
+            self.files_done += files_done
+            self.bytes_done += bytes_done
+        if self.callback: self.callback(self)
+
+    def add_stored(self, bytes_stored):
+        with self.lock: self.bytes_stored += bytes_stored
+
+    def eta(self):
+        """Estimated seconds left, going by bytes (or files if no bytes) done so far. None if nothing done yet."""
+
+        done, total = (self.bytes_done, self.bytes_total) if self.bytes_total else (self.files_done, self.files_total)
+        if not done: return None
+        return (time.monotonic() - self.start) * (total - done) / done
+
+    def __str__(self):
+        eta = self.eta()
+        eta = f"{int(eta // 60)}m {int(eta % 60)}s" if eta is not None else '?'
+        return f"{self.files_done}/{self.files_total} files, {format_size(self.bytes_done)}/{format_size(self.bytes_total)}, ETA {eta}"
+
+def scan_tree(src, follow_links=True):
+    """
+    Lists folder contents.
+
+    Args:
+        follow_links [bool:True]: Symlinks get scanned as the folder/file they point to (like shutil.copytree()), so backups include linked data.
+            Broken links and links to a folder they're in (loops) are listed as links instead. If False (e.g. for deleting), all symlinks are listed as links.
+
+    Returns:
+        tuple: List of sub folders, list of (relative path, os.stat_result) for files, and list of (relative path, link target) for symlinks.
+            Paths relative to src.
+    """
+
+    dirs, files, links = [], [], []
+
+    def add_link(rel_path, path):
+        try: links.append((rel_path, os.readlink(path)))
+        except OSError: pass  # Deleted while scanning.
+
+    for root, dir_names, file_names in os.walk(src, followlinks=follow_links):
+        rel_root = os.path.relpath(root, src)
+        if rel_root != '.': dirs.append(rel_root)
+        real_root = os.path.realpath(root)
+        for name in list(dir_names):
+            path = os.path.join(root, name)
+            if not os.path.islink(path): continue
+            target = os.path.realpath(path)
+            if not follow_links or real_root == target or real_root.startswith(target.rstrip(os.sep) + os.sep):
+                dir_names.remove(name)
+                add_link(os.path.normpath(os.path.join(rel_root, name)), path)
+
+        for file in file_names:
+            path, rel_path = os.path.join(root, file), os.path.normpath(os.path.join(rel_root, file))
+            try:
+                if not follow_links and os.path.islink(path): add_link(rel_path, path)
+                else: files.append((rel_path, os.stat(path)))
+            except FileNotFoundError:
+                if os.path.islink(path): add_link(rel_path, path)  # Broken link, else deleted while scanning.
+    return dirs, files, links
+
+class HashingReader:
+    """Wraps binary file, hashing everything read through it (blake2b, same as hash_file())."""
+
+    def __init__(self, file):
+        self.file = file
+        self.digest = hashlib.blake2b(digest_size=20)
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self): return self.digest.hexdigest()
+
+def copy_file(src, dst, digest=False):
+    """
+    Copies file contents and permission bits/times. Uses copy_file_range (in kernel copy) if available, else large buffered reads/writes.
+
+    Args:
+        digest [bool:False]: Also hash contents in the same pass, data goes through userspace instead of copy_file_range.
+
+    Returns:
+        str: blake2b hex digest of copied contents if digest is True.
+    """
+
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        copied = False
+        if digest:
+            reader = HashingReader(src_file)
+            shutil.copyfileobj(reader, dst_file, copy_buffer_size)
+            copied = True
+        elif hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(src_file.fileno(), dst_file.fileno(), copy_buffer_size): pass
+                copied = True
+            except OSError:  # e.g. not supported between these filesystems.
+                src_file.seek(0)
+                dst_file.seek(0)
+                dst_file.truncate()
+        if not copied: shutil.copyfileobj(src_file, dst_file, copy_buffer_size)
+    shutil.copystat(src, dst)
+    if digest: return reader.hexdigest()
+
+FICLONE = 0x40049409  # ioctl from linux/fs.h
+
+def clone_file(src, dst):
+    """Reflink copy, dst shares src's data blocks until either is modified (copy-on-write). Raises OSError if filesystem can't (needs btrfs/XFS, same filesystem)."""
+
+    if fcntl is None: raise OSError("Reflinks not supported on this platform.")
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+    shutil.copystat(src, dst)
+
+# (src device, dst device): copy mode, so detection only runs once.
+copy_modes = {}
+
+def detect_copy_mode(src, dst):
+    """
+    Finds fastest way to snapshot files from src folder into dst folder, by trying it with a test file in dst.
+
+    Returns:
+        str: 'reflink' if src and dst are on same filesystem and it supports FICLONE (btrfs, XFS), else 'hardlink' if dst's filesystem supports hard links, else 'copy'.
+    """
+
+    os.makedirs(dst, exist_ok=True)
+    key = (os.stat(src).st_dev, os.stat(dst).st_dev)
+    if key in copy_modes: return copy_modes[key]
+
+    mode, test_path = 'copy', os.path.join(dst, f".copy_mode_test_{os.getpid()}")
+    try:
+        with open(test_path, 'wb') as file: file.write(b'test')
+        if key[0] == key[1]:
+            try:
+                clone_file(test_path, test_path + '.reflink')
+                mode = 'reflink'
+            except OSError: pass
+        if mode == 'copy':
+            try:
+                os.link(test_path, test_path + '.hardlink')
+                mode = 'hardlink'
+            except OSError: pass
+    finally:
+        for path in [test_path, test_path + '.reflink', test_path + '.hardlink']:
+            if os.path.lexists(path): os.remove(path)
+
+    copy_modes[key] = mode
+    return mode
+
+def copy_tree(src, dst, workers=4, progress=None, mode='copy', link_dest=None, hash_files=False, known_hashes=None):
+    """
+    Copies folder using a pool of worker threads, for storage that can do many reads/writes at once (NVMe, RAID).
+    Files that can't be reflinked or hard linked get copied normally.
+
+    Args:
+        src str: Folder to copy.
+        dst str: New folder, must not exist.
+        workers [int:4]: Number of threads.
+        progress [callable:None]: Called with Progress object after each file.
+        mode [str:copy]: 'reflink' to clone files (see detect_copy_mode()), 'hardlink' to hard link files unchanged since link_dest, or 'copy'.
+        link_dest [str:None]: Previous copy of src (e.g. last folder backup) for 'hardlink' mode, files with same size and mtime get linked to it.
+            Only use for backups, which never get modified in place.
+        hash_files [bool:False]: Hash files while copying, for verify_backup().
+        known_hashes [dict:None]: Previous backup's {relative path: {'size', 'hash', 'mtime_ns'}}, so hard linked files don't need hashing,
+            and neither do reflinked files with same size and mtime.
+
+    Returns:
+        dict: Number of files that got 'reflink', 'hardlink', or 'copy', 'stored_size' (bytes actually written),
+              and 'files' ({relative path: {'size', 'hash', 'mtime_ns'}}) if hash_files. mtime_ns is from before file got copied.
+    """
+
+    dirs, files, links = scan_tree(src)
+    tracker = Progress(len(files), sum(stat.st_size for _, stat in files), progress)
+
+    os.makedirs(dst)
+    for folder in dirs:
+        os.makedirs(os.path.join(dst, folder), exist_ok=True)
+    for rel_path, target in links:
+        os.symlink(target, os.path.join(dst, rel_path))
+
+    def snapshot(src_path, dst_path, rel_path, stat):
+        """Returns how file got copied, and hash of its contents if hash_files."""
+
+        if mode == 'reflink':
+            try:
+                clone_file(src_path, dst_path)
+                if not hash_files: return 'reflink', None
+                # Clone gets src's mtime at time of cloning, so it only matches if file wasn't modified since previous backup.
+                known, cloned = (known_hashes or {}).get(rel_path), os.stat(dst_path)
+                if known and known['size'] == cloned.st_size and known.get('mtime_ns') == cloned.st_mtime_ns: return 'reflink', known['hash']
+                return 'reflink', hash_file(dst_path)
+            except FileNotFoundError: raise
+            except OSError: pass  # e.g. file on another filesystem mounted inside src.
+        elif mode == 'hardlink' and link_dest:
+            try:
+                previous = os.stat(os.path.join(link_dest, rel_path))
+                if previous.st_size == stat.st_size and previous.st_mtime_ns == stat.st_mtime_ns:
+                    os.link(os.path.join(link_dest, rel_path), dst_path)
+                    known = (known_hashes or {}).get(rel_path)
+                    if not hash_files: return 'hardlink', None
+                    return 'hardlink', known['hash'] if known and known['size'] == stat.st_size else hash_file(dst_path)
+            except OSError: pass
+        digest = copy_file(src_path, dst_path, hash_files)
+        tracker.add_stored(stat.st_size)
+        return 'copy', digest
+
+    counts, hashes = {'reflink': 0, 'hardlink': 0, 'copy': 0}, {}
+    def copy(item):
+        rel_path, stat = item
+        try:
+            how, digest = snapshot(os.path.join(src, rel_path), os.path.join(dst, rel_path), rel_path, stat)
+            with tracker.lock:
+                counts[how] += 1
+                if hash_files: hashes[rel_path] = {'size': os.path.getsize(os.path.join(dst, rel_path)), 'hash': digest, 'mtime_ns': stat.st_mtime_ns}
+        except FileNotFoundError: pass
+        tracker.add(stat.st_size)
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        list(pool.map(copy, files))
+
+    for folder in [''] + dirs:  # Copies folder permissions/times after files are done.
+        shutil.copystat(os.path.join(src, folder), os.path.join(dst, folder))
+    result = {**counts, 'stored_size': tracker.bytes_stored}
+    if hash_files: result['files'] = hashes
+    return result
+
+def remove_tree(path, workers=4, progress=None):
+    """Deletes folder, files are deleted by a pool of worker threads then folders bottom up. Symlinks get unlinked, never followed."""
+
+    dirs, files, links = scan_tree(path, follow_links=False)
+    files += links
+    tracker = Progress(len(files), 0, progress)
+
+    def remove(item):
+        try: os.remove(os.path.join(path, item[0]))
+        except FileNotFoundError: pass
+        tracker.add(0)
+
+    if workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            list(pool.map(remove, files))
+    else: list(map(remove, files))  # Stays on calling thread, e.g. so low_io_priority() applies.
+
+    for folder in sorted(dirs, key=lambda i: i.count(os.sep), reverse=True):
+        os.rmdir(os.path.join(path, folder))
+    os.rmdir(path)
+
+# Incremental backups: File contents are stored once in a content addressed store (.objects folder inside backups folder),
+# each backup is a small <backup name>.json manifest listing which stored object goes where.
+objects_folder = '.objects'
+manifest_ext = '.json'
+
+def objects_path(backups_path):
+    return os.path.join(backups_path, objects_folder)
+
+def object_path(backups_path, digest):
+    """Stored objects are split into sub folders by first 2 characters of hash, to keep folders small."""
+
+    return os.path.join(backups_path, objects_folder, digest[:2], digest)
+
+def manifest_path(backups_path, name):
+    return os.path.join(backups_path, name + manifest_ext)
+
+def hash_file(file_path):
+    """Returns blake2b hex digest of file contents."""
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        while data := file.read(1024 * 1024):
+            digest.update(data)
+    return digest.hexdigest()
+
+def store_file(backups_path, file_path, tracker=None):
+    """
+    Adds file to content addressed store, unless same contents are already stored.
+
+    Args:
+        backups_path str: Backups folder containing .objects store.
+        file_path str: File to store.
+        tracker [Progress:None]: Counts bytes written to store.
+
+    Returns:
+        str: Hash of stored contents.
+    """
+
+    digest = hash_file(file_path)
+    if os.path.isfile(object_path(backups_path, digest)): return digest
+
+    # File may change while being copied (server still running), so the hash of what was actually copied is used.
+    temp_path = os.path.join(objects_path(backups_path), f"tmp_{os.getpid()}_{threading.get_ident()}_{digest}")
+    copy_digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(file_path, 'rb') as src, open(temp_path, 'wb') as dst:
+            while data := src.read(1024 * 1024):
+                copy_digest.update(data)
+                dst.write(data)
+        digest = copy_digest.hexdigest()
+
+        os.makedirs(os.path.dirname(object_path(backups_path, digest)), exist_ok=True)
+        os.replace(temp_path, object_path(backups_path, digest))
+    except BaseException:  # E.g. disk full, collect_garbage() never deletes tmp_ files.
+        if os.path.isfile(temp_path): os.remove(temp_path)
+        raise
+    if tracker: tracker.add_stored(os.path.getsize(object_path(backups_path, digest)))
+    return digest
+
+def store_bytes(backups_path, data, tracker=None):
+    """Adds data to content addressed store if not already stored, tracker (Progress) counts bytes written. Returns hash."""
+
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    stored_path = object_path(backups_path, digest)
+    if not os.path.isfile(stored_path):
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        temp_path = os.path.join(objects_path(backups_path), f"tmp_{os.getpid()}_{threading.get_ident()}_{digest}")
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, stored_path)
+        except BaseException:
+            if os.path.isfile(temp_path): os.remove(temp_path)
+            raise
+        if tracker: tracker.add_stored(len(data))
+    return digest
+
+# ===== Region files (.mca)
+# First 4KiB sector is 1024 chunk locations (3 byte sector offset, 1 byte sector count), second is 1024 last modified timestamps.
+# Chunk data starts at its sector offset with 4 byte length followed by that many bytes (compression type + compressed data).
+sector_size = 4096
+
+def read_region_header(file):
+    """
+    Reads region file's chunk locations and timestamps.
+
+    Returns:
+        list: (chunk index, sector offset, sector count, timestamp) for each chunk present in file.
+    """
+
+    header = file.read(sector_size * 2)
+    if len(header) < sector_size * 2: raise ValueError("Region file header too short.")
+
+    locations = struct.unpack('>1024I', header[:sector_size])
+    timestamps = struct.unpack('>1024I', header[sector_size:])
+    return [(index, location >> 8, location & 0xFF, timestamps[index]) for index, location in enumerate(locations) if location]
+
+def store_region_file(backups_path, file_path, previous_entry=None, tracker=None):
+    """
+    Stores region file per chunk. Chunks with same timestamp and length as in previous backup's entry aren't read, and chunk data is deduplicated in store,
+    so only changed chunks are added.
+
+    Args:
+        backups_path str: Backups folder containing .objects store.
+        file_path str: Region file.
+        previous_entry [dict:None]: Same region file's manifest entry from previous backup.
+        tracker [Progress:None]: Counts bytes written to store.
+
+    Returns:
+        list: [chunk index, timestamp, length, hash] for each chunk, goes in manifest entry's 'chunks'.
+    """
+
+    previous_chunks = {i[0]: i for i in (previous_entry or {}).get('chunks', [])}
+    chunks = []
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        for index, offset, count, timestamp in read_region_header(file):
+            if offset < 2 or (offset + count) * sector_size > size: raise ValueError(f"Bad chunk location in region file: {index}")
+
+            file.seek(offset * sector_size)
+            length = struct.unpack('>I', file.read(4))[0]
+            old = previous_chunks.get(index)
+            if old and old[1] == timestamp and old[2] == length and os.path.isfile(object_path(backups_path, old[3])):
+                chunks.append(old)
+                continue
+
+            data = file.read(length)
+            if len(data) != length: raise ValueError(f"Truncated chunk in region file: {index}")
+            chunks.append([index, timestamp, length, store_bytes(backups_path, struct.pack('>I', length) + data, tracker)])
+    return chunks
+
+def rebuild_region_file(backups_path, chunks, file_path):
+    """Writes region file from stored chunks, chunks get packed one after another starting at sector 2."""
+
+    locations, timestamps = [0] * 1024, [0] * 1024
+    with open(file_path, 'wb') as file:
+        file.seek(sector_size * 2)
+        sector = 2
+        for index, timestamp, length, digest in chunks:
+            with open(object_path(backups_path, digest), 'rb') as stored:
+                data = stored.read()
+            count = -(-len(data) // sector_size)
+            file.write(data + b'\0' * (count * sector_size - len(data)))
+            locations[index] = sector << 8 | min(count, 255)
+            timestamps[index] = timestamp
+            sector += count
+
+        file.seek(0)
+        file.write(struct.pack('>1024I', *locations) + struct.pack('>1024I', *timestamps))
+
+store_locks = {}  # Real path of backups folder: threading.RLock.
+store_locks_lock = threading.Lock()
+
+def store_lock(backups_path):
+    """
+    Lock for backups folder's store. Held while creating incremental backups and while deleting, pruning, or garbage collecting,
+    since objects a backup has stored (or found already stored) aren't referenced until its manifest gets written at the end.
+    """
+
+    with store_locks_lock: return store_locks.setdefault(os.path.realpath(backups_path), threading.RLock())
+
+def read_manifest(file_path):
+    with open(file_path) as file:
+        return json.load(file)
+
+def write_manifest(file_path, manifest):
+    """Writes to temporary file first so a half written manifest never exists."""
+
+    with open(file_path + '.tmp', 'w') as file:
+        file.write(json.dumps(manifest))  # json.dump() uses the much slower pure Python encoder, big manifests have a list per chunk.
+    os.replace(file_path + '.tmp', file_path)
+
+def list_manifests(backups_path):
+    """Returns list of backup names that have a manifest in backups folder."""
+
+    if not os.path.isdir(backups_path): return []
+    return [i[:-len(manifest_ext)] for i in os.listdir(backups_path) if i.endswith(manifest_ext)]
+
+def backup_format(backups_path, name):
+    """Returns backup's format: 'incremental', 'archive', or 'folder' (plain copy). None if backup doesn't exist."""
+
+    if os.path.isfile(manifest_path(backups_path, name)):
+        return read_manifest(manifest_path(backups_path, name)).get('format', 'incremental')
+    if os.path.isdir(os.path.join(backups_path, name)): return 'folder'
+
+def backup_info(backups_path, name):
+    """
+    Gets backup's format and sizes, so all backup formats can be listed the same way.
+
+    Returns:
+        dict: 'format', 'size' (original bytes), 'stored_size' (bytes backup added to disk), 'file_count'. None if backup doesn't exist.
+    """
+
+    backup_type = backup_format(backups_path, name)
+    if backup_type == 'folder':
+        dirs, files, links = scan_tree(os.path.join(backups_path, name))
+        size = sum(stat.st_size for _, stat in files)
+        return {'format': 'folder', 'size': size, 'stored_size': size, 'file_count': len(files)}
+    elif backup_type:
+        manifest = read_manifest(manifest_path(backups_path, name))
+        return {'format': backup_type, 'size': manifest.get('size'), 'stored_size': manifest.get('stored_size'), 'file_count': manifest.get('file_count')}
+
+def latest_manifest(backups_path):
+    """Returns most recent incremental backup manifest in backups folder, used to skip rehashing unchanged files. None if there isn't one."""
+
+    manifests = []
+    for name in list_manifests(backups_path):
+        try: manifests.append(read_manifest(manifest_path(backups_path, name)))
+        except (OSError, ValueError): pass
+    manifests = [i for i in manifests if i.get('format', 'incremental') == 'incremental']
+    if manifests: return max(manifests, key=lambda i: i.get('created', ''))
+
+def create_incremental_backup(src, backups_path, name, info=None, workers=4, progress=None):
+    """
+    Backs up src folder into backups_path content addressed store, and writes manifest for it.
+    Files with same size and modified time as in the latest manifest aren't read again, and contents already in store are never written twice.
+
+    Args:
+        src str: Folder to backup.
+        backups_path str: Backups folder, store and manifest go here.
+        name str: Backup name, manifest will be <name>.json.
+        info [dict:None]: Extra info saved in manifest, e.g. server version.
+        workers [int:4]: Number of threads storing files.
+        progress [callable:None]: Called with Progress object after each file.
+
+    Returns:
+        dict: The new manifest.
+    """
+
+    with store_lock(backups_path):
+        os.makedirs(objects_path(backups_path), exist_ok=True)
+        previous = latest_manifest(backups_path) or {}
+        previous_files = previous.get('files', {})
+
+        dirs, files, links = scan_tree(src)
+        tracker = Progress(len(files), sum(stat.st_size for _, stat in files), progress)
+        manifest = {'name': name, 'created': datetime.datetime.now().isoformat(timespec='seconds'), 'format': 'incremental', 'dirs': dirs, 'files': {}, 'links': dict(links)}
+        manifest.update(info or {})
+
+        def backup_file(item):
+            rel_path, stat = item
+            file_path = os.path.join(src, rel_path)
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'mode': stat.st_mode & 0o7777}
+            old = previous_files.get(rel_path)
+            try:
+                if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime and all(os.path.isfile(object_path(backups_path, i)) for i in entry_hashes(old)):
+                    entry = old
+                else:
+                    if rel_path.endswith('.mca'):
+                        try: entry['chunks'] = store_region_file(backups_path, file_path, old, tracker)
+                        except (ValueError, struct.error): pass  # Not a valid region file, stored as a whole.
+                    if 'chunks' not in entry:
+                        entry['hash'] = store_file(backups_path, file_path, tracker)
+            except FileNotFoundError: entry = None  # Deleted while backing up.
+
+            tracker.add(stat.st_size)
+            return entry
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            for (rel_path, _), entry in zip(files, pool.map(backup_file, files)):
+                if entry is not None: manifest['files'][rel_path] = entry
+
+        manifest.update({'size': tracker.bytes_total, 'stored_size': tracker.bytes_stored, 'file_count': len(manifest['files'])})
+        write_manifest(manifest_path(backups_path, name), manifest)
+        return manifest
+
+def entry_hashes(entry):
+    """Returns stored object hashes a manifest file entry uses, one for whole files or one per chunk for region files."""
+
+    if 'chunks' in entry: return [i[3] for i in entry['chunks']]
+    return [entry['hash']]
+
+def restore_incremental_backup(backups_path, name, dst, workers=4, progress=None):
+    """
+    Rebuilds backed up folder from manifest and store.
+
+    Args:
+        backups_path str: Backups folder containing manifest and store.
+        name str: Backup name.
+        dst str: Folder to restore into, should be empty or not exist.
+        workers [int:4]: Number of threads writing files.
+        progress [callable:None]: Called with Progress object after each file.
+    """
+
+    manifest = read_manifest(manifest_path(backups_path, name))
+    tracker = Progress(len(manifest['files']), sum(entry['size'] for entry in manifest['files'].values()), progress)
+
+    os.makedirs(dst, exist_ok=True)
+    for folder in manifest['dirs']:
+        os.makedirs(os.path.join(dst, folder), exist_ok=True)
+    for rel_path, target in manifest.get('links', {}).items():
+        os.symlink(target, os.path.join(dst, rel_path))
+
+    def restore_file(item):
+        rel_path, entry = item
+        file_path = os.path.join(dst, rel_path)
+        if 'chunks' in entry: rebuild_region_file(backups_path, entry['chunks'], file_path)
+        else: copy_file(object_path(backups_path, entry['hash']), file_path)
+        os.chmod(file_path, entry['mode'])
+        os.utime(file_path, (entry['mtime'], entry['mtime']))
+        tracker.add(entry['size'])
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        list(pool.map(restore_file, manifest['files'].items()))
+
+def collect_garbage(backups_path):
+    """
+    Deletes stored objects no manifest references anymore.
+
+    Returns:
+        int: Number of objects deleted.
+    """
+
+    with store_lock(backups_path):
+        referenced = set()
+        for name in list_manifests(backups_path):
+            manifest = read_manifest(manifest_path(backups_path, name))
+            if manifest.get('format', 'incremental') != 'incremental': continue
+            for entry in manifest['files'].values():
+                referenced.update(entry_hashes(entry))
+
+        deleted = 0
+        for root, dirs, files in os.walk(objects_path(backups_path)):
+            for file in files:
+                if file not in referenced and not file.startswith('tmp_'):  # tmp_ files are still being stored.
+                    os.remove(os.path.join(root, file))
+                    deleted += 1
+        return deleted
+
+def delete_incremental_backup(backups_path, name):
+    """
+    Deletes backup's manifest, then garbage collects objects only it used.
+
+    Returns:
+        int: Number of stored objects deleted.
+    """
+
+    with store_lock(backups_path):
+        os.remove(manifest_path(backups_path, name))
+        return collect_garbage(backups_path)
+
+# ===== Archive backups: Single compressed tar file per backup, written as a stream while reading files so there's no intermediate copy.
+archive_exts = {'zstd': '.tar.zst', 'xz': '.tar.xz', 'gzip': '.tar.gz'}
+
+def archive_compression(compression):
+    """Returns compression that'll actually be used, zstd falls back to gzip if zstandard module isn't installed."""
+
+    if compression not in archive_exts or (compression == 'zstd' and zstandard is None): return 'gzip'
+    return compression
+
+def open_compressor(file, compression, level=3, threads=0):
+    """Returns writable stream that compresses into open binary file. threads only used by zstd (-1 for all cores)."""
+
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(file, closefd=False)
+    elif compression == 'xz':
+        return lzma.LZMAFile(file, 'wb', preset=min(level, 9))
+    return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=max(1, min(level, 9)))
+
+def open_decompressor(file, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(file)
+    elif compression == 'xz':
+        return lzma.LZMAFile(file, 'rb')
+    return gzip.GzipFile(fileobj=file, mode='rb')
+
+def create_archive_backup(src, backups_path, name, info=None, compression='zstd', level=3, threads=0, progress=None):
+    """
+    Backs up src folder as a compressed tar archive, and writes manifest for it.
+
+    Args:
+        src str: Folder to backup.
+        backups_path str: Backups folder, archive and manifest go here.
+        name str: Backup name.
+        info [dict:None]: Extra info saved in manifest, e.g. server version.
+        compression [str:zstd]: zstd, xz, or gzip.
+        level [int:3]: Compression level.
+        threads [int:0]: zstd compression threads, -1 for all cores.
+        progress [callable:None]: Called with Progress object after each file.
+
+    Returns:
+        dict: The new manifest.
+    """
+
+    dirs, files, links = scan_tree(src)
+    tracker = Progress(len(files), sum(stat.st_size for _, stat in files), progress)
+    compression = archive_compression(compression)
+    archive = name + archive_exts[compression]
+    archive_path = os.path.join(backups_path, archive)
+
+    hashes = {}
+    with open(archive_path + '.tmp', 'wb') as file:
+        stream = open_compressor(file, compression, level, threads)
+        with tarfile.open(fileobj=stream, mode='w|', dereference=True) as tar:  # Followed links get stored as what they point to, like scan_tree().
+            for folder in dirs:
+                tar.add(os.path.join(src, folder), arcname=folder, recursive=False)
+            for rel_path, target in links:
+                tarinfo = tarfile.TarInfo(rel_path)
+                tarinfo.type, tarinfo.linkname = tarfile.SYMTYPE, target
+                tar.addfile(tarinfo)
+            for rel_path, stat in files:
+                try:  # Files get hashed as tarfile reads them, for verify_backup().
+                    tarinfo = tar.gettarinfo(os.path.join(src, rel_path), arcname=rel_path)
+                    if tarinfo.isreg():
+                        with open(os.path.join(src, rel_path), 'rb') as src_file:
+                            reader = HashingReader(src_file)
+                            tar.addfile(tarinfo, reader)
+                        hashes[tarinfo.name] = {'size': tarinfo.size, 'hash': reader.hexdigest()}
+                    else: tar.addfile(tarinfo)
+                except FileNotFoundError: pass  # Deleted while backing up.
+                tracker.add(stat.st_size)
+        stream.close()
+    os.replace(archive_path + '.tmp', archive_path)
+
+    manifest = {'name': name, 'created': datetime.datetime.now().isoformat(timespec='seconds'), 'format': 'archive', 'archive': archive, 'compression': compression,
+                'level': level, 'size': tracker.bytes_total, 'stored_size': os.path.getsize(archive_path), 'file_count': len(files), 'files': hashes}
+    manifest.update(info or {})
+    write_manifest(manifest_path(backups_path, name), manifest)
+    return manifest
+
+def check_member(member, dst):
+    """Raises ValueError if archive member would end up outside dst (absolute path, .., or link pointing out), for Pythons without tarfile's 'data' filter."""
+
+    root = os.path.realpath(dst)
+    target = os.path.realpath(os.path.join(root, member.name))
+    if os.path.commonpath([root, target]) != root: raise ValueError(f"Archive member outside destination: {member.name}")
+    if member.issym() or member.islnk():
+        link = os.path.realpath(os.path.join(os.path.dirname(target) if member.issym() else root, member.linkname))
+        if os.path.commonpath([root, link]) != root: raise ValueError(f"Archive link outside destination: {member.name} -> {member.linkname}")
+    if member.isdev(): raise ValueError(f"Archive member is a device: {member.name}")
+
+def restore_archive_backup(backups_path, name, dst, progress=None):
+    """
+    Extracts archive backup into dst folder, streaming straight from the compressed file.
+    Members that would be written outside dst (crafted or corrupt archive) raise tarfile.FilterError or ValueError,
+    except symlinks pointing outside dst (broken links kept by backup) which get skipped.
+    """
+
+    manifest = read_manifest(manifest_path(backups_path, name))
+    tracker = Progress(manifest.get('file_count') or 0, manifest.get('size') or 0, progress)
+
+    os.makedirs(dst, exist_ok=True)
+    with open(os.path.join(backups_path, manifest['archive']), 'rb') as file:
+        with tarfile.open(fileobj=open_decompressor(file, manifest['compression']), mode='r|') as tar:
+            for member in tar:
+                try:
+                    if hasattr(tarfile, 'data_filter'): tar.extract(member, dst, filter='data')
+                    else:
+                        check_member(member, dst)
+                        tar.extract(member, dst)
+                except (tarfile.TarError, ValueError):
+                    if member.issym(): continue
+                    raise
+                if member.isfile(): tracker.add(member.size)
+
+def delete_archive_backup(backups_path, name):
+    manifest = read_manifest(manifest_path(backups_path, name))
+    os.remove(os.path.join(backups_path, manifest['archive']))
+    os.remove(manifest_path(backups_path, name))
+
+# ===== All formats
+def restore_backup(backups_path, name, dst, workers=4, progress=None):
+    """Restores any format of backup into dst folder."""
+
+    backup_type = backup_format(backups_path, name)
+    if backup_type == 'incremental': restore_incremental_backup(backups_path, name, dst, workers, progress)
+    elif backup_type == 'archive': restore_archive_backup(backups_path, name, dst, progress)
+    elif backup_type == 'folder':
+        # Hard links would let server modify backup's files in place, so only reflinks.
+        mode = 'reflink' if detect_copy_mode(backups_path, os.path.dirname(os.path.abspath(dst))) == 'reflink' else 'copy'
+        copy_tree(os.path.join(backups_path, name), dst, workers, progress, mode)
+    else: raise FileNotFoundError(f"Backup not found: {name}")
+
+# Folder backups' file hashes go in .hashes/<name>.json, so they aren't inside the backup and don't get restored.
+hashes_folder = '.hashes'
+
+def hashes_path(backups_path, name):
+    return os.path.join(backups_path, hashes_folder, name + manifest_ext)
+
+def create_folder_backup(src, backups_path, name, workers=4, progress=None, mode='copy'):
+    """
+    Copies src folder into backups folder, saving hashes of every file (hashed while copying) for verify_backup().
+    In hardlink mode, files unchanged since most recent folder backup get linked to it. In hardlink and reflink modes, those files reuse its hashes.
+
+    Args:
+        src str: Folder to backup.
+        backups_path str: Backups folder.
+        name str: Backup name, new folder's name.
+        mode [str:copy]: See copy_tree().
+
+    Returns:
+        dict: copy_tree() counts, and 'copy_mode' that was actually used (e.g. first hardlink backup has nothing to link to).
+    """
+
+    previous = latest_folder_backup(backups_path) if mode in ('hardlink', 'reflink') else None
+    link_dest = previous if mode == 'hardlink' else None
+    known_hashes = {}
+    if previous:
+        try: known_hashes = read_manifest(hashes_path(backups_path, os.path.basename(previous)))['files']
+        except (OSError, ValueError, KeyError): pass
+
+    result = copy_tree(src, os.path.join(backups_path, name), workers, progress, mode, link_dest, True, known_hashes)
+    os.makedirs(os.path.join(backups_path, hashes_folder), exist_ok=True)
+    write_manifest(hashes_path(backups_path, name), {'name': name, 'created': datetime.datetime.now().isoformat(timespec='seconds'), 'files': result.pop('files')})
+    result['copy_mode'] = next((i for i in ('reflink', 'hardlink') if result[i]), 'copy')
+    return result
+
+def latest_folder_backup(backups_path):
+    """Returns path of most recently modified folder backup, for copy_tree()'s link_dest. None if there isn't one."""
+
+    folders = [os.path.join(backups_path, i) for i in list_backups(backups_path) if backup_format(backups_path, i) == 'folder']
+    if folders: return max(folders, key=os.path.getmtime)
+
+def delete_backup(backups_path, name, workers=4):
+    """Deletes any format of backup."""
+
+    backup_type = backup_format(backups_path, name)
+    if backup_type == 'incremental': delete_incremental_backup(backups_path, name)
+    elif backup_type == 'archive': delete_archive_backup(backups_path, name)
+    elif backup_type == 'folder':
+        remove_tree(os.path.join(backups_path, name), workers)
+        if os.path.isfile(hashes_path(backups_path, name)): os.remove(hashes_path(backups_path, name))
+    else: raise FileNotFoundError(f"Backup not found: {name}")
+
+def discard_backup(backups_path, name, workers=4):
+    """
+    Removes whatever a backup that failed partway left behind (partial folder, archive, manifest, hashes, or their .tmp files),
+    then stored objects nothing references, so it doesn't get listed as a valid backup.
+    """
+
+    paths = [manifest_path(backups_path, name), hashes_path(backups_path, name)] + [os.path.join(backups_path, name + ext) for ext in archive_exts.values()]
+    paths += [i + '.tmp' for i in paths]
+    for path in paths:
+        if os.path.isfile(path): os.remove(path)
+    if os.path.isdir(os.path.join(backups_path, name)): remove_tree(os.path.join(backups_path, name), workers)
+    if os.path.isdir(objects_path(backups_path)): collect_garbage(backups_path)
+
+# ===== Staged restores: Restore into a staging folder while server keeps running, then swap folders with renames once it's stopped.
+# Staging and rollback folders go in work_path (default is dst's parent folder), which has to be on the same filesystem as dst for renames.
+def staging_path(dst, work_path=None): return os.path.join(work_path or os.path.dirname(dst), os.path.basename(dst) + '.restore')
+
+def rollback_path(dst, work_path=None): return os.path.join(work_path or os.path.dirname(dst), os.path.basename(dst) + '.rollback')
+
+def stage_restore(backups_path, name, dst, workers=4, progress=None, work_path=None):
+    """
+    Restores any format of backup into dst's staging folder, so swap_restore() can swap it in with renames.
+    Note: Needs enough free space for a second copy of dst.
+
+    Returns:
+        str: Staging folder path.
+    """
+
+    staging = staging_path(dst, work_path)
+    if os.path.lexists(staging): remove_tree(staging, workers)  # Leftover from unfinished restore.
+    os.makedirs(os.path.dirname(staging), exist_ok=True)
+    restore_backup(backups_path, name, staging, workers, progress)
+    return staging
+
+def swap_restore(dst, workers=4, work_path=None):
+    """
+    Swaps staged restore in for dst using renames. Current dst becomes rollback folder, previous rollback folder gets deleted after the swap.
+
+    Returns:
+        bool: False if there's no staged restore.
+    """
+
+    staging, rollback = staging_path(dst, work_path), rollback_path(dst, work_path)
+    if not os.path.isdir(staging): return False
+
+    old_rollback = rollback + '.old'
+    if os.path.lexists(old_rollback): remove_tree(old_rollback, workers)
+    if os.path.lexists(rollback): os.rename(rollback, old_rollback)
+    if os.path.lexists(dst): os.rename(dst, rollback)
+    try: os.rename(staging, dst)
+    except OSError:  # Put things back the way they were.
+        if os.path.lexists(rollback): os.rename(rollback, dst)
+        if os.path.lexists(old_rollback): os.rename(old_rollback, rollback)
+        raise
+
+    if os.path.lexists(old_rollback): remove_tree(old_rollback, workers)
+    return True
+
+def rollback_restore(dst, work_path=None):
+    """
+    Swaps dst with its rollback folder (what was there before last restore or reset), calling it again undoes the rollback.
+
+    Returns:
+        bool: False if there's no rollback folder.
+    """
+
+    rollback = rollback_path(dst, work_path)
+    temp = rollback[:-len('.rollback')] + '.swap'
+    if not os.path.isdir(rollback): return False
+
+    if os.path.lexists(dst): os.rename(dst, temp)
+    os.rename(rollback, dst)
+    if os.path.lexists(temp): os.rename(temp, rollback)
+    return True
+
+def reset_folder(dst, workers=4, work_path=None):
+    """Swaps in an empty folder for dst, keeping current dst as rollback folder."""
+
+    staging = staging_path(dst, work_path)
+    if os.path.lexists(staging): remove_tree(staging, workers)
+    os.makedirs(staging)
+    return swap_restore(dst, workers, work_path)
+
+def move_restore_folders(dst, work_path):
+    """Moves staging/rollback folders left next to dst (where they used to go) into work_path."""
+
+    for old, new in [(staging_path(dst), staging_path(dst, work_path)), (rollback_path(dst), rollback_path(dst, work_path))]:
+        if os.path.isdir(old) and not os.path.lexists(new):
+            os.makedirs(work_path, exist_ok=True)
+            os.rename(old, new)
+
+def list_backups(backups_path):
+    """
+    Lists folder backups (plain copies), and incremental and archive backups (manifests) in backups folder.
+
+    Returns:
+        list: Backup names.
+    """
+
+    backups = []
+    for item in os.listdir(backups_path):
+        if item.startswith('.'): continue
+        if os.path.isdir(os.path.join(backups_path, item)): backups.append(item)
+        elif item.endswith(manifest_ext): backups.append(item[:-len(manifest_ext)])
+    return backups
+
+
+# ===== Catalog: SQLite table of backups in a backups folder, so listing doesn't need to scan folders and each backup keeps the same ID.
+catalog_file = '.catalog.sqlite3'
+catalog_columns = ('id', 'name', 'created', 'format', 'version', 'server', 'size', 'stored_size', 'file_count', 'tags', 'copy_mode')
+# Folder backups made by create_backup(): (2021-04-24 12-00) 1.16.5 name
+folder_name_pattern = re.compile(r'^\((\d{4}-\d\d-\d\d) (\d\d)-(\d\d)\) (\S+) ')
+
+def catalog_entry(backups_path, name):
+    """Builds catalog row (dict) for backup from its manifest, or for folder backups from folder name and contents. None if backup doesn't exist."""
+
+    info = backup_info(backups_path, name)
+    if info is None: return None
+    entry = {'name': name, 'created': None, 'version': None, 'server': None, **info}
+
+    if info['format'] == 'folder':
+        match = folder_name_pattern.match(name)
+        if match: entry.update(created=f"{match[1]}T{match[2]}:{match[3]}:00", version=match[4])
+        else: entry['created'] = datetime.datetime.fromtimestamp(os.path.getmtime(os.path.join(backups_path, name))).isoformat(timespec='seconds')
+    else:
+        manifest = read_manifest(manifest_path(backups_path, name))
+        entry.update(created=manifest.get('created'), version=manifest.get('version'), server=manifest.get('server'))
+    return entry
+
+class BackupCatalog:
+    """
+    Persistent list of backups in a backups folder, IDs are never reused so an ID from a listing always refers to the same backup.
+    Kept up to date by add()/remove() when backups are made or deleted, sync() picks up changes made outside the bot.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, backups_path):
+        self.backups_path = backups_path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(backups_path, catalog_file), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS backups (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, created TEXT, format TEXT, "
+                            "version TEXT, server TEXT, size INTEGER, stored_size INTEGER, file_count INTEGER)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS backups_created ON backups (created)")
+            existing = [row[1] for row in self.db.execute("PRAGMA table_info(backups)")]
+            for column in ('tags', 'copy_mode'):  # Catalogs made before these were added.
+                if column not in existing: self.db.execute(f"ALTER TABLE backups ADD COLUMN {column} TEXT")
+
+    def close(self):
+        with self.lock: self.db.close()
+
+    def add(self, entry):
+        """Adds or updates backup, entry is dict from catalog_entry(). Columns missing from entry (e.g. tags) are left as they are. Returns backup's ID."""
+
+        row = {column: entry[column] for column in catalog_columns[1:] if column in entry}
+        with self.lock, self.db:
+            self.db.execute(f"INSERT INTO backups ({', '.join(row)}) VALUES ({', '.join('?' * len(row))}) "
+                            f"ON CONFLICT(name) DO UPDATE SET {', '.join(f'{column}=excluded.{column}' for column in row)}", list(row.values()))
+            return self.db.execute("SELECT id FROM backups WHERE name=?", (entry['name'],)).fetchone()[0]
+
+    def add_backup(self, name):
+        """Reads backup's info from disk and adds it. Returns ID, or None if backup doesn't exist."""
+
+        entry = catalog_entry(self.backups_path, name)
+        if entry: return self.add(entry)
+
+    def remove(self, name):
+        with self.lock, self.db: self.db.execute("DELETE FROM backups WHERE name=?", (name,))
+
+    def set_tags(self, backup_id, tags):
+        """Replaces backup's tags with list of tags. Returns False if there's no backup with that ID."""
+
+        with self.lock, self.db:
+            return self.db.execute("UPDATE backups SET tags=? WHERE id=?", (','.join(tags) or None, backup_id)).rowcount > 0
+
+    def get(self, backup_id):
+        """Returns backup's row as dict, or None if there's no backup with that ID."""
+
+        with self.lock: row = self.db.execute("SELECT * FROM backups WHERE id=?", (backup_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=None, sort='created', descending=True, search=None, **filters):
+        """
+        Lists backups.
+
+        Args:
+            limit [int:None]: Max number of backups.
+            sort [str:created]: Column to sort by, e.g. created, size, name, id.
+            descending [bool:True]: Newest/biggest first.
+            search [str:None]: Only backups with this in their name.
+            filters: Column values to match exactly, e.g. version='1.16.5', server='papermc', format='archive'.
+
+        Returns:
+            list: Dicts with catalog_columns keys.
+        """
+
+        if sort not in catalog_columns: raise ValueError(f"Can't sort by: {sort}")
+        where, args = [], []
+        for column, value in filters.items():
+            if column not in catalog_columns: raise ValueError(f"Can't filter by: {column}")
+            where.append(f"{column}=?")
+            args.append(value)
+        if search:
+            where.append("name LIKE ?")
+            args.append(f"%{search}%")
+
+        query = "SELECT * FROM backups"
+        if where: query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {sort} {'DESC' if descending else 'ASC'}, id {'DESC' if descending else 'ASC'}"
+        if limit: query += f" LIMIT {int(limit)}"
+        with self.lock: return [dict(row) for row in self.db.execute(query, args)]
+
+    def sync(self):
+        """Adds backups that are on disk but not in catalog, and removes ones that no longer exist. Returns (added, removed) counts."""
+
+        on_disk = set(list_backups(self.backups_path))
+        with self.lock: cataloged = {row[0] for row in self.db.execute("SELECT name FROM backups")}
+
+        for name in on_disk - cataloged:
+            try: self.add_backup(name)
+            except (OSError, ValueError): pass
+        for name in cataloged - on_disk: self.remove(name)
+        return len(on_disk - cataloged), len(cataloged - on_disk)
+
+
+# ===== Retention: Grandfather-father-son pruning of old backups.
+def backup_tags(backup):
+    """Returns set of tags from catalog row."""
+    return set(filter(None, (backup.get('tags') or '').split(',')))
+
+def week_bucket(created):
+    return datetime.date.fromisoformat(created[:10]).isocalendar()[:2]
+
+def manifest_objects(manifest):
+    """Returns {object hash: size} of stored objects an incremental backup's manifest uses."""
+
+    objects = {}
+    for entry in manifest['files'].values():
+        if 'chunks' in entry: objects.update((i[3], i[2] + 4) for i in entry['chunks'])  # Stored with 4 byte length prefix.
+        else: objects[entry['hash']] = entry['size']
+    return objects
+
+def incremental_objects(backups_path):
+    """Returns {backup name: {object hash: size}} for every incremental backup in backups folder, for select_prune()."""
+
+    objects = {}
+    for name in list_manifests(backups_path):
+        manifest = read_manifest(manifest_path(backups_path, name))
+        if manifest.get('format', 'incremental') == 'incremental': objects[name] = manifest_objects(manifest)
+    return objects
+
+def select_prune(backups, keep_last=3, hourly=0, daily=0, weekly=0, monthly=0, max_size=0, protected_tags=(), objects=None):
+    """
+    Picks which backups a grandfather-father-son retention policy would delete. Keeps newest backup in each of the last
+    x hours/days/weeks/months that have backups, plus keep_last newest backups. Then if max_size is set, oldest kept backups
+    get pruned until their size fits under it (newest backup is always kept). Backups tagged with a protected tag, or of unknown age, are never pruned.
+
+    Size is approximate. Incremental backups share stored objects, so with objects each one counts what it uses that no newer kept backup does,
+    which adds up to the store's size. Without it (and for other formats) stored_size is used, for incremental backups that's only what
+    the backup added to store when it was made. Folder backups' stored_size doesn't count hard linked or reflinked files.
+
+    Args:
+        backups list: Catalog rows (dicts with name, created, stored_size, tags).
+        keep_last [int:3]: Always keep this many newest backups.
+        hourly, daily, weekly, monthly [int:0]: Number of periods to keep a backup for.
+        max_size [int:0]: Max total bytes, 0 for no cap.
+        protected_tags [list:()]: Tags that keep backups from being pruned.
+        objects [dict:None]: Incremental backups' stored objects, see incremental_objects().
+
+    Returns:
+        list: Catalog rows to prune, oldest first.
+    """
+
+    backups = sorted(backups, key=lambda i: i['created'] or '', reverse=True)
+    protected = {i['name'] for i in backups if backup_tags(i) & set(protected_tags)}
+    keep = {i['name'] for i in backups[:keep_last] if i['created']} | {i['name'] for i in backups if not i['created']}  # Unknown age, leave it alone.
+
+    for count, bucket in [(hourly, lambda i: i[:13]), (daily, lambda i: i[:10]), (weekly, week_bucket), (monthly, lambda i: i[:7])]:
+        buckets = set()
+        for backup in backups:
+            if not backup['created']: continue
+            key = bucket(backup['created'])
+            if key in buckets: continue
+            if len(buckets) >= count: break
+            buckets.add(key)
+            keep.add(backup['name'])
+
+    if max_size:
+        total, counted = 0, set()
+        for backup in backups:
+            if backup['name'] not in keep and backup['name'] not in protected: continue
+            if (used := (objects or {}).get(backup['name'])) is None: total += backup.get('stored_size') or 0
+            else:
+                total += sum(size for digest, size in used.items() if digest not in counted)
+                counted.update(used)
+            if total > max_size and backup is not backups[0] and backup['name'] not in protected and backup['created']: keep.discard(backup['name'])
+
+    return [i for i in reversed(backups) if i['name'] not in keep and i['name'] not in protected]
+
+@contextlib.contextmanager
+def low_io_priority():
+    """Runs block with idle I/O priority on current thread (Linux, needs psutil), so pruning doesn't slow down the server's disk access."""
+
+    thread = old = None
+    if psutil is not None and hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+        try:
+            thread = psutil.Process(threading.get_native_id())
+            old = thread.ionice()
+            thread.ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (psutil.Error, OSError): thread = None
+
+    try: yield
+    finally:
+        if thread is not None:  # Threads get reused by thread pools, so put priority back.
+            try: thread.ionice(old.ioclass, old.value or None)
+            except (psutil.Error, OSError, ValueError): pass
+
+def prune_backups(backups_path, names):
+    """
+    Deletes backups with idle I/O priority, one file at a time. Stored objects of incremental backups are garbage collected once at the end.
+
+    Returns:
+        list: Names of deleted backups.
+    """
+
+    deleted, incremental = [], False
+    with store_lock(backups_path), low_io_priority():
+        for name in names:
+            backup_type = backup_format(backups_path, name)
+            if backup_type == 'incremental':
+                os.remove(manifest_path(backups_path, name))
+                incremental = True
+            elif backup_type: delete_backup(backups_path, name, workers=1)
+            deleted.append(name)
+        if incremental: collect_garbage(backups_path)
+    return deleted
+
+
+# ===== Verification: Re-hashes backed up files and compares them to hashes saved when backup was made.
+def verify_incremental_backup(backups_path, name, workers=4, progress=None):
+    """Checks every stored object manifest uses still exists and matches its hash (objects are named by hash). Returns dict, see verify_backup()."""
+
+    manifest = read_manifest(manifest_path(backups_path, name))
+    users = {}  # Object hash: Files that use it.
+    for rel_path, entry in manifest['files'].items():
+        for digest in entry_hashes(entry): users.setdefault(digest, []).append(rel_path)
+    tracker = Progress(len(users), 0, progress)
+
+    def check(digest):
+        path = object_path(backups_path, digest)
+        try: result = None if hash_file(path) == digest else 'corrupt'
+        except FileNotFoundError: result = 'missing'
+        tracker.add(0)
+        return digest, result
+
+    problems = {'missing': set(), 'corrupt': set()}
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        for digest, result in pool.map(check, users):
+            if result: problems[result].update(users[digest])
+    return {'checked': len(manifest['files']), 'missing': sorted(problems['missing']), 'corrupt': sorted(problems['corrupt']), 'error': None}
+
+def verify_archive_backup(backups_path, name, progress=None):
+    """Streams through archive hashing each file, can't be split between threads. Returns dict, see verify_backup(), or None if archive has no hashes."""
+
+    manifest = read_manifest(manifest_path(backups_path, name))
+    if not manifest.get('files'): return None
+    remaining = dict(manifest['files'])
+    tracker = Progress(len(remaining), sum(entry['size'] for entry in remaining.values()), progress)
+
+    corrupt, error = [], None
+    try:
+        with open(os.path.join(backups_path, manifest['archive']), 'rb') as file:
+            with tarfile.open(fileobj=open_decompressor(file, manifest['compression']), mode='r|') as tar:
+                for member in tar:
+                    entry = remaining.pop(member.name, None)
+                    if entry is None or not member.isfile(): continue
+                    reader = HashingReader(tar.extractfile(member))
+                    while reader.read(copy_buffer_size): pass
+                    if reader.hexdigest() != entry['hash'] or member.size != entry['size']: corrupt.append(member.name)
+                    tracker.add(member.size)
+    except Exception as e: error = str(e) or type(e).__name__  # Truncated or corrupt archive, files after this point count as missing.
+    return {'checked': len(manifest['files']), 'missing': sorted(remaining), 'corrupt': corrupt, 'error': error}
+
+def verify_folder_backup(backups_path, name, workers=4, progress=None):
+    """Re-hashes folder backup's files in parallel. Returns dict, see verify_backup(), or None if backup has no hashes (made before hashes were saved)."""
+
+    try: hashes = read_manifest(hashes_path(backups_path, name))['files']
+    except FileNotFoundError: return None
+    tracker = Progress(len(hashes), sum(entry['size'] for entry in hashes.values()), progress)
+
+    def check(item):
+        rel_path, entry = item
+        path = os.path.join(backups_path, name, rel_path)
+        try: result = None if os.path.getsize(path) == entry['size'] and hash_file(path) == entry['hash'] else 'corrupt'
+        except FileNotFoundError: result = 'missing'
+        tracker.add(entry['size'])
+        return rel_path, result
+
+    problems = {'missing': [], 'corrupt': []}
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        for rel_path, result in pool.map(check, hashes.items()):
+            if result: problems[result].append(rel_path)
+    return {'checked': len(hashes), 'missing': sorted(problems['missing']), 'corrupt': sorted(problems['corrupt']), 'error': None}
+
+def verify_backup(backups_path, name, workers=4, progress=None):
+    """
+    Checks backup is complete and intact, any format.
+
+    Returns:
+        dict: 'ok' (bool), 'checked' (number of files), 'missing' and 'corrupt' (lists of relative paths), 'error' (str if archive couldn't be read).
+              None if backup has no hashes to check against.
+    """
+
+    backup_type = backup_format(backups_path, name)
+    if backup_type == 'incremental': result = verify_incremental_backup(backups_path, name, workers, progress)
+    elif backup_type == 'archive': result = verify_archive_backup(backups_path, name, progress)
+    elif backup_type == 'folder': result = verify_folder_backup(backups_path, name, workers, progress)
+    else: raise FileNotFoundError(f"Backup not found: {name}")
+
+    if result is not None: result['ok'] = not (result['missing'] or result['corrupt'] or result['error'])
+    return result
@@ -1,6 +1,6 @@
-import discord, asyncio, os, sys
+import discord, datetime, asyncio, time, os, sys, re
 from discord.ext import commands, tasks
-import server_functions
+import server_functions, log_functions
 from server_functions import lprint, use_rcon, format_args, mc_command, mc_status
 
 __version__ = "4.0.1"
@@ -24,6 +24,12 @@ bot = commands.Bot(command_prefix='?')
 @bot.event
 async def on_ready():
     await bot.wait_until_ready()
+    server_functions.start_loggers()  # Already started if run as script, only starts once.
+    server_functions.get_log_feed()  # Starts following latest.log.
+    server_functions.status_service.start()
+    if server_functions.server_files_access is True:
+        await server_functions.run_blocking(server_functions.detect_copy_modes)
+        asyncio.ensure_future(server_functions.run_blocking(server_functions.get_log_index().update))  # First run can take a while with lots of old logs.
 
     if server_functions.channel_id:
         channel = bot.get_channel(server_functions.channel_id)
@@ -31,6 +37,75 @@ async def on_ready():
 
     lprint(f"({__version__}) Bot PRIMED.")
 
+@bot.before_invoke
+async def before_command(ctx):
+    ctx.start_time = time.perf_counter()
+
+@bot.after_invoke
+async def after_command(ctx):
+    """Adds structured record of every used command, for ?botlog queries."""
+
+    duration = time.perf_counter() - getattr(ctx, 'start_time', time.perf_counter())
+    server_functions.log_command(ctx, duration, 'error' if ctx.command_failed else 'ok')
+
+async def run_with_progress(ctx, text, func, *args, **kwargs):
+    """
+    Runs blocking backup/restore function in thread pool, editing a single Discord message with its progress (files, bytes, ETA) until it's done.
+
+    Args:
+        ctx: Discord ctx object.
+        text str: Message text, progress gets added under it.
+        func: Function to run, must accept progress keyword argument.
+
+    Returns:
+        Whatever func returns.
+    """
+
+    message = await ctx.send(text)
+    status = {}
+    task = asyncio.ensure_future(server_functions.run_blocking(func, *args, progress=lambda progress: status.update(progress=progress), **kwargs))
+
+    last_update = ''
+    while not task.done():
+        await asyncio.wait([task], timeout=3)
+        if 'progress' in status and str(status['progress']) != last_update:
+            last_update = str(status['progress'])
+            await message.edit(content=f"{text}\n{last_update}")
+    return task.result()
+
+async def send_verify_result(ctx, result):
+    """
+    Sends summary of server_functions.verify_backup() result.
+
+    Returns:
+        bool: True if backup is OK, or has no hashes to check.
+    """
+
+    if result is None:
+        await ctx.send("**WARNING:** Backup has no saved hashes, can't verify it.")
+        return True
+    if result is False:
+        await ctx.send("**ERROR:** Could not verify backup!")
+        return False
+    if result['ok']:
+        await ctx.send(f"**Backup Verified:** {result['checked']} files OK :white_check_mark:")
+        return True
+
+    problems = [f"missing: `{i}`" for i in result['missing']] + [f"corrupt: `{i}`" for i in result['corrupt']]
+    text = '\n'.join(problems[:15]) + (f"\n...and {len(problems) - 15} more" if len(problems) > 15 else '')
+    if result['error']: text += f"\nArchive error: `{result['error']}`"
+    await ctx.send(f"**Backup Verification FAILED** :x: ({len(result['missing'])} missing, {len(result['corrupt'])} corrupt of {result['checked']} files)\n{text}")
+    return False
+
+def backup_field(backup):
+    """Embed field value for backup from server_functions.fetch_backups(), name plus format and sizes."""
+
+    info = backup[2]
+    if not info or info.get('size') is None: return f"`{backup[1]}`"
+    size = server_functions.backup_functions.format_size
+    backup_format = f"{info['format']} ({info['copy_mode']})" if info.get('copy_mode') else info['format']
+    return f"`{backup[1]}`\n{backup_format}, {size(info['size'])} ({size(info['stored_size'] or 0)} on disk)"
+
 
 # ========== Basics: Say, whisper, online players, server command pass through.
 class Basics(commands.Cog):
@@ -103,31 +178,32 @@ class Basics(commands.Cog):
 
     @commands.command(aliases=['pl', 'playerlist', 'listplayers', 'list'])
     async def players(self, ctx):
-        """Show list of online players."""
-
-        if not await mc_command("", bot_ctx=ctx): return
+        """Show list of online players, and how long they've been on."""
 
-        response = await mc_command("list")
+        # Roster follows join/leave events in server output, so usually there's no need to ask server.
+        if (players := await server_functions.get_roster()) is not None:
+            if not players:
+                await ctx.send("There are 0 players online. ¯\_(ツ)_/¯")
+            else:
+                now = time.time()
+                sessions = [f"`{name}`" + (f" ({int(now - start) // 3600}h {int(now - start) % 3600 // 60}m)" if start else '') for name, start in players]
+                await ctx.send(f"There are {len(players)} players online:\n" + '\n'.join(sessions))
+            lprint(ctx, "Fetched player list.")
+            return
 
-        if use_rcon is True: log_data = response
-        else:
-            await asyncio.sleep(2)
-            log_data = server_functions.mc_log('players online')
+        if not await mc_command("", bot_ctx=ctx): return
 
-        if not log_data:
+        event = await server_functions.mc_command_event("list", 'players')
+        if not event:
             await ctx.send("**ERROR:** Trouble fetching player list.")
             return False
 
-        log_data = log_data.split(':')
-        text = log_data[-2]
-        player_names = log_data[-1]
-        # If there's no players active, player_names will still contain some anso escape characters.
-        if len(player_names.strip()) < 5:
+        text = f"There are {event.online} of a max of {event.max} players online"
+        if not event.players:
             await ctx.send(f"{text}. ¯\_(ツ)_/¯")
         else:
-            # Outputs player names in special discord format. If using RCON, need to clip off 4 trailing unreadable characters.
-            players_names = [f"`{i.strip()[:-4]}`\n" if use_rcon else f"`{i.strip()}`\n" for i in (log_data[-1]).split(',')]
-            await ctx.send(text + ':\n' + ''.join(players_names))
+            # Outputs player names in special discord format.
+            await ctx.send(text + ':\n' + ''.join(f"`{player}`\n" for player in event.players))
 
         lprint(ctx, "Fetched player list.")
 
@@ -137,22 +213,18 @@ class Basics(commands.Cog):
         Shows chat log. Does not include whispers.
 
         Args:
-            lines [int:15]: How many log lines to look through. This is not how many chat lines to show.
+            lines [int:15]: How many most recent chat lines to show.
         """
 
         await ctx.send(f"***Loading {lines} Chat Log...*** :speech_balloon:")
 
-        log_data = server_functions.mc_log(']: <', match_lines=lines, filter_mode=True, return_reversed=True)
-        try: log_data = log_data.strip().split('\n')
-        except:
+        log_data = server_functions.get_log_lines(lines, 'chat')
+        if not log_data:
             await ctx.send("**ERROR:** Problem fetching chat logs, there may be nothing to fetch.")
             return False
 
         for line in log_data:
-            try:
-                line = line.split(']')
-                await ctx.send(f"`{str(line[0][1:] + ':' + line[2][1:])}`")
-            except: pass
+            await ctx.send(f"`{line.time}: {line.message}`")
 
         await ctx.send("-----END-----")
         lprint(ctx, f"Fetched chat.")
@@ -418,25 +490,16 @@ class Permissions(commands.Cog):
 
                 banned_players += data[0] + '.'  # Gets line that says 'There are x bans'.
 
-        else:
-            if log_data := server_functions.mc_log('banlist'):
-                for line in filter(None, log_data.split('\n')):  # Filters out blank lines you sometimes get.
-                    if 'There are no bans' in line:
-                        banned_players = 'No exiled ones!'
-                        break
-                    elif 'There are' in line:
-                        banned_players += line.split(':')[-2]
-                        break
-
-                    # Gets relevant data from current log line, and formats it for Discord output.
-                    # Example line: Slime was banned by Server: No reason given
-                    # Extracts Player name, who banned the player, and the reason.
-                    ban_log_line = line.split(':')[-2:]
-                    player = ban_log_line[0].split(' ')[1].strip()
-                    banner = ban_log_line[0].split(' ')[-1].strip()
-                    reason = ban_log_line[-1].strip()
-                    banned_players += f"`{player}` banned by `{banner}` : `{reason}`\n"
-            else: banned_players = '**ERROR:** Trouble fetching ban list.'
+        elif response:
+            events = response[1]
+            ban_count = log_functions.find_event(events, 'bancount')
+            if ban_count and ban_count.count == 0: banned_players = 'No exiled ones!'
+            else:
+                # Example line: Slime was banned by Server: No reason given
+                for ban in events:
+                    if ban.kind == 'ban': banned_players += f"`{ban.player}` banned by `{ban.banner}` : `{ban.reason}`\n"
+                if ban_count: banned_players += ban_count.message.rstrip(':')
+        else: banned_players = '**ERROR:** Trouble fetching ban list.'
 
         await ctx.send(banned_players)
         lprint(ctx, f"Fetched banned list.")
@@ -510,19 +573,15 @@ class Permissions(commands.Cog):
 
         # List whitelisted.
         elif not arg or arg == 'list':
-            if use_rcon:
-                log_data = await mc_command('whitelist list')
-                log_data = server_functions.remove_ansi(log_data).split(':')
-            else:
-                await mc_command('whitelist list')
-                # Parses log entry lines, separating 'There are x whitelisted players:' from the list of players.
-                log_data = server_functions.mc_log('whitelisted players:').split(':')[-2:]
-                await asyncio.sleep(2)
-
-            # Then, formats player names in Discord `player` markdown.
-            players = [f"`{player.strip()}`" for player in log_data[1].split(', ')]
-            await ctx.send(f"{log_data[0].strip()}\n{', '.join(players)}")
-            lprint(ctx, f"Showing whitelist: {log_data[1]}")
+            event = await server_functions.mc_command_event('whitelist list', 'whitelist')
+            if not event:
+                await ctx.send("**ERROR:** Trouble fetching whitelist.")
+                return False
+
+            # Formats player names in Discord `player` markdown.
+            players = [f"`{player}`" for player in event.players]
+            await ctx.send(f"{event.message.split(':')[0]}\n{', '.join(players)}")
+            lprint(ctx, f"Showing whitelist: {', '.join(event.players)}")
             return False
         else: await ctx.send("**ERROR:** Something went wrong.")
 
@@ -563,8 +622,7 @@ class Permissions(commands.Cog):
         if use_rcon:
             command_success = await mc_command(f"op {player}")
         else:
-            _, status_checker = await mc_command(f"op {player}")
-            command_success = server_functions.mc_log(player, stopgap_str=status_checker)
+            command_success = player.lower() in str(await mc_command(f"op {player}", stop_at_checker=False)).lower()
 
         if command_success:
             await mc_command(f"say ---INFO--- {player} is now OP : {reason}")
@@ -596,8 +654,7 @@ class Permissions(commands.Cog):
         if use_rcon:
             command_success = await mc_command(f"deop {player}")
         else:
-            _, status_checker = await mc_command(f"deop {player}")
-            command_success = server_functions.mc_log(player, stopgap_str=status_checker)
+            command_success = player.lower() in str(await mc_command(f"deop {player}", stop_at_checker=False)).lower()
 
         if command_success:
             await mc_command(f"say ---INFO--- {player} no longer OP : {reason}")
@@ -745,7 +802,7 @@ class Server(commands.Cog):
     async def autosave_loop(self):
         """Automatically sends save-all command to server at interval of x minutes."""
 
-        if not await mc_status():
+        if not await server_functions.status_service.get('online'):
             self.autosave_loop.cancel()
             lprint("Paused autosave loop, server currently inactive.")
             return False
@@ -763,21 +820,55 @@ class Server(commands.Cog):
     async def serverstatus(self, ctx):
         """Shows server active status, version, motd, and online players"""
 
+        # Values come from background refreshed cache, see server_functions.StatusService.
+        status = await server_functions.status_service.snapshot()
+        info, age = status.get('info') or {}, status['age']
+
         embed = discord.Embed(title='Server Status :gear:')
-        embed.add_field(name='Current Server', value=f"Status: {'**ACTIVE** :green_circle:' if await mc_status() is True else '**INACTIVE** :red_circle:'}\nServer: {server_functions.server_selected[0]}\nDescription: {server_functions.server_selected[1]}\n", inline=False)
-        embed.add_field(name='MOTD', value=f"{server_functions.get_mc_motd()}", inline=False)
-        embed.add_field(name='Version', value=f"{server_functions.mc_version()}", inline=False)
-        embed.add_field(name='Address', value=f"IP: `{server_functions.get_server_ip()}`\nURL: `{server_functions.server_url}` ({server_functions.check_server_url()})", inline=False)
+        embed.add_field(name='Current Server', value=f"Status: {'**ACTIVE** :green_circle:' if status.get('online') is True else '**INACTIVE** :red_circle:'}\nServer: {server_functions.server_selected[0]}\nDescription: {server_functions.server_selected[1]}\n", inline=False)
+        embed.add_field(name='MOTD', value=f"{info.get('motd', 'N/A')}", inline=False)
+        embed.add_field(name='Version', value=f"{info.get('version', 'N/A')}", inline=False)
+        embed.add_field(name='Address', value=f"IP: `{status.get('ip', 'N/A')}`\nURL: `{server_functions.server_url}` ({status.get('url', 'N/A')})", inline=False)
         embed.add_field(name='Autosave', value=f"Status: {'**ENABLED**' if server_functions.autosave_status is True else '**DISABLED**'}\nInterval: **{server_functions.autosave_interval}** minutes", inline=False)
+        if use_rcon is True:
+            rcon = server_functions.rcon_health()
+            embed.add_field(name='RCON', value=f"Connection: {'**CONNECTED**' if rcon['connected'] else '**DISCONNECTED**'}\nLatency: {rcon['latency']}ms\nFailed Attempts: {rcon['failures']} (retry in {rcon['retry_in']}s)\nLast Error: `{rcon['last_error']}`", inline=False)
+        if ping := status.get('ping'):
+            sample = f"\nSample: {', '.join(f'`{i}`' for i in ping['players']['sample'])}" if ping['players']['sample'] else ''
+            embed.add_field(name='Ping', value=f"Latency: {ping['latency']}ms\nPlayers: {ping['players']['online']}/{ping['players']['max']}{sample}", inline=False)
+        if server_functions.save_pause_history:
+            pauses = [i['seconds'] for i in server_functions.save_pause_history]
+            embed.add_field(name='Backup Save Pauses', value=f"Last: **{pauses[-1]}s**\nMax: {max(pauses)}s, Average: {sum(pauses) / len(pauses):.1f}s (last {len(pauses)} backups)", inline=False)
         embed.add_field(name='Location', value=f"`{server_functions.server_path}`", inline=False)
         embed.add_field(name='Start Command', value=f"`{server_functions.server_selected[2]}`", inline=False)  # Shows server name, and small description.
+        embed.set_footer(text=f"Checked: status {age.get('online', 0)}s, MOTD/version {age.get('info', 0)}s, IP {age.get('ip', 0)}s, URL {age.get('url', 0)}s ago.")
         await ctx.send(embed=embed)
 
-        if await mc_status() is True:
+        if status.get('online') is True:
             await ctx.invoke(self.bot.get_command('players'))
 
         lprint(ctx, "Fetched server status.")
 
+    @commands.command(aliases=['ping', 'pingall', 'sping', 'pingservers'])
+    async def serverping(self, ctx):
+        """Pings all servers in server_list at once using Server List Ping, shows status, version, players, and latency."""
+
+        await ctx.send("***Pinging Servers...*** :satellite:")
+        results = await server_functions.ping_servers()
+
+        embed = discord.Embed(title='Server Ping :satellite:')
+        for name, ((host, port), stats) in results.items():
+            selected = ' (selected)' if server_functions.server_list[name][0] == server_functions.server_selected[0] else ''
+            if stats is None:
+                embed.add_field(name=f"{name}{selected}", value=f"**INACTIVE** :red_circle:\nAddress: `{host}:{port}`", inline=False)
+                continue
+
+            sample = f" ({', '.join(stats['players']['sample'])})" if stats['players']['sample'] else ''
+            embed.add_field(name=f"{name}{selected}", value=f"**ACTIVE** :green_circle: {stats['latency']}ms\nAddress: `{host}:{port}`\nVersion: {stats['version']['name']}{' (legacy ping)' if stats['legacy'] else ''}\n"
+                                                            f"MOTD: {stats['description']}\nPlayers: {stats['players']['online']}/{stats['players']['max']}{sample}", inline=False)
+        await ctx.send(embed=embed)
+        lprint(ctx, "Pinged servers.")
+
     @commands.command(aliases=['log'])
     async def serverlog(self, ctx, lines=5):
         """
@@ -792,13 +883,48 @@ class Server(commands.Cog):
         """
 
         await ctx.send(f"***Loading {lines} Log Lines*** :tools:")
-        log_data = server_functions.mc_log(lines=lines, log_mode=True, return_reversed=True)
-        for line in log_data.split('\n'):
+        if log_data := server_functions.get_log_lines(lines):
+            log_data = [line.text for line in log_data]
+        else: log_data = str(await server_functions.run_blocking(server_functions.mc_log, lines=lines, log_mode=True, return_reversed=True)).split('\n')
+
+        for line in log_data:
             await ctx.send(f"`{line}`")
 
         await ctx.send("-----END-----")
         lprint(ctx, f"Fetched {lines} lines from server log.")
 
+    @commands.command(aliases=['ls', 'searchlog', 'logfind', 'findlog'])
+    async def logsearch(self, ctx, *query):
+        """
+        Search all server logs, including old compressed ones.
+
+        Args:
+            query <str>: Words to find, all must be in line. Word ending with * matches start of words.
+                Filters: since:<7d/12h/2021-04-24> until:<...> limit:<n> (max log_lines_limit). Last word can also be since time.
+
+        Usage:
+            ?logsearch Steve joined
+            ?logsearch diamond* 7d
+            ?logsearch Steve since:2021-04-01 until:2021-04-24 limit:50
+        """
+
+        if not query:
+            await ctx.send("Usage: `?logsearch <words> [since]`\nExample: `?logsearch Steve joined 7d`, `?logsearch diamond* since:2021-04-01 until:2021-04-24`")
+            return False
+
+        await ctx.send(f"***Searching Logs...*** :mag:")
+        matches = await server_functions.run_blocking(server_functions.search_logs, query)
+        if matches is False:
+            await ctx.send("Usage: `?logsearch <words> [since:<7d/12h/2021-04-24>] [until:<...>] [limit:<n>]`")
+            return False
+
+        lines = [f"[{datetime.datetime.fromtimestamp(match['time']):%Y-%m-%d %H:%M:%S}] {match['text']}" for match in reversed(matches)]
+        for message in server_functions.code_blocks(lines):
+            await ctx.send(message)
+
+        await ctx.send(f"-----END----- ({len(matches)} matches)")
+        lprint(ctx, f"Searched server logs: {' '.join(query)}")
+
     @commands.command(aliases=['start', 'boot', 'startserver', 'serverboot'])
     async def serverstart(self, ctx):
         """
@@ -807,12 +933,13 @@ class Server(commands.Cog):
         Note: Depending on your system, server may take 15 to 40+ seconds to fully boot.
         """
 
-        if await mc_status() is True:
+        if await server_functions.status_service.get('online') is True:
             await ctx.send("**Server ACTIVE**")
             return False
 
         await ctx.send("***Launching Server...*** :rocket:")
-        server_functions.mc_start()
+        await server_functions.mc_start()
+        server_functions.status_service.invalidate('online')
         await ctx.send("***Fetching Status in 20s...***")
         await asyncio.sleep(20)
 
@@ -859,6 +986,7 @@ class Server(commands.Cog):
         await asyncio.sleep(5)
         await ctx.send("**Server HALTED** :stop_sign:")
         server_functions.mc_subprocess = None
+        server_functions.status_service.invalidate('online')
         lprint(ctx, "Stopping server.")
 
         if server_functions.autosave_status is True:
@@ -890,7 +1018,7 @@ class Server(commands.Cog):
     async def serverversion(self, ctx):
         """Gets Minecraft server version."""
 
-        response = server_functions.mc_version()
+        response = await server_functions.run_blocking(server_functions.mc_version)
         await ctx.send(f"Current version: `{response}`")
         lprint("Fetched Minecraft server version: " + response)
 
@@ -979,7 +1107,7 @@ class Server(commands.Cog):
         message = format_args(message, return_empty_str=True)
 
         if use_rcon:
-            motd_property = server_functions.get_mc_motd()
+            motd_property = await server_functions.run_blocking(server_functions.get_mc_motd)
         elif server_functions.server_files_access:
             server_functions.edit_file('motd', message)
             motd_property = server_functions.edit_file('motd')
@@ -1051,26 +1179,32 @@ class World_Backups(commands.Cog):
     def __init__(self, bot): self.bot = bot
 
     @commands.command(aliases=['worldbackups', 'backuplist', 'wbl'])
-    async def worldbackupslist(self, ctx, amount=10):
+    async def worldbackupslist(self, ctx, amount=10, sort='created', *search):
         """
         Show world backups.
 
         Args:
-            amount [int:5]: Number of most recent backups to show.
+            amount [int:10]: Number of most recent backups to show.
+            sort [str:created]: Show biggest/latest by created, size, stored_size, or name.
+            search [str:None]: Only backups with this in their name, e.g. version or keyword.
 
         Usage:
             ?saves
             ?saves 10
+            ?saves 5 size 1.16
         """
 
         embed = discord.Embed(title='World Backups :tools:')
-        worlds = server_functions.fetch_worlds()
-        if worlds is False:
+        try: worlds = await server_functions.run_blocking(server_functions.fetch_worlds, amount, sort, ' '.join(search))
+        except ValueError:
+            await ctx.send("Usage: `?wbl [amount] [created/size/stored_size/name] [search]`\nExample: `?wbl 5 size survival`")
+            return False
+        if not worlds:
             await ctx.send("No world backups found.")
             return False
 
-        for backup in worlds[-amount:]:
-            embed.add_field(name=backup[0], value=f"`{backup[1]}`", inline=False)
+        for backup in worlds:
+            embed.add_field(name=backup[0], value=backup_field(backup), inline=False)
         await ctx.send(embed=embed)
         await ctx.send("Use `?worldrestore <index>` to restore world save.")
 
@@ -1095,30 +1229,28 @@ class World_Backups(commands.Cog):
             return False
         name = format_args(name)
 
-        if await mc_command("", bot_ctx=ctx):
-            await mc_command(f"say ---INFO--- Standby, world is currently being archived. Codename: {name}")
-            await mc_command(f"save-all")
-            await asyncio.sleep(3)
-
-        await ctx.send("***Creating World Backup...*** :new::floppy_disk:")
-        new_backup = server_functions.backup_world(name)
+        async with server_functions.saving_paused(f"---INFO--- Standby, world is currently being archived. Codename: {name}") as pause:
+            new_backup = await run_with_progress(ctx, "***Creating World Backup...*** :new::floppy_disk:", server_functions.backup_world, name)
         if new_backup:
-            await ctx.send(f"**New World Backup:** `{new_backup}`")
-        else: await ctx.send("**ERROR:** Problem saving the world! || it's doomed!||")
+            await ctx.send(f"**New World Backup:** `{new_backup}`" + (f" (world saving paused {pause['seconds']}s)" if pause['seconds'] is not None else ''))
+            lprint(ctx, "New world backup: " + new_backup)
+        else:
+            await ctx.send("**ERROR:** Problem saving the world! || it's doomed!||")
+            lprint(ctx, "Error creating world backup: " + name)
 
         await ctx.invoke(self.bot.get_command('worldbackupslist'))
-        lprint(ctx, "New world backup: " + new_backup)
 
     @commands.command(aliases=['worldrestore', 'wbr', 'wr'])
-    async def worldbackuprestore(self, ctx, index='', now=''):
+    async def worldbackuprestore(self, ctx, index='', now='', force=''):
         """
-        Restore a world backup.
+        Restore a world backup. Backup is copied into a staging folder while server keeps running, then swapped in once server stops.
 
-        Note: This will not make a backup beforehand, suggest doing so with ?backup command.
+        Note: This will not make a backup beforehand, suggest doing so with ?backup command. Previous world is kept, undo with ?worldrollback.
 
         Args:
             index <int:None>: Get index with ?saves command.
             now [str]: Skip 15s wait to stop server. E.g. ?restore 0 now
+            force [str]: Restore even if backup fails verification. E.g. ?restore 0 now force
 
         Usage:
             ?restore 3
@@ -1129,18 +1261,52 @@ class World_Backups(commands.Cog):
             await ctx.send("Usage: `?wbr <index> [now]`\nExample: `?wbr 0 now`")
             return False
 
-        fetched_restore = server_functions.get_world_from_index(index)
+        fetched_restore = await server_functions.run_blocking(server_functions.get_world_from_index, index)
+        if fetched_restore is None:
+            await ctx.send(f"No world backup with index: `{index}`")
+            return False
         lprint(ctx, "World restoring to: " + fetched_restore)
+        if server_functions.backup_verify_restore is True and 'force' not in f"{now} {force}":
+            result = await run_with_progress(ctx, "***Verifying World Backup...***", server_functions.verify_world, fetched_restore)
+            if not await send_verify_result(ctx, result):
+                await ctx.send(f"Restore cancelled. Use `?wr {index} now force` to restore anyway.")
+                return False
+
         await ctx.send("***Restoring World...*** :floppy_disk::leftwards_arrow_with_hook:")
-        if not await mc_command("", bot_ctx=ctx):
+        if not await run_with_progress(ctx, "***Copying World Files...*** (server stays up)", server_functions.stage_world_restore, fetched_restore):
+            await ctx.send("**ERROR:** Could not restore world!")
+            return False
+
+        if await mc_status() is True:
             await mc_command(f"say ---WARNING--- Initiating jump to save point in 5s! : {fetched_restore}")
             await asyncio.sleep(5)
             await ctx.invoke(self.bot.get_command('serverstop'), now=now)
 
-        await ctx.send(f"***Restored World:*** `{fetched_restore}`")
-        server_functions.restore_world(fetched_restore)  # Gives computer time to move around world files.
+        swap_start = time.perf_counter()
+        if await server_functions.run_blocking(server_functions.swap_world_restore):
+            await ctx.send(f"***Restored World:*** `{fetched_restore}` (swapped in {time.perf_counter() - swap_start:.1f}s)\nUndo with `?worldrollback`.")
+        else: await ctx.send("**ERROR:** Could not swap in restored world!")
         await asyncio.sleep(3)
 
+    @commands.command(aliases=['worldundo', 'wrb'])
+    async def worldrollback(self, ctx, now=''):
+        """
+        Swaps back world from before last restore or reset. Using it again undoes the rollback.
+
+        Args:
+            now [str]: Skip 15s wait to stop server.
+        """
+
+        if await mc_status() is True:
+            await mc_command("say ---WARNING--- Rolling back world in 5s!")
+            await asyncio.sleep(5)
+            await ctx.invoke(self.bot.get_command('serverstop'), now=now)
+
+        if await server_functions.run_blocking(server_functions.rollback_world):
+            await ctx.send("**World Rolled Back** :leftwards_arrow_with_hook:")
+        else: await ctx.send("No previous world to roll back to.")
+        lprint(ctx, "World rollback.")
+
     @commands.command(aliases=['worlddelete', 'backupdelete', 'wbd'])
     async def worldbackupdelete(self, ctx, index=''):
         """
@@ -1158,9 +1324,12 @@ class World_Backups(commands.Cog):
             await ctx.send("Usage: `?wbd <index>`\nExample: `?wbd 1`")
             return False
 
-        to_delete = server_functions.get_world_from_index(index)
+        to_delete = await server_functions.run_blocking(server_functions.get_world_from_index, index)
+        if to_delete is None:
+            await ctx.send(f"No world backup with index: `{index}`")
+            return False
         await ctx.send("***Deleting World Backup...*** :floppy_disk::wastebasket:")
-        server_functions.delete_world(to_delete)
+        await server_functions.run_blocking(server_functions.delete_world, to_delete)
 
         await ctx.send(f"**World Backup Deleted:** `{to_delete}`")
         lprint(ctx, "Deleted world backup: " + to_delete)
@@ -1170,7 +1339,7 @@ class World_Backups(commands.Cog):
         """
         Deletes world save (does not touch other server files).
 
-        Note: This will not make a backup beforehand, suggest doing so with ?backup command.
+        Note: This will not make a backup beforehand, suggest doing so with ?backup command. Old world is kept until next restore or reset, undo with ?worldrollback.
         """
 
         await mc_command("say ---WARNING--- Project Rebirth will commence in T-5s!", bot_ctx=ctx)
@@ -1183,7 +1352,7 @@ class World_Backups(commands.Cog):
         await ctx.send("**Finished.**")
         await ctx.send("You can now start the server with `?start`.")
 
-        server_functions.restore_world(reset=True)
+        await server_functions.run_blocking(server_functions.restore_world, reset=True)
         await asyncio.sleep(3)
 
         lprint(ctx, "World Reset.")
@@ -1191,7 +1360,12 @@ class World_Backups(commands.Cog):
 
 # ========== Server backup/restore functions.
 class Server_Backups(commands.Cog):
-    def __init__(self, bot): self.bot = bot
+    def __init__(self, bot):
+        self.bot = bot
+        self.retention_previewed = False
+
+        if server_functions.retention_status is True:
+            self.retention_loop.start()
 
     @commands.command(aliases=['sselect', 'servers', 'serverslist', 'ss', 'sl'])
     async def serverselect(self, ctx, name=''):
@@ -1221,27 +1395,33 @@ class Server_Backups(commands.Cog):
         else: await ctx.send("**ERROR:** Server not found.\nUse `?serverselect` or `?ss` to show list of available servers.")
 
     @commands.command(aliases=['serverbackups', 'sbl'])
-    async def serverbackupslist(self, ctx, amount=10):
+    async def serverbackupslist(self, ctx, amount=10, sort='created', *search):
         """
         List server backups.
 
         Args:
-            amount [int:5]: How many most recent backups to show.
+            amount [int:10]: How many most recent backups to show.
+            sort [str:created]: Show biggest/latest by created, size, stored_size, or name.
+            search [str:None]: Only backups with this in their name.
 
         Usage:
             ?serversaves
             ?serversaves 10
+            ?serversaves 5 size
         """
 
         embed = discord.Embed(title='Server Backups :tools:')
-        servers = server_functions.fetch_servers()
+        try: servers = await server_functions.run_blocking(server_functions.fetch_servers, amount, sort, ' '.join(search))
+        except ValueError:
+            await ctx.send("Usage: `?sbl [amount] [created/size/stored_size/name] [search]`\nExample: `?sbl 5 size`")
+            return False
 
-        if servers is False:
+        if not servers:
             await ctx.send("No server backups found.")
             return False
 
-        for save in servers[-amount:]:
-            embed.add_field(name=save[0], value=f"`{save[1]}`", inline=False)
+        for save in servers:
+            embed.add_field(name=save[0], value=backup_field(save), inline=False)
         await ctx.send(embed=embed)
 
         await ctx.send("Use `?serverrestore <index>` to restore server.")
@@ -1266,25 +1446,27 @@ class Server_Backups(commands.Cog):
 
         name = format_args(name)
         await ctx.send(f"***Creating Server Backup...*** :new::floppy_disk:")
-        if await mc_command("", bot_ctx=ctx): await mc_command(f"save-all")
-
-        await asyncio.sleep(5)
-        new_backup = server_functions.backup_server(name)
+        async with server_functions.saving_paused() as pause:
+            new_backup = await run_with_progress(ctx, "***Copying Server Files...***", server_functions.backup_server, name)
         if new_backup:
-            await ctx.send(f"**New Server Backup:** `{new_backup}`")
-        else: await ctx.send("**ERROR:** Server backup failed! :interrobang:")
+            await ctx.send(f"**New Server Backup:** `{new_backup}`" + (f" (world saving paused {pause['seconds']}s)" if pause['seconds'] is not None else ''))
+            lprint(ctx, "New server backup: " + new_backup)
+        else:
+            await ctx.send("**ERROR:** Server backup failed! :interrobang:")
+            lprint(ctx, "Error creating server backup: " + name)
 
         await ctx.invoke(self.bot.get_command('serverbackupslist'))
-        lprint(ctx, "New server backup: " + new_backup)
 
     @commands.command(aliases=['serverrestore', 'sbr'])
-    async def serverbackuprestore(self, ctx, index='', now=''):
+    async def serverbackuprestore(self, ctx, index='', now='', force=''):
         """
-        Restore server backup.
+        Restore server backup. Backup is copied into a staging folder while server keeps running, then swapped in once server stops.
+        Previous server files are kept, undo with ?serverrollback.
 
         Args:
             index <int:None>: Get index number from ?serversaves command.
             now [str:None]: Stop server without 15s wait.
+            force [str:None]: Restore even if backup fails verification.
 
         Usage:
             ?serverrestore 0
@@ -1295,18 +1477,50 @@ class Server_Backups(commands.Cog):
             await ctx.send("Usage: `?sbr <index> [now]`\nExample: `?sbr 2 now`")
             return False
 
-        fetched_restore = server_functions.get_server_from_index(index)
+        fetched_restore = await server_functions.run_blocking(server_functions.get_server_from_index, index)
+        if fetched_restore is None:
+            await ctx.send(f"No server backup with index: `{index}`")
+            return False
         lprint(ctx, "Server restoring to: " + fetched_restore)
+        if server_functions.backup_verify_restore is True and 'force' not in f"{now} {force}":
+            result = await run_with_progress(ctx, "***Verifying Server Backup...***", server_functions.verify_server, fetched_restore)
+            if not await send_verify_result(ctx, result):
+                await ctx.send(f"Restore cancelled. Use `?sbr {index} now force` to restore anyway.")
+                return False
+
         await ctx.send(f"***Restoring Server...*** :floppy_disk::leftwards_arrow_with_hook:")
+        if not await run_with_progress(ctx, "***Copying Server Files...*** (server stays up)", server_functions.stage_server_restore, fetched_restore):
+            await ctx.send("**ERROR:** Could not restore server!")
+            return False
 
         if await mc_status() is True:
             await mc_command(f"say ---WARNING--- Initiating jump to save point in 5s! : {fetched_restore}")
             await asyncio.sleep(5)
             await ctx.invoke(self.bot.get_command('serverstop'), now=now)
 
-        if server_functions.restore_server(fetched_restore):
-            await ctx.send(f"**Server Restored:** `{fetched_restore}`")
-        else: await ctx.send("**ERROR:** Could not restore server!")
+        swap_start = time.perf_counter()
+        if await server_functions.run_blocking(server_functions.swap_server_restore):
+            await ctx.send(f"**Server Restored:** `{fetched_restore}` (swapped in {time.perf_counter() - swap_start:.1f}s)\nUndo with `?serverrollback`.")
+        else: await ctx.send("**ERROR:** Could not swap in restored server!")
+
+    @commands.command(aliases=['serverundo', 'srb'])
+    async def serverrollback(self, ctx, now=''):
+        """
+        Swaps back server files from before last restore. Using it again undoes the rollback.
+
+        Args:
+            now [str]: Skip 15s wait to stop server.
+        """
+
+        if await mc_status() is True:
+            await mc_command("say ---WARNING--- Rolling back server in 5s!")
+            await asyncio.sleep(5)
+            await ctx.invoke(self.bot.get_command('serverstop'), now=now)
+
+        if await server_functions.run_blocking(server_functions.rollback_server):
+            await ctx.send("**Server Rolled Back** :leftwards_arrow_with_hook:")
+        else: await ctx.send("No previous server files to roll back to.")
+        lprint(ctx, "Server rollback.")
 
     @commands.command(aliases=['serverdelete', 'sbd'])
     async def serverbackupdelete(self, ctx, index=''):
@@ -1326,13 +1540,283 @@ class Server_Backups(commands.Cog):
             await ctx.send("Usage: `?sbd <index>`\nExample: `?sbd 3`")
             return False
 
-        to_delete = server_functions.get_server_from_index(index)
+        to_delete = await server_functions.run_blocking(server_functions.get_server_from_index, index)
+        if to_delete is None:
+            await ctx.send(f"No server backup with index: `{index}`")
+            return False
         await ctx.send("***Deleting Server Backup...*** :floppy_disk::wastebasket:")
-        server_functions.delete_server(to_delete)
+        await server_functions.run_blocking(server_functions.delete_server, to_delete)
 
         await ctx.send(f"**Server Backup Deleted:** `{to_delete}`")
         lprint(ctx, "Deleted server backup: " + to_delete)
 
+    @commands.command(aliases=['tagbackup', 'bt'])
+    async def backuptag(self, ctx, backup_type='', index='', *tags):
+        """
+        Set tags of a world or server backup. Backups with a protected tag (e.g. keep) never get pruned by retention.
+
+        Args:
+            backup_type <str>: world or server.
+            index <int>: Get index with ?wbl or ?sbl.
+            tags [str]: New tags, none to clear tags.
+
+        Usage:
+            ?backuptag world 12 keep
+            ?backuptag server 3
+        """
+
+        paths = {'world': server_functions.world_backups_path, 'server': server_functions.server_backups_path}
+        try: index = int(index)
+        except: index = None
+        if backup_type not in paths or index is None:
+            await ctx.send("Usage: `?backuptag <world/server> <index> [tags]`\nExample: `?backuptag world 12 keep`")
+            return False
+
+        if await server_functions.run_blocking(server_functions.tag_backup, paths[backup_type], index, list(tags)):
+            await ctx.send(f"**Tagged {backup_type} backup {index}:** {', '.join(tags) or 'None'}")
+            lprint(ctx, f"Tagged {backup_type} backup {index}: {tags}")
+        else: await ctx.send(f"No {backup_type} backup with index: `{index}`")
+
+    @commands.command(aliases=['verifybackup', 'bv'])
+    async def backupverify(self, ctx, backup_type='', index=''):
+        """
+        Check a world or server backup's files against hashes saved when it was made, reports missing or corrupt files.
+
+        Args:
+            backup_type <str>: world or server.
+            index <int>: Get index with ?wbl or ?sbl.
+
+        Usage:
+            ?backupverify world 12
+        """
+
+        try: index = int(index)
+        except: index = None
+        if backup_type not in ('world', 'server') or index is None:
+            await ctx.send("Usage: `?backupverify <world/server> <index>`\nExample: `?backupverify world 12`")
+            return False
+
+        get_backup = server_functions.get_world_from_index if backup_type == 'world' else server_functions.get_server_from_index
+        backup = await server_functions.run_blocking(get_backup, index)
+        if backup is None:
+            await ctx.send(f"No {backup_type} backup with index: `{index}`")
+            return False
+
+        verify = server_functions.verify_world if backup_type == 'world' else server_functions.verify_server
+        await send_verify_result(ctx, await run_with_progress(ctx, f"***Verifying:*** `{backup}`", verify, backup))
+        lprint(ctx, f"Verified {backup_type} backup: {backup}")
+
+    @commands.command(aliases=['prune', 'retention', 'bp'])
+    async def backupprune(self, ctx, now=''):
+        """
+        Preview which world and server backups retention policy would delete, use 'now' to delete them.
+        Using 'now' also confirms automatic retention (if retention_status is on), which only previews until then.
+
+        Args:
+            now [str]: Prune now instead of just showing preview.
+
+        Usage:
+            ?backupprune
+            ?backupprune now
+        """
+
+        dry_run = 'now' not in now
+        pruned = await server_functions.run_blocking(server_functions.prune_all, dry_run)
+        if not dry_run and server_functions.retention_confirmed is not True:
+            server_functions.retention_confirmed = True
+            server_functions.edit_file('retention_confirmed', ' True', server_functions.slime_vars_file)
+
+        embed = discord.Embed(title=f"{'Retention Preview' if dry_run else 'Pruned Backups'} :wastebasket:")
+        for backup_type, names in pruned.items():
+            text = '\n'.join(f"`{name}`" for name in names) or 'None'
+            if len(text) > 1000: text = text[:1000] + f"...\n({len(names)} total)"
+            embed.add_field(name=backup_type.capitalize(), value=text, inline=False)
+        embed.add_field(name='Policy', value=f"Keep last {server_functions.retention_keep_last}, hourly {server_functions.retention_hourly}, daily {server_functions.retention_daily}, "
+                                             f"weekly {server_functions.retention_weekly}, monthly {server_functions.retention_monthly}, "
+                                             f"max size {f'~{server_functions.retention_max_size_gb} GB (approximate)' if server_functions.retention_max_size_gb else 'none'}, protected tags: {', '.join(server_functions.retention_protected_tags)}", inline=False)
+        await ctx.send(embed=embed)
+        if dry_run: await ctx.send("Use `?backupprune now` to delete these backups.")
+        lprint(ctx, f"{'Previewed' if dry_run else 'Ran'} backup pruning.")
+
+    @tasks.loop(minutes=server_functions.retention_interval)
+    async def retention_loop(self):
+        """
+        Prunes world and server backups with retention policy at interval of x minutes.
+        Until retention_confirmed, only previews once and asks admin to confirm with ?backupprune now.
+        """
+
+        if server_functions.retention_confirmed is not True:
+            if self.retention_previewed: return
+            self.retention_previewed = True
+            pruned = await server_functions.run_blocking(server_functions.prune_all, True)
+            if not pruned['world'] and not pruned['server']: return
+            message = f"Retention policy would prune {len(pruned['world'])} world and {len(pruned['server'])} server backups. Nothing deleted yet, use `?backupprune` to see which and `?backupprune now` to confirm."
+            lprint(message)
+            if server_functions.channel_id:
+                await self.bot.get_channel(server_functions.channel_id).send(message)
+            return
+
+        pruned = await server_functions.run_blocking(server_functions.prune_all)
+        if pruned['world'] or pruned['server']:
+            lprint(f"Retention pruned {len(pruned['world'])} world and {len(pruned['server'])} server backups.")
+
+    @retention_loop.before_loop
+    async def before_retention_loop(self):
+        """Makes sure bot is ready before retention_loop can be used."""
+
+        await self.bot.wait_until_ready()
+
+
+# ========== Stats: player count history, playtime, peak, activity heatmap, tick performance.
+class Stats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.stats_loop.start()
+        if server_functions.perf_status is True:
+            self.perf_loop.start()
+
+    @commands.command(aliases=['pt', 'played', 'toptime', 'topplayers'])
+    async def playtime(self, ctx, player='', days=0):
+        """
+        Show player's total playtime, or most active players if no player given.
+
+        Args:
+            player [str]: Player name.
+            days [int:0]: Only count last x days, 0 for all time.
+
+        Usage:
+            ?playtime Steve
+            ?playtime Steve 7
+            ?playtime
+        """
+
+        if player.isdigit() and not days: player, days = '', int(player)  # ?playtime 7
+        if player and not re.fullmatch(r'\w{1,16}', player, re.ASCII):  # Also keeps name from being used as a path.
+            await ctx.send("**ERROR:** Invalid player name.")
+            return False
+        since = time.time() - int(days) * 86400 if days else None
+        period = f"last {days} days" if days else 'all time'
+
+        if not player:
+            top = await server_functions.run_blocking(server_functions.get_top_playtime, since)
+            if not top:
+                await ctx.send("No playtime recorded yet.")
+                return False
+            await ctx.send(f"**Most Active Players** ({period}):\n" + '\n'.join(f"`{name}`: {seconds / 3600:.1f}h" for name, seconds in top))
+            lprint(ctx, "Fetched top playtime.")
+            return
+
+        seconds, sessions, last_seen = await server_functions.run_blocking(server_functions.get_playtime, player, since)
+        if not sessions:
+            await ctx.send(f"No playtime recorded for `{player}` ({period}).")
+            return False
+
+        await ctx.send(f"`{player}` played **{seconds / 3600:.1f}h** in {sessions} sessions ({period}).\nLast seen: {datetime.datetime.fromtimestamp(last_seen):%Y-%m-%d %H:%M}")
+        lprint(ctx, f"Fetched playtime: {player}")
+
+    @commands.command(aliases=['peakplayers', 'mostplayers'])
+    async def peak(self, ctx, days=7):
+        """
+        Show most players online at once, and average players online.
+
+        Args:
+            days [int:7]: Over last x days.
+        """
+
+        result = await server_functions.run_blocking(server_functions.player_counts.peak, time.time() - int(days) * 86400)
+        if result is None:
+            await ctx.send("No player count history recorded yet.")
+            return False
+
+        players, moment, average = result
+        await ctx.send(f"**Peak** (last {days} days): **{players:g}** players, {moment:%Y-%m-%d %H}:00\nAverage: {average:.1f} players online")
+        lprint(ctx, f"Fetched peak players: {days} days.")
+
+    @commands.command(aliases=['heatmap', 'activehours', 'act'])
+    async def activity(self, ctx, days=30):
+        """
+        Show heatmap of average players online by weekday and hour.
+
+        Args:
+            days [int:30]: Over last x days.
+        """
+
+        heatmap = await server_functions.run_blocking(server_functions.player_counts.heatmap, time.time() - int(days) * 86400)
+        highest = max((value for row in heatmap for value in row if value is not None), default=None)
+        if not highest:
+            await ctx.send("No player activity recorded yet.")
+            return False
+
+        shades = ' ░▒▓█'
+        rows = [f"{day} " + ''.join(' ' if value is None else shades[min(4, round(value / highest * 4))] for value in heatmap[index])
+                for index, day in enumerate(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])]
+        await ctx.send(f"**Activity** (last {days} days, darkest is {highest:.1f} players average)\n```\n    0     6     12    18   23\n" + '\n'.join(rows) + "\n```")
+        lprint(ctx, f"Fetched activity heatmap: {days} days.")
+
+    @commands.command(aliases=['tps', 'mspt', 'lag'])
+    async def perf(self, ctx, minutes=60):
+        """
+        Show server's tick performance: latest TPS/MSPT sample, and percentiles over recent samples.
+
+        Args:
+            minutes [int:60]: Over last x minutes.
+
+        Usage:
+            ?perf
+            ?perf 1440
+        """
+
+        sample = await server_functions.sample_perf(on_demand=True, max_age=server_functions.perf_interval * 2)
+        result = await server_functions.run_blocking(server_functions.get_perf, time.time() - int(minutes) * 60)
+        if sample is None and not result['tps'] and not result['mspt']:
+            await ctx.send("No tick performance recorded, is server running?")
+            return False
+
+        embed = discord.Embed(title=f"Tick Performance (last {minutes} min)")
+        if sample:
+            embed.add_field(name='Now', value=f"TPS: **{sample['tps'] if sample['tps'] is not None else 'N/A'}**, MSPT: **{sample['mspt'] if sample['mspt'] is not None else 'N/A'}**", inline=False)
+        if tps := result['tps']:
+            embed.add_field(name='TPS', value=f"p50: {tps[50]:g}, p5: {tps[5]:g}, p1: {tps[1]:g}, min: {tps['min']:g}", inline=False)
+        if mspt := result['mspt']:
+            embed.add_field(name='MSPT', value=f"p50: {mspt[50]:g}, p95: {mspt[95]:g}, p99: {mspt[99]:g}, max: {mspt['max']:g}", inline=False)
+        count = max(i['count'] for i in result.values() if i) if any(result.values()) else 0
+        embed.set_footer(text=f"{count} samples, {server_functions.server_type()} commands, alert under {server_functions.perf_alert_tps} TPS")
+        await ctx.send(embed=embed)
+        lprint(ctx, f"Fetched tick performance: {minutes} min.")
+
+    @tasks.loop(seconds=server_functions.stats_interval)
+    async def stats_loop(self):
+        """Samples number of players online at interval of stats_interval seconds."""
+
+        await server_functions.sample_player_count()
+
+    @stats_loop.before_loop
+    async def before_stats_loop(self):
+        """Makes sure bot is ready before stats_loop can be used."""
+
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=server_functions.perf_interval)
+    async def perf_loop(self):
+        """Samples TPS/MSPT at interval of perf_interval seconds (Paper and Forge servers only), and posts alert to channel_id when TPS stays low."""
+
+        sample = await server_functions.sample_perf()
+        alert = server_functions.perf_alert(sample)
+        if alert is None: return
+
+        if alert == 'low':
+            message = f":warning: **Server lagging**, TPS under {server_functions.perf_alert_tps} for {server_functions.perf_alert_samples} samples in a row. TPS: **{sample['tps']}**" + (f", MSPT: **{sample['mspt']}**" if sample['mspt'] is not None else '')
+        else: message = f":white_check_mark: Server TPS back to **{sample['tps']}**."
+        lprint(message.replace('*', ''))
+        if server_functions.channel_id:
+            await self.bot.get_channel(server_functions.channel_id).send(message)
+
+    @perf_loop.before_loop
+    async def before_perf_loop(self):
+        """Makes sure bot is ready before perf_loop can be used."""
+
+        await self.bot.wait_until_ready()
+
 
 # ========== Extra: restart bot, botlog, get ip, help2.
 class Bot_Functions(commands.Cog):
@@ -1349,26 +1833,45 @@ class Bot_Functions(commands.Cog):
         if server_functions.use_subprocess is True:
             await ctx.invoke(self.bot.get_command("serverstop"), now=now)
 
+        server_functions.bot_logger.close()  # atexit doesn't run with execl.
+        server_functions.record_logger.close()
         os.chdir(server_functions.bot_files_path)
         os.execl(sys.executable, sys.executable, *sys.argv)
 
     @commands.command(aliases=['blog'])
-    async def botlog(self, ctx, lines=5):
+    async def botlog(self, ctx, *query):
         """
-        Show bot log.
+        Show bot log, or search log records of used commands.
 
         Args:
             lines [int:5]: Number of most recent lines to show.
+            query [str]: Filters: user:<name/id/@mention> command:<name> since:<7d/12h/date> until:<...> outcome:<ok/error> kind:<command/log> limit:<n>,
+                other words are searched for in messages and command args.
 
         Usage:
             ?botlog
             ?blog 15
-        """
-
-        log_data = server_functions.mc_log(file_path=server_functions.bot_log_file, lines=lines, log_mode=True, return_reversed=True)
+            ?botlog command:kick since:7d
+            ?botlog user:@Slime outcome:error
+        """
+
+        if query and not (len(query) == 1 and query[0].isdigit()):
+            records = await server_functions.run_blocking(server_functions.query_bot_log, query)
+            if records is False:
+                await ctx.send("Usage: `?botlog [user:<name/id>] [command:<name>] [since:<7d/12h/2021-04-24>] [until:<...>] [outcome:<ok/error>] [kind:<command/log>] [limit:<n>] [search words]`")
+                return False
+
+            for record in reversed(records):
+                details = f"{record['command']} {record['args'] or ''}".strip() if record['kind'] == 'command' else record['message']
+                result = f" ({record['outcome']}, {record['duration']}s)" if record['kind'] == 'command' else ''
+                await ctx.send(f"`[{record['time'][:19].replace('T', ' ')}] ({record['user']}): {details}{result}`")
+            await ctx.send(f"-----END----- ({len(records)} records)")
+            lprint(ctx, f"Searched bot log: {' '.join(query)}")
+            return
 
-        # Shows server log line by line.
-        for line in log_data.split('\n'):
+        lines = int(query[0]) if query else 5
+        # Shows bot log line by line, from memory.
+        for line in server_functions.bot_logger.recent(lines):
             await ctx.send(f"`{line}`")
 
         await ctx.send("-----END-----")
@@ -1467,13 +1970,13 @@ class Bot_Functions(commands.Cog):
 
 
 # Adds functions to bot.
-for cog in [Basics, Player, Permissions, World, Server, World_Backups, Server_Backups, Bot_Functions]:
+for cog in [Basics, Player, Permissions, World, Server, World_Backups, Server_Backups, Stats, Bot_Functions]:
     bot.add_cog(cog(bot))
 
 # Disable certain commands depending on if using Tmux, RCON, or subprocess.
 if_no_tmux = ['serverstart', 'serverrestart']
-if_using_rcon = ['oplist', 'properties', 'rcon', 'onelinemode', 'serverstart', 'serverrestart', 'worldbackupslist', 'worldbackupnew', 'worldbackuprestore', 'worldbackupdelete', 'worldreset',
-                 'serverbackupslist', 'serverbackupnew', 'serverbackupdelete', 'serverbackuprestore', 'serverreset', 'serverupdate', 'serverlog']
+if_using_rcon = ['oplist', 'properties', 'rcon', 'onelinemode', 'serverstart', 'serverrestart', 'worldbackupslist', 'worldbackupnew', 'worldbackuprestore', 'worldbackupdelete', 'worldreset', 'worldrollback',
+                 'serverbackupslist', 'serverbackupnew', 'serverbackupdelete', 'serverbackuprestore', 'serverrollback', 'backuptag', 'backupverify', 'backupprune', 'serverreset', 'serverupdate', 'serverlog', 'logsearch']
 
 if server_functions.server_files_access is False and server_functions.use_rcon is True:
     for command in if_no_tmux: bot.remove_command(command)
@@ -1482,4 +1985,5 @@ if server_functions.use_tmux is False:
     for command in if_no_tmux: bot.remove_command(command)
 
 if __name__ == '__main__':
+    server_functions.start_loggers()
     bot.run(TOKEN)
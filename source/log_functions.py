@@ -0,0 +1,966 @@
+import collections, threading, datetime, asyncio, sqlite3, atexit, shutil, queue, gzip, glob, json, time, sys, os, re
+
+# [12:00:00] [Server thread/INFO]: msg  or Forge's  [24Apr2021 12:00:00.123] [Server thread/INFO] [net.minecraft.server.MinecraftServer/]: msg
+log_line_pattern = re.compile(r'^\[([^\]]+)\] \[([^\]]+)/([A-Z]+)\](?: \[([^\]]*)\])?: ?(.*)$')
+# Paper/Spigot console output (what use_subprocess reads from stdout):  [12:00:00 INFO]: msg
+console_line_pattern = re.compile(r'^\[(\d\d:\d\d:\d\d) ([A-Z]+)\]: ?(.*)$')
+ansi_pattern = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+def remove_ansi(text):
+    """Removes ANSI escape sequences (colors, etc), Paper and RCON output sometimes has them."""
+
+    if '\x1b' not in text: return text
+    return ansi_pattern.sub('', text)
+
+
+class LogEvent:
+    """
+    Parsed server log line. Subclasses add fields for specific kinds of lines (chat, join, ban, etc), see parse_line().
+    Uses __slots__ since LogBuffer parses lines again every time they're read.
+
+    Attributes:
+        text str: Whole line, ANSI escapes removed.
+        time str: Timestamp, as it appears in log.
+        thread str: e.g. 'Server thread'.
+        level str: INFO, WARN, ERROR, etc.
+        source str: Logger name, only Forge logs have it.
+        message str: Part after the header, or whole line if it has no header (e.g. stack traces).
+        seq int: Line's sequence number in LogBuffer.
+    """
+
+    __slots__ = ('text', 'time', 'thread', 'level', 'source', 'message', 'seq')
+    kind = 'line'
+    fields = ()
+
+    def __init__(self, text, time=None, thread=None, level=None, source=None, message=None, seq=None):
+        self.text, self.time, self.thread, self.level, self.source, self.seq = text, time, thread, level, source, seq
+        self.message = text if message is None else message
+
+    def __repr__(self):
+        values = ', '.join(f"{i}={getattr(self, i)!r}" for i in ('time', 'level', 'message') + self.fields)
+        return f"{type(self).__name__}({values})"
+
+class ChatEvent(LogEvent):
+    __slots__ = fields = ('player', 'chat')
+    kind = 'chat'
+
+class JoinEvent(LogEvent):
+    __slots__ = fields = ('player',)
+    kind = 'join'
+
+class LeaveEvent(LogEvent):
+    __slots__ = fields = ('player', 'reason')
+    kind = 'leave'
+
+class KickEvent(LeaveEvent):
+    __slots__ = ()
+    kind = 'kick'
+
+class StartEvent(LogEvent):
+    __slots__ = fields = ('seconds',)
+    kind = 'start'
+
+class StopEvent(LogEvent):
+    __slots__ = ()
+    kind = 'stop'
+
+class PerfEvent(LogEvent):
+    __slots__ = fields = ('tps', 'mspt')  # Either can be None, depends on command.
+    kind = 'perf'
+
+class DeathEvent(LogEvent):
+    __slots__ = fields = ('player',)
+    kind = 'death'
+
+class BanEvent(LogEvent):
+    __slots__ = fields = ('player', 'banner', 'reason')
+    kind = 'ban'
+
+class PardonEvent(LogEvent):
+    __slots__ = fields = ('player',)
+    kind = 'pardon'
+
+class BanCountEvent(LogEvent):
+    __slots__ = fields = ('count',)
+    kind = 'bancount'
+
+class PlayerListEvent(LogEvent):
+    __slots__ = fields = ('online', 'max', 'players')
+    kind = 'players'
+
+class WhitelistEvent(LogEvent):
+    __slots__ = fields = ('count', 'players')
+    kind = 'whitelist'
+
+def split_names(text):
+    """'Steve, Alex' -> ['Steve', 'Alex'], ignores blanks."""
+
+    return [name for name in (i.strip() for i in text.split(',')) if name]
+
+# Matched against LogEvent.message, first match decides line's event type.
+# Each entry: (pattern, class, function that takes match object and returns class's fields as tuple).
+player_prefix = r'^(\w{1,16}) '  # Patterns for lines that start with player name.
+chat_pattern = re.compile(r'^(?:\[Not Secure\] )?<([^>]+)> (.*)$')
+join_pattern = re.compile(player_prefix + r'joined the game$')
+leave_pattern = re.compile(player_prefix + r'(?:left the game|lost connection: (.*))$')
+banned_pattern = re.compile(player_prefix + r'was banned by ([^:]+): (.*)$')  # From banlist command.
+ban_pattern = re.compile(r'^Banned (\w{1,16}): (.*)$')
+pardon_pattern = re.compile(r'^Unbanned (\w{1,16})$')
+kick_pattern = re.compile(r'^Kicked (\w{1,16}): (.*)$')
+start_pattern = re.compile(r'^Done \(([\d.]+)s\)! For help')
+stop_pattern = re.compile(r'^Stopping (?:the )?server$')
+# Tick performance. Paper: tps and mspt commands (mspt's 5s avg/min/max), vanilla: debug stop, Forge: forge tps (old and new formats).
+tps_pattern = re.compile(r'^TPS from last 1m, 5m, 15m: \*?([\d.]+)')
+mspt_pattern = re.compile(r'^◴ ([\d.]+)/[\d.]+/[\d.]+, [\d.]+/[\d.]+/[\d.]+, [\d.]+/[\d.]+/[\d.]+$')
+debug_stop_pattern = re.compile(r'^Stopped (?:debug|tick) profiling after ([\d.]+) seconds and (\d+) ticks \(([\d.]+) ticks per second\)')
+forge_tps_pattern = re.compile(r'^Overall\s*: (?:Mean tick time: ([\d.]+) ms\. Mean TPS: ([\d.]+)|([\d.]+) TPS \(([\d.]+) ms/tick\))')
+ban_count_pattern = re.compile(r'^There (?:are|is) (\d+|no) bans?')
+player_list_pattern = re.compile(r'^There are (\d+) (?:of a max of |out of maximum |/ ?)(\d+) players online(?::(.*)|\.)?$')
+whitelist_pattern = re.compile(r'^There are (\d+|no) whitelisted players?(?::(.*))?')
+death_pattern = re.compile(player_prefix + r'(?:was (?:slain|shot|killed|blown up|fireballed|pummeled|squashed|squished|impaled|pricked|poked|stung|struck|burnt|doomed|roasted|frozen|skewered|obliterated)|'
+                           r'drowned|died|blew up|hit the ground too hard|fell |burned to death|went up in flames|went off with a bang|tried to swim in lava|'
+                           r'suffocated|starved to death|walked into|experienced kinetic energy|withered away|froze to death|discovered the floor was lava|didn\'t want to live)')
+
+def parse_count(text): return 0 if text == 'no' else int(text)
+
+event_patterns = [
+    (chat_pattern, ChatEvent, lambda m: m.groups()),
+    (ban_pattern, BanEvent, lambda m: (m[1], 'Server', m[2])),
+    (pardon_pattern, PardonEvent, lambda m: m.groups()),
+    (kick_pattern, KickEvent, lambda m: m.groups()),
+    (start_pattern, StartEvent, lambda m: (float(m[1]),)),
+    (stop_pattern, StopEvent, lambda m: ()),
+    (tps_pattern, PerfEvent, lambda m: (float(m[1]), None)),
+    (mspt_pattern, PerfEvent, lambda m: (None, float(m[1]))),
+    (debug_stop_pattern, PerfEvent, lambda m: (float(m[3]), None)),
+    (forge_tps_pattern, PerfEvent, lambda m: (float(m[2] or m[3]), float(m[1] or m[4]))),
+    (player_list_pattern, PlayerListEvent, lambda m: (int(m[1]), int(m[2]), split_names(m[3] or ''))),
+    (ban_count_pattern, BanCountEvent, lambda m: (parse_count(m[1]),)),
+    (whitelist_pattern, WhitelistEvent, lambda m: (parse_count(m[1]), split_names(m[2] or ''))),
+    (join_pattern, JoinEvent, lambda m: m.groups()),
+    (leave_pattern, LeaveEvent, lambda m: m.groups()),
+    (banned_pattern, BanEvent, lambda m: m.groups()),
+    (death_pattern, DeathEvent, lambda m: m.groups()),
+]
+
+def compile_event_patterns(patterns):
+    """
+    Joins patterns into one regex, so lines that aren't events (most of them) are rejected with one match() call.
+    Patterns starting with player_prefix share it, else regex would retry the player name for each of them.
+    Named group e<index> tells which entry matched, that entry's own pattern is then used to get the fields.
+    """
+
+    other, player = [], []
+    for index, (pattern, cls, fields) in enumerate(patterns):
+        if pattern.pattern.startswith(player_prefix): player.append(f"(?P<e{index}>{pattern.pattern[len(player_prefix):]})")
+        else: other.append(f"(?P<e{index}>{pattern.pattern})")
+    return re.compile('|'.join(other) + rf"|^\w{{1,16}} (?:{'|'.join(player)})")
+
+event_pattern = compile_event_patterns(event_patterns)
+
+def parse_message(message, text=None, time=None, thread=None, level=None, source=None, seq=None):
+    """
+    Matches message against event_patterns.
+
+    Args:
+        message str: Log line's message part, or RCON response.
+        text [str:message]: Whole line. Rest of args are the line's header parts, see LogEvent.
+
+    Returns:
+        LogEvent: Subclass if message matches one of event_patterns, else plain LogEvent.
+    """
+
+    if text is None: text = message
+    match = event_pattern.match(message)
+    if match is None: return LogEvent(text, time, thread, level, source, message, seq)
+
+    pattern, cls, fields = event_patterns[int(match.lastgroup[1:])]
+    event = cls(text, time, thread, level, source, message, seq)
+    for name, value in zip(cls.fields, fields(pattern.match(message))): setattr(event, name, value)
+    return event
+
+def parse_line(text, seq=None):
+    """
+    Splits a server log line into its parts, and checks if it's an event (chat, join, ban, etc).
+    Lines that don't match the usual format (e.g. stack traces) only get text and message.
+
+    Args:
+        text str: Log line, without trailing newline.
+        seq [int:None]: Line's sequence number in LogBuffer.
+
+    Returns:
+        LogEvent: Or subclass like ChatEvent, check .kind.
+    """
+
+    text = remove_ansi(text)
+    match = log_line_pattern.match(text)
+    if match:
+        time, thread, level, source, message = match.groups()
+        return parse_message(message, text, time, thread, level, source, seq)
+    match = console_line_pattern.match(text)
+    if match: return parse_message(match[3], text, match[1], None, match[2], None, seq)
+    return LogEvent(text, seq=seq)
+
+def find_event(events, kind):
+    """Returns first event of kind from list of LogEvents, or None."""
+
+    return next((event for event in events if event.kind == kind), None)
+
+time_of_day_pattern = re.compile(r'(\d\d):(\d\d):(\d\d)')
+
+def event_timestamp(event, now=None):
+    """
+    Converts LogEvent's time of day to Unix time. Most logs only have time of day, so assumes it's from the last 24 hours.
+
+    Returns:
+        float: None if event has no time.
+    """
+
+    match = time_of_day_pattern.search(event.time or '')
+    if not match: return None
+    now = now or time.time()
+    moment = datetime.datetime.fromtimestamp(now).replace(hour=int(match[1]), minute=int(match[2]), second=int(match[3]), microsecond=0).timestamp()
+    return moment - 86400 if moment > now + 60 else moment
+
+class Roster:
+    """
+    Players online, kept current from join/leave/kick events in server output instead of asking server with list command each time.
+    Server start and stop events clear it. handle() gets called from LogFeed's publishing thread, so everything uses lock.
+    """
+
+    def __init__(self, on_session=None):
+        """
+        Args:
+            on_session [callable:None]: Called with player name, session start, and end Unix times when a player leaves.
+        """
+
+        self.on_session = on_session
+        self.lock = threading.Lock()
+        self.players = {}  # Name: Unix time session started, None if unknown.
+        self.synced = False  # If roster is known to match server, False until first sync() or server start/stop.
+        self.rotations = 0  # LogTailer.rotations at last sync.
+
+    def handle(self, event):
+        """LogFeed subscriber callback."""
+
+        kind = event.kind
+        if kind not in ('join', 'leave', 'kick', 'players', 'start', 'stop'): return
+        ended, now = {}, event_timestamp(event) or time.time()
+        with self.lock:
+            if kind == 'join': self.players[event.player] = now
+            elif kind in ('leave', 'kick'):
+                if event.player in self.players: ended[event.player] = self.players.pop(event.player)
+            elif kind in ('start', 'stop'):
+                ended = dict(self.players)
+                self.players.clear()
+                self.synced = True
+        if kind == 'players': self.sync(event.players)  # Anyone's list command keeps roster in sync for free.
+        self.end_sessions(ended, now)
+
+    def end_sessions(self, ended, end):
+        if not self.on_session: return
+        for name, start in ended.items():
+            if start: self.on_session(name, start, end)
+
+    def sync(self, names, events=(), rotations=None):
+        """
+        Replaces roster with names from list command. Keeps session start times of players already in roster.
+
+        Args:
+            names list: Player names.
+            events [list:()]: Recent LogEvents, used to find session start of players that joined before roster was following the log.
+            rotations [int:None]: LogTailer.rotations, so a later rotation can be noticed.
+        """
+
+        joins = {event.player: event_timestamp(event) for event in events if event.kind == 'join'}
+        with self.lock:
+            ended = {name: start for name, start in self.players.items() if name not in names}  # Left without roster seeing it.
+            self.players = {name: self.players.get(name) or joins.get(name) for name in names}
+            self.synced = True
+            if rotations is not None: self.rotations = rotations
+        self.end_sessions(ended, time.time())
+
+    def clear(self):
+        """Empties roster and marks it out of sync, e.g. when server isn't running."""
+
+        with self.lock:
+            self.players.clear()
+            self.synced = False
+
+    def online(self):
+        """
+        Returns:
+            list: (name, session start Unix time or None) tuples, longest online first.
+        """
+
+        with self.lock: players = list(self.players.items())
+        return sorted(players, key=lambda i: (i[1] is None, i[1] or 0))
+
+# LogBuffer category for each event kind.
+event_categories = {'chat': 'chat', 'join': 'join', 'leave': 'join', 'kick': 'join', 'death': 'death', 'ban': 'ban', 'pardon': 'ban', 'bancount': 'ban'}
+
+def categorize(line):
+    """Returns list of LogBuffer categories LogEvent belongs to. 'command' category is tagged separately with LogBuffer.tag()."""
+
+    categories = []
+    if line.level in ('WARN', 'ERROR', 'FATAL'): categories.append('warning')
+    if line.time is None: return categories
+    if line.kind in event_categories: categories.append(event_categories[line.kind])
+    return categories
+
+
+class LogBuffer:
+    """
+    Fixed size ring of recent log lines, with secondary indexes of sequence numbers by category (chat, join, death, ban, command, warning),
+    so e.g. recent chat lines can be fetched without scanning everything. Lines are stored as plain strings and parsed again when read.
+    Oldest lines are evicted when either max_lines or max_bytes is reached.
+    """
+
+    categories = ('chat', 'join', 'death', 'ban', 'command', 'warning')
+
+    def __init__(self, max_lines=1000, max_bytes=None):
+        self.max_lines, self.max_bytes = max_lines, max_bytes
+        self.ring = [None] * max_lines
+        self.start = self.end = 0  # Sequence numbers of oldest line, and of next line to be added.
+        self.size = 0
+        self.index = {category: collections.deque() for category in self.categories}
+
+    def __len__(self): return self.end - self.start
+
+    def evict(self):
+        """Removes oldest line."""
+
+        slot = self.start % self.max_lines
+        self.size -= sys.getsizeof(self.ring[slot])
+        self.ring[slot] = None
+        self.start += 1
+        for seqs in self.index.values():
+            while seqs and seqs[0] < self.start: seqs.popleft()
+
+    def append(self, text, line=None):
+        """
+        Adds line, evicting oldest lines if needed.
+
+        Args:
+            text str: Log line.
+            line [LogEvent:None]: Already parsed line, used for categorizing.
+
+        Returns:
+            int: Sequence number of new line.
+        """
+
+        size = sys.getsizeof(text)
+        while len(self) >= self.max_lines or (self.max_bytes and len(self) and self.size + size > self.max_bytes):
+            self.evict()
+
+        seq = self.end
+        self.ring[seq % self.max_lines] = text
+        self.size += size
+        self.end += 1
+        for category in categorize(line or parse_line(text)):
+            self.index[category].append(seq)
+        return seq
+
+    def tag(self, seqs, category):
+        """Adds lines to category index, e.g. command responses."""
+
+        index = self.index[category]
+        for seq in sorted(seqs):
+            if seq >= self.start and (not index or seq > index[-1]): index.append(seq)
+
+    def get(self, seq):
+        """Returns LogEvent for sequence number, or None if evicted."""
+
+        if self.start <= seq < self.end: return parse_line(self.ring[seq % self.max_lines], seq)
+
+    def recent(self, lines=None, category=None):
+        """
+        Most recent lines, oldest first.
+
+        Args:
+            lines [int:None]: Max number of lines, None for all.
+            category [str:None]: Only lines from this category.
+
+        Returns:
+            list: LogEvents.
+        """
+
+        if category is None: seqs = range(self.start, self.end)
+        else: seqs = self.index[category]
+
+        count = len(seqs) if not lines else min(lines, len(seqs))
+        return [self.get(seqs[i]) for i in range(len(seqs) - count, len(seqs))]
+
+def read_tail(file_path, lines):
+    """
+    Reads last x lines of file by seeking backwards in blocks from end of file.
+
+    Returns:
+        tuple: List of lines (oldest first), and byte offset of end of file.
+    """
+
+    with open(file_path, 'rb') as file:
+        end = file.seek(0, os.SEEK_END)
+        position, data = end, b''
+        while position > 0 and data.count(b'\n') <= lines:
+            step = min(8192, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+
+    text = data.decode('utf-8', errors='replace').splitlines()
+    return text[-lines:], end
+
+
+class LogFeed:
+    """
+    Publishes server output lines to subscribers, and keeps the most recent lines in memory so callers don't need to read the log file.
+    Subscriber callbacks get called from the thread that published the line, use subscribe_queue() from async code.
+    """
+
+    def __init__(self, max_lines=1000, max_bytes=None):
+        self.buffer = LogBuffer(max_lines, max_bytes)
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Calls callback(LogEvent) for every new line. Returns callback, pass it to unsubscribe() when done."""
+
+        with self.lock: self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers: self.subscribers.remove(callback)
+
+    def subscribe_queue(self, loop=None):
+        """
+        Subscribes an asyncio.Queue that receives every new LogEvent, safe to use from the event loop.
+
+        Returns:
+            tuple: Queue, and the callback to pass to unsubscribe().
+        """
+
+        loop = loop or asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        callback = self.subscribe(lambda line: loop.call_soon_threadsafe(queue.put_nowait, line))
+        return queue, callback
+
+    def publish(self, text):
+        """Parses line, stores it, and passes it to subscribers."""
+
+        with self.lock:
+            line = parse_line(text, self.buffer.end)
+            self.buffer.append(text, line)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try: callback(line)
+            except: pass
+        return line
+
+    def recent(self, lines=None, category=None):
+        """Returns list of most recent LogEvents, oldest first. See LogBuffer.recent()."""
+
+        with self.lock: return self.buffer.recent(lines, category)
+
+    def tag(self, lines, category):
+        """Adds LogEvents to a LogBuffer category index."""
+
+        with self.lock: self.buffer.tag([line.seq for line in lines if line.seq is not None], category)
+
+
+class LogTailer(LogFeed):
+    """
+    Follows a log file by byte offset on a background thread, publishing new lines as they're written.
+    Handles Minecraft's log rotation (latest.log renamed to a dated .log.gz and a new latest.log started)
+    by finishing the old file handle before switching over to the new file.
+    """
+
+    def __init__(self, file_path, max_lines=1000, max_bytes=None, poll_interval=0.2):
+        super().__init__(max_lines, max_bytes)
+        self.file_path = file_path
+        self.poll_interval = poll_interval
+        self.file = self.inode = None
+        self.offset = 0
+        self.partial = b''
+        self.rotations = 0
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Loads last lines of current log into memory, then starts following file from its end."""
+
+        if self.running: return self
+        if os.path.isfile(self.file_path):
+            lines, self.offset = read_tail(self.file_path, self.buffer.max_lines)
+            for text in lines: self.buffer.append(text)
+            self.open()
+
+        self.running = True
+        self.thread = threading.Thread(target=self.follow, name='log_tailer', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread: self.thread.join()
+        if self.file: self.file.close()
+        self.file = None
+
+    def open(self):
+        self.file = open(self.file_path, 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+
+    def read_new(self):
+        """Reads bytes written since last read and publishes complete lines."""
+
+        self.file.seek(self.offset)
+        data = self.file.read()
+        if not data: return
+        self.offset += len(data)
+
+        *lines, self.partial = (self.partial + data).split(b'\n')
+        for line in lines:
+            self.publish(line.rstrip(b'\r').decode('utf-8', errors='replace'))
+
+    def follow(self):
+        while self.running:
+            try:
+                stat = os.stat(self.file_path)
+            except FileNotFoundError:  # Between rename and new latest.log being created.
+                stat = None
+
+            try:
+                if self.file and (stat is None or stat.st_ino != self.inode or stat.st_size < self.offset):
+                    # Rotated or truncated, finish reading old file first.
+                    if stat is None or stat.st_ino != self.inode: self.read_new()
+                    if self.partial: self.publish(self.partial.decode('utf-8', errors='replace'))
+                    self.file.close()
+                    self.file, self.offset, self.partial = None, 0, b''
+                    self.rotations += 1
+
+                if self.file is None and stat is not None: self.open()
+                if self.file: self.read_new()
+            except OSError: pass
+
+            time.sleep(self.poll_interval)
+
+
+class LogIndex:
+    """
+    Full-text index of a server's logs (latest.log and rotated *.log.gz files) in SQLite FTS5 table, so searches don't read the logs at all.
+    Updated incrementally, rotated logs get indexed once, latest.log from where last update left off.
+    When latest.log gets rotated (its first line changes) its rows are dropped, since they'll be indexed again from the new .log.gz file.
+    Rowids follow log order (older rotated logs are indexed first), so newest matches are found without sorting all of them.
+    """
+
+    # Rotated logs are named like 2021-04-24-1.log.gz, by date they were started.
+    rotated_pattern = re.compile(r'^(\d{4}-\d\d-\d\d)-\d+\.log(?:\.gz)?$')
+    # Gets time of day and message part of line, works for vanilla, Paper console, and Forge's '[24Apr2021 12:00:00.123] [thread/INFO] [source/]: ' headers.
+    header_pattern = re.compile(r'^\[[^\]]*?(\d\d):(\d\d):(\d\d)[^\]]*\].*?\]: ?')
+
+    def __init__(self, logs_path, index_path):
+        self.logs_path, self.index_path = logs_path, index_path
+        self.lock = threading.Lock()  # One update at a time.
+
+    def connect(self):
+        db = sqlite3.connect(self.index_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        with db:
+            db.execute("PRAGMA journal_mode=WAL")  # Searches don't block updates.
+            db.execute("PRAGMA synchronous=NORMAL")
+            # first_rowid/last_rowid: File's range of rows in lines table. day/last_time: Date and time of day of last indexed line, for next update.
+            db.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, name TEXT UNIQUE, size INTEGER, position INTEGER, line INTEGER, "
+                       "head TEXT, day TEXT, last_time INTEGER, first_rowid INTEGER, last_rowid INTEGER, first_ts REAL, last_ts REAL)")
+            # Only message is stored, headers are mostly the same and would take about third of the space. Results show ts instead.
+            db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(message, file UNINDEXED, line UNINDEXED, ts UNINDEXED, columnsize=0)")
+        return db
+
+    def log_files(self):
+        """Returns list of log file names, rotated logs oldest first then latest.log."""
+
+        try: names = os.listdir(self.logs_path)
+        except OSError: return []
+        files = sorted((name for name in names if self.rotated_pattern.match(name)), key=lambda i: [int(j) if j.isdigit() else j for j in re.split(r'(\d+)', i)])
+        if 'latest.log' in names: files.append('latest.log')
+        return files
+
+    def update(self):
+        """
+        Indexes new log files and new lines in latest.log.
+
+        Returns:
+            int: Number of lines indexed.
+        """
+
+        if not os.path.isdir(self.logs_path): return 0
+
+        with self.lock:
+            db = self.connect()
+            try:
+                indexed = {row['name']: dict(row) for row in db.execute("SELECT * FROM files")}
+                files = self.log_files()
+                for name in set(indexed) - set(files):  # Deleted logs.
+                    self.remove_file(db, indexed[name])
+
+                total = 0
+                for name in files:
+                    file_path = os.path.join(self.logs_path, name)
+                    try: stat = os.stat(file_path)
+                    except OSError: continue
+                    row = indexed.get(name)
+                    if row is not None and row['size'] == stat.st_size: continue
+                    try: total += self.index_file(db, name, file_path, stat, row)
+                    except (OSError, EOFError): continue  # e.g. .gz file still being written.
+                return total
+            finally: db.close()
+
+    def remove_file(self, db, row):
+        with db:
+            if row['first_rowid'] is not None:
+                db.execute("DELETE FROM lines WHERE rowid BETWEEN ? AND ?", (row['first_rowid'], row['last_rowid']))
+            db.execute("DELETE FROM files WHERE id=?", (row['id'],))
+
+    def index_file(self, db, name, file_path, stat, row):
+        """Indexes whole file, or new part of latest.log. Returns number of lines indexed."""
+
+        head = ''
+        if name.endswith('.gz'):
+            with gzip.open(file_path, 'rb') as file: data = file.read()
+            position = stat.st_size
+            if row is not None:
+                self.remove_file(db, row)
+                row = None
+        else:
+            with open(file_path, 'rb') as file:
+                head = file.readline(200).decode('utf-8', errors='replace')
+                # Start over if file was rotated or truncated, else continue from last indexed position.
+                if row is not None and (stat.st_size < row['position'] or head != row['head']):
+                    self.remove_file(db, row)
+                    row = None
+                file.seek(row['position'] if row is not None else 0)
+                data = file.read(stat.st_size - file.tell())
+            data = data[:data.rfind(b'\n') + 1]  # Leaves partial last line for next update.
+            position = (row['position'] if row is not None else 0) + len(data)
+
+        lines = remove_ansi(data.decode('utf-8', errors='replace')).splitlines()
+        if row is None:
+            match = self.rotated_pattern.match(name)
+            if match: day = datetime.date.fromisoformat(match[1])
+            else:
+                # latest.log's last line is from day it was last modified, counts back a day each time the time of day goes backwards.
+                day = datetime.date.fromtimestamp(stat.st_mtime) - datetime.timedelta(days=self.day_changes(lines))
+            with db:
+                file_id = db.execute("INSERT INTO files (name, day) VALUES (?, ?)", (name, day.isoformat())).lastrowid
+            row = {'id': file_id, 'line': 0, 'last_time': 0, 'day': day.isoformat(), 'first_rowid': None, 'last_rowid': None, 'first_ts': None, 'last_ts': None}
+
+        file_id, line_number, last_time = row['id'], row['line'], row['last_time']
+        midnight = datetime.datetime.combine(datetime.date.fromisoformat(row['day']), datetime.time()).timestamp()
+
+        rows = []
+        for text in lines:
+            line_number += 1
+            match = self.header_pattern.match(text)
+            if match:
+                seconds = int(match[1]) * 3600 + int(match[2]) * 60 + int(match[3])
+                if seconds < last_time: midnight += 86400  # New day.
+                last_time = seconds
+                rows.append((text[match.end():], file_id, line_number, int(midnight) + seconds))
+            else: rows.append((text, file_id, line_number, int(midnight) + last_time))  # e.g. stack traces, gets previous line's time.
+
+        first_rowid, last_rowid, first_ts, last_ts = row['first_rowid'], row['last_rowid'], row['first_ts'], row['last_ts']
+        with db:
+            if rows:
+                db.executemany("INSERT INTO lines (message, file, line, ts) VALUES (?, ?, ?, ?)", rows)
+                last_rowid, last_ts = db.execute("SELECT max(rowid) FROM lines").fetchone()[0], rows[-1][3]
+                if first_rowid is None: first_rowid, first_ts = last_rowid - len(rows) + 1, rows[0][3]
+            db.execute("UPDATE files SET size=?, position=?, line=?, head=?, day=?, last_time=?, first_rowid=?, last_rowid=?, first_ts=?, last_ts=? WHERE id=?",
+                       (stat.st_size, position, line_number, head, datetime.date.fromtimestamp(midnight).isoformat(), last_time, first_rowid, last_rowid, first_ts, last_ts, file_id))
+        return len(rows)
+
+    def day_changes(self, lines):
+        """Number of times time of day goes backwards in lines."""
+
+        changes, last_time = 0, 0
+        for text in lines:
+            match = self.header_pattern.match(text)
+            if not match: continue
+            seconds = int(match[1]) * 3600 + int(match[2]) * 60 + int(match[3])
+            if seconds < last_time: changes += 1
+            last_time = seconds
+        return changes
+
+    def search(self, terms, since=None, until=None, limit=20):
+        """
+        Finds log lines with all terms.
+
+        Args:
+            terms list: Words to find, case insensitive. Word ending with * matches as prefix.
+            since [float:None]: Unix time of oldest line.
+            until [float:None]: Unix time of newest line.
+            limit [int:20]: Max lines.
+
+        Returns:
+            list: Dicts with file, line (line number), time (Unix time), text (line's message part). Newest first.
+        """
+
+        if not terms or not os.path.isfile(self.index_path): return []
+        query = ' '.join(f'"{term.rstrip("*").replace(chr(34), chr(34) * 2)}"' + ('*' if term.endswith('*') else '') for term in terms)
+
+        db = self.connect()
+        try:
+            files = {row['id']: row for row in db.execute("SELECT id, name, first_rowid, last_rowid, first_ts, last_ts FROM files")}
+            # Turns time range into rowid range using files table, so FTS only walks matches in files from that time.
+            low, high = 0, 2 ** 63 - 1
+            if since is not None:
+                rowids = [row['first_rowid'] for row in files.values() if row['first_rowid'] is not None and row['last_ts'] >= since]
+                if not rowids: return []
+                low = min(rowids)
+            if until is not None:
+                rowids = [row['last_rowid'] for row in files.values() if row['first_rowid'] is not None and row['first_ts'] <= until]
+                if not rowids: return []
+                high = max(rowids)
+
+            try:
+                rows = db.execute("SELECT message, file, line, ts FROM lines WHERE lines MATCH ? AND rowid BETWEEN ? AND ? AND ts BETWEEN ? AND ? "
+                                  "ORDER BY rowid DESC LIMIT ?", (query, low, high, since or 0, until or 1e11, limit)).fetchall()
+            except sqlite3.OperationalError: return []  # e.g. only punctuation in terms.
+            return [{'file': files[row['file']]['name'] if row['file'] in files else None, 'line': row['line'], 'time': row['ts'], 'text': row['message']} for row in rows]
+        finally: db.close()
+
+
+class BotLogger:
+    """
+    Appends lines to bot log file from a background thread so callers never wait on disk, lines queued meanwhile get written as one batch.
+    File gets rotated when it's over max_bytes or a new day started: old file is gzip compressed to e.g. bot_log.2021-04-24.txt.gz,
+    and only newest backup_count of those are kept. Last lines are also kept in memory for ?botlog. Queued lines are flushed on exit.
+    """
+
+    def __init__(self, file_path, max_bytes=5 * 1024 * 1024, daily=True, backup_count=14, recent_lines=500):
+        self.file_path = file_path
+        self.max_bytes, self.daily, self.backup_count = max_bytes, daily, backup_count
+        self.recent_lines = collections.deque(maxlen=recent_lines)
+        self.queue = queue.SimpleQueue()
+        self.file = self.day = None
+        self.thread = None
+
+    def start(self):
+        """Loads last lines of existing log into memory and starts writer thread."""
+
+        if self.thread: return self
+        if self.recent_lines.maxlen and os.path.isfile(self.file_path):
+            queued = list(self.recent_lines)  # Written before start, go after file's lines.
+            self.recent_lines.clear()
+            try: self.recent_lines.extend(read_tail(self.file_path, self.recent_lines.maxlen)[0])
+            except OSError: pass
+            self.recent_lines.extend(queued)
+
+        self.thread = threading.Thread(target=self.run, name='bot_logger', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        return self
+
+    def write(self, line):
+        """Queues line to be written, returns immediately."""
+
+        self.recent_lines.append(line)
+        self.queue.put(line)
+
+    def recent(self, lines=None):
+        """Returns list of most recent lines, oldest first."""
+
+        recent = list(self.recent_lines)
+        return recent[-lines:] if lines else recent
+
+    def flush(self, timeout=5):
+        """Blocks until lines queued so far are written to disk."""
+
+        if not self.thread or not self.thread.is_alive(): return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        """Writes remaining lines and stops writer thread. Needs to be called before os.exec*(), atexit doesn't run then."""
+
+        if not self.thread or not self.thread.is_alive(): return
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < 1000: batch.append(self.queue.get_nowait())
+            except queue.Empty: pass
+
+            lines, events = [], []
+            for item in batch:
+                if item is None: running = False
+                elif isinstance(item, threading.Event): events.append(item)
+                else: lines.append(item)
+
+            try: self.write_lines(lines)
+            except OSError: pass
+            for event in events: event.set()
+
+        if self.file: self.file.close()
+        self.file = None
+
+    def open(self):
+        self.file = open(self.file_path, 'a')
+        stat = os.fstat(self.file.fileno())
+        # Existing log's day is when it was last written to, so a log left from yesterday gets rotated on first write.
+        self.day = datetime.date.fromtimestamp(stat.st_mtime) if stat.st_size else datetime.date.today()
+
+    def write_lines(self, lines):
+        if not lines: return
+        if self.file is None: self.open()
+        if (self.max_bytes and self.file.tell() >= self.max_bytes) or (self.daily and self.day != datetime.date.today()):
+            self.rotate()
+
+        self.file.write('\n'.join(lines) + '\n')
+        self.file.flush()
+
+    def rotated_files(self):
+        """Returns list of rotated log files, oldest first."""
+
+        base, ext = os.path.splitext(self.file_path)
+        return sorted(glob.glob(f"{glob.escape(base)}.*{ext}.gz"), key=os.path.getmtime)
+
+    def rotate(self):
+        """Compresses current file into dated .gz file, starts new file, and deletes oldest rotated files."""
+
+        self.file.close()
+        base, ext = os.path.splitext(self.file_path)
+        rotated_path, count = f"{base}.{self.day}{ext}.gz", 1
+        while os.path.exists(rotated_path):
+            rotated_path = f"{base}.{self.day}.{count}{ext}.gz"
+            count += 1
+
+        with open(self.file_path, 'rb') as src, gzip.open(rotated_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.file_path)
+        self.open()
+
+        for file_path in self.rotated_files()[:-self.backup_count or None]:
+            os.remove(file_path)
+
+
+class RecordLogger(BotLogger):
+    """
+    Writes structured log records (dicts) as JSON lines, batched and rotated same as BotLogger. Records also get indexed in a
+    SQLite database by user, command, and time, so query() stays fast across months of logs without reading the JSON files.
+    """
+
+    record_fields = ('time', 'kind', 'user', 'user_id', 'command', 'args', 'duration', 'outcome', 'message')
+
+    def __init__(self, file_path, index_path, max_bytes=5 * 1024 * 1024, daily=True, backup_count=14):
+        super().__init__(file_path, max_bytes, daily, backup_count, recent_lines=0)
+        self.index_path = index_path
+        self.db = None  # Writer thread's connection, queries use their own.
+
+    def connect(self):
+        db = sqlite3.connect(self.index_path, timeout=10)
+        db.row_factory = sqlite3.Row
+        with db:
+            db.execute("PRAGMA journal_mode=WAL")  # Queries don't block writer thread.
+            db.execute("CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, ts REAL, time TEXT, kind TEXT, user TEXT, user_id INTEGER, "
+                       "command TEXT, args TEXT, duration REAL, outcome TEXT, message TEXT)")
+            for columns in ('ts', 'user_id, ts', 'user, ts', 'command, ts'):
+                db.execute(f"CREATE INDEX IF NOT EXISTS records_{columns.replace(', ', '_')} ON records ({columns})")
+        return db
+
+    def write(self, record):
+        """Queues record, dict with some of record_fields. 'time' is ISO format datetime string."""
+
+        self.queue.put(record)
+
+    def write_lines(self, records):
+        if not records: return
+        super().write_lines([json.dumps(record, default=str) for record in records])
+
+        if self.db is None: self.db = self.connect()
+        rows = [[datetime.datetime.fromisoformat(record['time']).timestamp()] + [record.get(i) for i in self.record_fields] for record in records]
+        with self.db:
+            self.db.executemany(f"INSERT INTO records (ts, {', '.join(self.record_fields)}) VALUES ({', '.join('?' * (len(self.record_fields) + 1))})", rows)
+
+    def query(self, user=None, command=None, since=None, until=None, outcome=None, kind=None, search=None, limit=20):
+        """
+        Finds records using index.
+
+        Args:
+            user [str:None]: Discord user ID, or part of user name.
+            command [str:None]: Command name.
+            since [float:None]: Unix time of oldest record.
+            until [float:None]: Unix time of newest record.
+            outcome [str:None]: 'ok' or 'error'.
+            kind [str:None]: 'command' for one record per command used (with duration and outcome), 'log' for lprint() messages.
+            search [str:None]: Text in message or command args.
+            limit [int:20]: Max records.
+
+        Returns:
+            list: Record dicts, newest first.
+        """
+
+        self.flush()
+        where, args = [], []
+        def condition(clause, *values):
+            where.append(clause)
+            args.extend(values)
+
+        if user is not None:
+            if str(user).isdigit(): condition("user_id=?", int(user))
+            else: condition("user LIKE ?", f"%{user}%")
+        for column, value in [('command', command), ('outcome', outcome), ('kind', kind)]:
+            if value is not None: condition(f"{column}=?", value)
+        if since is not None: condition("ts>=?", since)
+        if until is not None: condition("ts<=?", until)
+        if search: condition("(message LIKE ? OR args LIKE ?)", f"%{search}%", f"%{search}%")
+
+        query = f"SELECT {', '.join(self.record_fields)} FROM records"
+        if where: query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
+
+        if not os.path.isfile(self.index_path): return []
+        db = self.connect()
+        try: return [dict(row) for row in db.execute(query, args + [limit])]
+        finally: db.close()
+
+
+async def drain_stream(stream, feed, mirror=None):
+    """
+    Reads lines from asyncio StreamReader until EOF, publishing them to feed. Keeps a subprocess's pipe from filling up and freezing it.
+
+    Args:
+        stream StreamReader: e.g. subprocess stdout.
+        feed LogFeed: Where to publish lines.
+        mirror [file:None]: Optional open text file to also write lines to.
+    """
+
+    while True:
+        try: data = await stream.readline()
+        except ValueError: continue  # Line longer than stream's limit, gets dropped.
+        if not data: break
+
+        text = data.rstrip(b'\r\n').decode('utf-8', errors='replace')
+        feed.publish(text)
+        if mirror is not None:
+            mirror.write(text + '\n')
+
+async def drain_process(process, feed, mirror_path=None):
+    """
+    Drains subprocess stdout and stderr concurrently into feed until process closes them.
+
+    Args:
+        process asyncio.subprocess.Process: Started with stdout and stderr PIPE.
+        feed LogFeed: Where to publish lines.
+        mirror_path [str:None]: Also append output to this file.
+    """
+
+    mirror = open(mirror_path, 'a') if mirror_path else None
+    try:
+        await asyncio.gather(*[drain_stream(stream, feed, mirror) for stream in (process.stdout, process.stderr) if stream is not None])
+    finally:
+        if mirror is not None: mirror.close()
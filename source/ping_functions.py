@@ -0,0 +1,180 @@
+import asyncio, struct, json, time, re
+
+# Minecraft's Server List Ping, what the multiplayer menu uses to show MOTD, version, and players. Doesn't touch server console at all.
+# https://wiki.vg/Server_List_Ping
+
+format_code_pattern = re.compile('§.')  # Color/format codes like §a.
+
+def pack_varint(value):
+    """Encodes int as protocol VarInt, negative numbers as their 32 bit two's complement."""
+
+    value &= 0xFFFFFFFF
+    data = b''
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data += bytes([byte | 0x80])
+        else: return data + bytes([byte])
+
+async def read_varint(reader):
+    """Reads VarInt from asyncio StreamReader."""
+
+    value = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80: return value
+    raise ValueError("VarInt too long.")
+
+def pack_string(text):
+    data = text.encode('utf-8')
+    return pack_varint(len(data)) + data
+
+def pack_packet(packet_id, data=b''):
+    data = pack_varint(packet_id) + data
+    return pack_varint(len(data)) + data
+
+async def read_packet(reader):
+    """
+    Reads packet from server.
+
+    Returns:
+        tuple: Packet ID, and rest of packet's data.
+    """
+
+    length = await read_varint(reader)
+    data = await reader.readexactly(length)
+    packet_id, size = 0, 0
+    while True:  # VarInt packet ID at start of data.
+        byte = data[size]
+        packet_id |= (byte & 0x7F) << (7 * size)
+        size += 1
+        if not byte & 0x80: break
+    return packet_id, data[size:]
+
+def unpack_string(data):
+    """Reads VarInt prefixed string from start of data."""
+
+    length, shift, size = 0, 0, 0
+    while True:
+        byte = data[size]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        size += 1
+        if not byte & 0x80: break
+    return data[size:size + length].decode('utf-8', errors='replace')
+
+def flatten_description(description):
+    """Turns MOTD chat component (string, dict with 'text' and 'extra', or list of those) into plain text without format codes."""
+
+    if isinstance(description, str): return format_code_pattern.sub('', description)
+    if isinstance(description, list): return ''.join(flatten_description(i) for i in description)
+    if isinstance(description, dict):
+        return flatten_description(description.get('text', '')) + ''.join(flatten_description(i) for i in description.get('extra', []))
+    return ''
+
+async def status_ping(host, port):
+    """
+    Status request and ping using 1.7+ protocol.
+
+    Returns:
+        dict: See ping().
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        # Handshake with protocol version -1 (any) and next state 1 (status), then status request.
+        handshake = pack_varint(-1) + pack_string(host) + struct.pack('>H', port) + pack_varint(1)
+        start = time.perf_counter()
+        writer.write(pack_packet(0x00, handshake) + pack_packet(0x00))
+        await writer.drain()
+
+        packet_id, data = await read_packet(reader)
+        if packet_id != 0x00: raise ValueError(f"Unexpected packet: {packet_id}")
+        latency = time.perf_counter() - start
+        status = json.loads(unpack_string(data))
+
+        # Ping/pong for latency, some servers close connection instead of answering, then status request's round trip is used.
+        try:
+            payload = int(time.time() * 1000)
+            start = time.perf_counter()
+            writer.write(pack_packet(0x01, struct.pack('>q', payload)))
+            await writer.drain()
+            packet_id, data = await read_packet(reader)
+            if packet_id == 0x01 and data[:8] == struct.pack('>q', payload): latency = time.perf_counter() - start
+        except (OSError, asyncio.IncompleteReadError, IndexError): pass
+    finally:
+        writer.close()
+
+    players = status.get('players', {})
+    return {'version': {'name': format_code_pattern.sub('', str(status.get('version', {}).get('name', ''))), 'protocol': status.get('version', {}).get('protocol')},
+            'players': {'online': players.get('online', 0), 'max': players.get('max', 0), 'sample': [i.get('name', '') for i in players.get('sample') or []]},
+            'description': flatten_description(status.get('description', '')),
+            'latency': round(latency * 1000, 1), 'legacy': False}
+
+async def legacy_ping(host, port):
+    """
+    Ping using pre-1.7 protocol (0xFE 0x01), newer servers still answer it.
+
+    Returns:
+        dict: See ping(), players sample is always empty.
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        start = time.perf_counter()
+        writer.write(b'\xfe\x01')
+        await writer.drain()
+        if (await reader.readexactly(1)) != b'\xff': raise ValueError("Not a legacy ping response.")
+        length = struct.unpack('>H', await reader.readexactly(2))[0]
+        text = (await reader.readexactly(length * 2)).decode('utf-16-be')
+        latency = time.perf_counter() - start
+    finally:
+        writer.close()
+
+    # 1.4+: §1\0protocol\0version\0motd\0online\0max  Older: motd§online§max
+    if text.startswith('§1\x00'):
+        _, protocol, version, motd, online, max_players = text.split('\x00')[:6]
+    else:
+        motd, online, max_players = text.rsplit('§', 2)
+        protocol, version = None, ''
+    return {'version': {'name': version, 'protocol': int(protocol) if protocol and protocol.isdigit() else None},
+            'players': {'online': int(online) if online.isdigit() else 0, 'max': int(max_players) if max_players.isdigit() else 0, 'sample': []},
+            'description': flatten_description(motd), 'latency': round(latency * 1000, 1), 'legacy': True}
+
+async def ping(host, port=25565, timeout=3, legacy=True):
+    """
+    Gets server's status using Server List Ping.
+
+    Args:
+        host str: Server address.
+        port [int:25565]: Server port.
+        timeout [int:3]: Max seconds for each attempt.
+        legacy [bool:True]: Try pre-1.7 ping if normal one fails (but server is listening).
+
+    Returns:
+        dict: 'version' ({'name', 'protocol'}), 'players' ({'online', 'max', 'sample' list of names}), 'description' (MOTD as plain text),
+            'latency' (ms), 'legacy' (if legacy ping was used). None if server didn't answer.
+    """
+
+    try: return await asyncio.wait_for(status_ping(host, port), timeout)
+    except ConnectionRefusedError: return None  # Nothing listening, legacy ping won't work either.
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError): pass
+
+    if not legacy: return None
+    try: return await asyncio.wait_for(legacy_ping(host, port), timeout)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, UnicodeDecodeError): return None
+
+async def ping_all(addresses, timeout=3, legacy=True):
+    """
+    Pings servers concurrently, so total time is about the slowest server's instead of the sum.
+
+    Args:
+        addresses list: (host, port) tuples.
+
+    Returns:
+        list: ping() results in same order as addresses.
+    """
+
+    return await asyncio.gather(*[ping(host, port, timeout, legacy) for host, port in addresses])
@@ -1,4 +1,4 @@
-import time, sys, os
+import asyncio, time, sys, os
 from discord_mc_bot import bot, TOKEN
 import server_functions
 
@@ -53,7 +53,7 @@ def start_server():
     """Start Minecraft server, method varies depending on variables set in slime_vars.py."""
 
     if server_functions.use_tmux is True:
-        server_functions.mc_start()
+        asyncio.run(server_functions.mc_start())
     else: bot.run(TOKEN)
 
 
@@ -90,6 +90,7 @@ def script_help():
 
 
 if __name__ == '__main__':
+    server_functions.start_loggers()
     if 'setup' in sys.argv:
         if server_functions.server_files_access is True:
             setup_directories()
@@ -1,12 +1,37 @@
-import subprocess, requests, datetime, asyncio, random, time, csv, os, re
+import subprocess, collections, contextlib, threading, functools, requests, datetime, asyncio, random, time, csv, os, re
 from file_read_backwards import FileReadBackwards
 from bs4 import BeautifulSoup
 from slime_vars import *
+import log_functions, backup_functions, ping_functions, stats_functions
 
 # Removes unwanted ANSI escape characters.
-def remove_ansi(text):
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+remove_ansi = log_functions.remove_ansi
+
+# Writes bot_log_file on a background thread, see log_functions.BotLogger.
+bot_logger = log_functions.BotLogger(bot_log_file, bot_log_max_kb * 1024, bot_log_rotate_daily, bot_log_backups)
+# Same as JSON lines records, indexed for ?botlog queries.
+record_logger = log_functions.RecordLogger(bot_records_file, bot_records_index, bot_log_max_kb * 1024, bot_log_rotate_daily, bot_log_backups)
+
+def start_loggers():
+    """
+    Starts bot_logger and record_logger writer threads, lines logged before this are kept queued until then.
+    Called when bot or run_bot.py starts, so just importing this module doesn't create or rotate log files.
+    """
+
+    bot_logger.start()
+    record_logger.start()
+
+def command_record(ctx):
+    """Returns dict with user, user_id, command, and args from Discord ctx, for record_logger."""
+
+    record = {}
+    try: record.update(user=str(ctx.message.author), user_id=ctx.message.author.id)
+    except: record['user'] = 'N/A'
+    try:
+        record['command'] = ctx.command.qualified_name
+        record['args'] = ' '.join([str(i) for i in ctx.args[2:]] + [f"{k}={v}" for k, v in ctx.kwargs.items()])  # Skips cog and ctx.
+    except: pass
+    return record
 
 # Outputs and logs used bot commands and which Discord user invoked them.
 def lprint(arg1=None, arg2=None):
@@ -17,18 +42,89 @@ def lprint(arg1=None, arg2=None):
         except: user = 'N/A'
         msg = arg2
 
-    output = f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] ({user}): {msg}"
+    now = datetime.datetime.now()
+    output = f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] ({user}): {msg}"
     print(output)
 
-    # Logs output.
-    with open(bot_log_file, 'a') as file:
-        file.write(output + '\n')
+    bot_logger.write(output)
+    record = {'time': now.isoformat(timespec='milliseconds'), 'kind': 'log', 'user': str(user), 'message': str(msg)}
+    if type(arg1) is not str: record.update(command_record(arg1))
+    record_logger.write(record)
+
+def log_command(ctx, duration, outcome):
+    """Adds record of used command, with how long it took (seconds) and outcome ('ok' or 'error'). Called by bot's after_invoke hook."""
+
+    record = {'time': datetime.datetime.now().isoformat(timespec='milliseconds'), 'kind': 'command', 'duration': round(duration, 3), 'outcome': outcome}
+    record.update(command_record(ctx))
+    record_logger.write(record)
+
+def parse_time_arg(text):
+    """
+    Converts relative time (e.g. 30m, 12h, 7d, 2w) or date (2021-04-24, 2021-04-24T12:00) to Unix time.
+
+    Returns:
+        float: None if text couldn't be parsed.
+    """
+
+    match = re.match(r'^(\d+)([mhdw])$', text)
+    if match:
+        return time.time() - int(match[1]) * {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}[match[2]]
+    try: return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError: return None
+
+def query_bot_log(query):
+    """
+    Searches structured bot log records.
+
+    Args:
+        query list: Words from ?botlog, key:value filters (user, command, since, until, outcome, kind, limit), other words are searched for in messages.
+
+    Returns:
+        list: Record dicts, newest first. False if a filter couldn't be parsed.
+    """
+
+    filters, search = {'limit': 20}, []
+    for word in query:
+        key, _, value = word.partition(':')
+        if not value or key not in ('user', 'command', 'since', 'until', 'outcome', 'kind', 'limit'):
+            search.append(word)
+            continue
+
+        if key in ('since', 'until'):
+            value = parse_time_arg(value)
+            if value is None: return False
+        elif key == 'limit':
+            try: value = int(value)
+            except ValueError: return False
+        elif key == 'user': value = value.strip('<@!>')  # Discord mentions look like <@!1234>.
+        filters[key] = value
+
+    return record_logger.query(search=' '.join(search) or None, **filters)
 
 lprint("Server selected: " + server_selected[0])
 
 
 # ========== Server commands: start, send command, read log, etc
-def mc_start():
+async def run_blocking(func, *args, **kwargs):
+    """Runs blocking function (file I/O, RCON, etc) in default thread pool executor so it doesn't stall the bot's event loop."""
+
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+async def tmux_send(keys, target='mcserver:1.0'):
+    """
+    Sends keys to Tmux pane followed by ENTER, using asyncio subprocess so event loop isn't blocked.
+    Keys are passed as a single argument, so no shell quoting needed.
+
+    Returns:
+        bool: If tmux exited successfully.
+    """
+
+    try:
+        process = await asyncio.create_subprocess_exec('tmux', 'send-keys', '-t', target, keys, 'ENTER', stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    except OSError: return False
+    return await process.wait() == 0
+
+async def mc_start():
     """
     Start Minecraft server depending on whether you're using Tmux subprocess method.
 
@@ -40,75 +136,255 @@ def mc_start():
 
     global mc_subprocess
 
-    os.chdir(server_path)
     if use_subprocess is True:
         # Runs MC server as subprocess. Note, If this script stops, the server will stop.
         try:
-            mc_subprocess = subprocess.Popen(server_selected[2].split(), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            mc_subprocess = await asyncio.create_subprocess_exec(*server_selected[2].split(), cwd=server_path, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
         except: lprint("Error server starting subprocess")
+        else:
+            # Keeps reading stdout/stderr so pipes don't fill up and freeze server.
+            asyncio.ensure_future(log_functions.drain_process(mc_subprocess, get_log_feed(), subprocess_log_file))
 
-        if type(mc_subprocess) == subprocess.Popen: return True
+        if mc_subprocess is not None: return True
 
     elif use_tmux is True:
-        os.system('tmux send-keys -t mcserver:1.0 "cd /" ENTER')  # Fix: 'java.lang.Error: Properties init: Could not determine current working' error
-        os.system(f'tmux send-keys -t mcserver:1.0 "cd {server_path}" ENTER')
+        await tmux_send('cd /')  # Fix: 'java.lang.Error: Properties init: Could not determine current working' error
+        await tmux_send(f'cd {server_path}')
 
         # Tries starting new detached tmux session.
-        if not os.system(f'tmux send-keys -t mcserver:1.0 "{server_selected[2]}" ENTER'):
+        if await tmux_send(server_selected[2]):
             return True
     else: return "Error starting server."
 
-# Sends command to tmux window running server.
+# Sends command text to server's console, either through subprocess stdin or Tmux.
+async def send_command(command):
+    """
+    Writes command to server console without waiting for output.
+
+    Returns:
+        bool: If command was sent.
+    """
+
+    if use_subprocess is True:
+        if mc_subprocess is None: return False
+        try:
+            mc_subprocess.stdin.write(bytes(command + '\n', 'utf-8'))
+            await mc_subprocess.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError): return False
+        return True
+    elif use_tmux is True:
+        return await tmux_send(command)
+    return False
+
+# Error lines server prints before echoing unknown command, used to trim closing marker's output.
+marker_error_lines = ['Incorrect argument for command', 'Unknown or incomplete command, see below for error', 'Unknown command. Type "/help" for help.']
+send_lock = None  # asyncio.Lock, only held while a command and its markers are written so their lines stay together.
+
+async def mc_command_response(command, timeout=None):
+    """
+    Sends command bracketed by two unique status_checker markers, resolves as soon as closing marker shows up in server output.
+    Markers are sent as invalid debug commands, which the server echoes back in the log.
+    Every call watches the feed for its own markers, so concurrent commands wait for their responses in parallel.
+
+    Args:
+        command str: Command to send. Empty string only sends the markers, to check if server is responding.
+        timeout [int:command_timeout]: Seconds to wait for closing marker.
+
+    Returns:
+        bool: False if server output can't be read, or closing marker didn't show up before timeout.
+        list: LogEvents the server output between the markers.
+    """
+
+    global send_lock
+
+    feed = get_log_feed()
+    if feed is None: return False
+    if send_lock is None: send_lock = asyncio.Lock()
+
+    marker = f"status_checker{random.getrandbits(32):08x}"
+    open_marker, close_marker = marker + 'open', marker + 'close'
+    deadline = time.monotonic() + (timeout or command_timeout)
+
+    lines, opened = [], False
+    queue, callback = feed.subscribe_queue()
+    try:
+        async with send_lock:
+            for text in [f"debug {open_marker}", command, f"debug {close_marker}"]:
+                if text and not await send_command(text): return False
+
+        while True:
+            line = await asyncio.wait_for(queue.get(), deadline - time.monotonic())
+            if close_marker in line.text: break
+            if opened: lines.append(line)
+            elif open_marker in line.text: opened = True
+    except asyncio.TimeoutError: return False
+    finally: feed.unsubscribe(callback)
+
+    while lines and any(i in lines[-1].message for i in marker_error_lines): lines.pop()
+    feed.tag(lines, 'command')
+    return lines
+
 async def mc_command(command, stop_at_checker=True, bot_ctx=None):
     """
     Sends command to Minecraft server. Depending on whether server is a subprocess or in Tmux session or using RCON.
-    Sends command to server, then reads from latest.log file for output.
+    Gets command's output lines using mc_command_response(), which waits for command's closing marker instead of fixed delays.
     If using RCON, will only return RCON returned data, can't read from server log.
 
     Args:
         command: Command to send.
-        stop_at_checker [bool:True]: Only returns log output under sent status_checker
+        stop_at_checker [bool:True]: Returns tuple of output and its LogEvents, so result is truthy even if command had no output.
         botx_ctx [Discord_bot_object:None]: Pass in bot object to send messages.
 
     Returns:
         bool: If error sending command to server, sends False boolean.
-        str: Returns matched string if match found.
+        str: Output lines from command.
+        tuple: Output lines and list of LogEvents, if stop_at_checker is True.
     """
 
-    global mc_subprocess
-
-    status_checker = 'debug status_checker' + str(random.random())
-
-    if use_rcon is True: return mc_rcon(command)
-
-    elif use_subprocess is True:
-        if mc_subprocess is not None:
-            mc_subprocess.stdin.write(bytes(command + '\n', 'utf-8'))
-            mc_subprocess.stdin.flush()
-        else: return False
+    if use_rcon is True: return await run_blocking(mc_rcon, command)
 
-    elif use_tmux is True:
-        os.system(f'tmux send-keys -t mcserver:1.0 "{status_checker}" ENTER')
-        await asyncio.sleep(1)
-        if not mc_log(status_checker):
-            if bot_ctx:
-                await bot_ctx.send("Server not active.")
-                return False
-        os.system(f'tmux send-keys -t mcserver:1.0 "{command}" ENTER')
-    else:
+    if use_subprocess is not True and use_tmux is not True:
         if bot_ctx:
             await bot_ctx.send("**ERROR:** Trouble sending command.")
         return False
 
-    time.sleep(1)
+    response = await mc_command_response(command)
+    if response is False:
+        if bot_ctx:
+            await bot_ctx.send("Server not active.")
+        return False
+
+    log_data = '\n'.join(line.text for line in response)
     if stop_at_checker is True:
-        return mc_log(command), status_checker
-    else: return mc_log(command)
+        return log_data, response
+    else: return log_data
+
+async def mc_command_event(command, kind):
+    """
+    Sends command and gets the event of kind from its output, e.g. 'players' event for list command. See log_functions.parse_line().
+
+    Args:
+        command str: Command to send.
+        kind str: LogEvent kind to look for.
+
+    Returns:
+        LogEvent: Or None if server didn't respond with that kind of line.
+    """
+
+    response = await mc_command(command)
+    if not response: return None
+
+    # RCON response is just the message(s), without log line header, and can have § format codes (e.g. Paper's tps).
+    if use_rcon is True: events = [log_functions.parse_message(ping_functions.format_code_pattern.sub('', remove_ansi(i))) for i in response.splitlines()]
+    else: events = response[1]
+    return log_functions.find_event(events, kind)
+
+# Long-lived RCON connection, one per server address.
+class RCONSession:
+    """
+    Keeps an authenticated mctools.RCONClient open between commands, so each command is a single request/response.
+    Reconnects on demand with exponential backoff, and uses a lock so concurrent commands can't interleave packets.
+    """
+
+    def __init__(self, host, port, password):
+        self.host, self.port, self.password = host, port, password
+        self.client = None
+        self.lock = threading.Lock()
+        self.failures = 0  # Consecutive failed connection attempts.
+        self.retry_at = 0  # time.monotonic() value before which no reconnect is attempted.
+        self.last_error = None
+        self.last_success = None
+        self.latency = None
+
+    def connect(self):
+        """
+        Connects and authenticates if not already connected. Skips attempt while still backing off from last failure.
+
+        Returns:
+            bool: If session is connected and authenticated.
+        """
+
+        if self.client is not None: return True
+        if time.monotonic() < self.retry_at: return False
+
+        client = mctools.RCONClient(self.host, port=self.port, timeout=rcon_timeout)
+        try:
+            if not client.login(self.password):
+                raise ConnectionError("RCON authentication failed.")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.retry_at = time.monotonic() + min(rcon_retry_max, 2 ** (self.failures - 1))
+            try: client.stop()
+            except: pass
+            lprint(f"Error Connecting to RCON: {self.host} : {self.port} ({e})")
+            return False
+
+        self.client, self.failures, self.retry_at = client, 0, 0
+        return True
+
+    def close(self):
+        """Closes connection, next command will reconnect."""
+
+        if self.client is not None:
+            try: self.client.stop()
+            except: pass
+        self.client = None
+
+    def command(self, command):
+        """
+        Sends command over the open connection. If the connection went stale (e.g. server restarted), reconnects and retries once.
+
+        Returns:
+            bool: False if couldn't connect or send command.
+            str: Output from RCON.
+        """
+
+        with self.lock:
+            for _ in range(2):
+                if not self.connect(): return False
+
+                start = time.monotonic()
+                try: response = self.client.command(command)
+                except Exception as e:
+                    self.last_error = str(e)
+                    self.close()
+                    continue
+
+                self.latency = time.monotonic() - start
+                self.last_success = time.time()
+                return response
+            return False
+
+    def health(self):
+        """
+        Connection health of session.
+
+        Returns:
+            dict: 'connected', 'failures', 'retry_in' (seconds), 'latency' (ms), 'last_success' (datetime), 'last_error'.
+        """
+
+        return {'connected': self.client is not None,
+                'failures': self.failures,
+                'retry_in': max(0, round(self.retry_at - time.monotonic(), 1)),
+                'latency': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'last_success': datetime.datetime.fromtimestamp(self.last_success) if self.last_success else None,
+                'last_error': self.last_error}
+
+rcon_sessions = {}
+
+def get_rcon_session():
+    """Returns RCONSession for current server_ip and rcon_port, creates it if needed."""
+
+    key = (server_ip, rcon_port)
+    if key not in rcon_sessions:
+        rcon_sessions[key] = RCONSession(server_ip, rcon_port, rcon_pass)
+    return rcon_sessions[key]
 
 # Send commands to server using RCON.
 def mc_rcon(command=''):
     """
-    Send command to server with RCON.
+    Send command to server with RCON, reuses persistent RCONSession connection.
 
     Args:
         command: Minecraft command.
@@ -118,18 +394,244 @@ def mc_rcon(command=''):
         str: Output from RCON.
     """
 
-    mc_rcon_client = mctools.RCONClient(server_ip, port=rcon_port)
-    try:
-        mc_rcon_client.login(rcon_pass)
-    except ConnectionError:
-        lprint(f"Error Connecting to RCON: {server_ip} : {rcon_port}")
-        return False
-    else: return mc_rcon_client.command(command)
+    return get_rcon_session().command(command)
+
+def rcon_health():
+    """Returns RCONSession.health() dictionary for current server."""
+
+    return get_rcon_session().health()
+
+# Server output lines, started by get_log_feed().
+log_feed = None
+# Player count history and play sessions, see stats_functions.
+player_counts = stats_functions.TimeSeries(f"{stats_path}/players", stats_interval, stats_raw_days)
+player_sessions = stats_functions.SessionStore(f"{stats_path}/sessions")
+# Players online, following join/leave events from log_feed.
+roster = log_functions.Roster(player_sessions.add)
+
+def get_log_feed():
+    """
+    Gets feed of server output lines. If using subprocess, lines come from server's stdout/stderr (see mc_start).
+    Else starts LogTailer following server's latest.log if not already running.
+
+    Returns:
+        LogFeed: Server output feed, or None if there's no way to read server output.
+    """
+
+    global log_feed
+
+    if log_feed is None:
+        if use_subprocess is True:
+            log_feed = log_functions.LogFeed(log_buffer_lines, log_buffer_max_kb * 1024)
+        elif server_files_access is True:
+            log_feed = log_functions.LogTailer(f"{server_path}/logs/latest.log", log_buffer_lines, log_buffer_max_kb * 1024, log_poll_interval).start()
+        if log_feed is not None: log_feed.subscribe(roster.handle)
+    return log_feed
+
+async def get_roster():
+    """
+    Gets players online from roster, instantly unless it needs to resync with list command first (on startup, or after log rotation).
+
+    Returns:
+        list: (name, session start Unix time or None) tuples, see log_functions.Roster.online(). None if server output can't be read or server isn't responding.
+    """
+
+    feed = get_log_feed()
+    if feed is None: return None
+
+    # Server stopped without logging it (e.g. crashed), or isn't running.
+    if status_service.values.get('online') is False:
+        roster.clear()
+        return None
+
+    rotations = getattr(feed, 'rotations', 0)
+    if not roster.synced or roster.rotations != rotations:
+        event = await mc_command_event('list', 'players')
+        if event is None: return None
+        roster.sync(event.players, feed.recent(category='join'), rotations)
+    return roster.online()
+
+async def sample_player_count():
+    """Adds number of players online now to player_counts, 0 if server isn't running."""
+
+    if await status_service.get('online') is not True: count = 0
+    else:
+        players = await get_roster()
+        if players is None:
+            ping = status_service.values.get('ping')
+            if not ping: return
+            count = ping['players']['online']
+        else: count = len(players)
+    await run_blocking(player_counts.add, count)
+
+def get_playtime(player, since=None):
+    """
+    Player's total playtime, including current session if online.
+
+    Returns:
+        tuple: Seconds, number of sessions, and last seen Unix time (None if never seen). See stats_functions.SessionStore.playtime().
+    """
+
+    current = next((start for name, start in roster.online() if name.lower() == player.lower()), None)
+    return player_sessions.playtime(player, since, current=current)
+
+def get_top_playtime(since=None, limit=10):
+    """Returns list of (name, seconds) tuples, most played first."""
+
+    return player_sessions.top(since, limit, current={name: start for name, start in roster.online() if start})
+
+# Tick performance, TPS kept with 2 decimals and MSPT with 1.
+perf_tps = stats_functions.TimeSeries(f"{stats_path}/tps", perf_interval, stats_raw_days, scale=100)
+perf_mspt = stats_functions.TimeSeries(f"{stats_path}/mspt", perf_interval, stats_raw_days, scale=10)
+perf_last = None  # Last sample from sample_perf().
+perf_low_count = 0  # Consecutive samples under perf_alert_tps.
+perf_alerting = False
+
+def server_type(server=None):
+    """
+    Which commands server has for tick performance.
+
+    Args:
+        server [list:server_selected]: Entry from server_list.
+
+    Returns:
+        str: From server_types if set for server, else guessed from its name and start command: 'paper', 'forge', or 'vanilla'.
+    """
+
+    server = server or server_selected
+    if server[0] in server_types: return server_types[server[0]]
+    text = f"{server[0]} {server[2]}".lower()
+    if any(i in text for i in ['paper', 'purpur', 'spigot']): return 'paper'
+    if 'forge' in text: return 'forge'
+    return 'vanilla'
+
+def remove_debug_reports(since):
+    """Deletes profiler reports vanilla's debug stop saves in server's debug/ folder, only ones made after since."""
+
+    if server_files_access is not True: return
+    try: names = os.listdir(f"{server_path}/debug")
+    except OSError: return
+    for name in names:
+        file_path = f"{server_path}/debug/{name}"
+        try:
+            if name.startswith('profile-results-') and os.path.getmtime(file_path) >= since: os.remove(file_path)
+        except OSError: pass
+
+perf_lock = None  # asyncio.Lock, so samples don't overlap (e.g. ?perf during perf_loop nesting debug start/stop).
+
+async def sample_perf(on_demand=False, max_age=0):
+    """
+    Gets server's tick performance using selected server's commands (see server_type), and stores it in perf_tps and perf_mspt.
+    Paper: tps and mspt. Forge: forge tps (overall line). Vanilla: debug start, wait perf_debug_seconds, debug stop (only TPS).
+    Vanilla's profiler is only used on demand, since it runs for the whole wait, tells online ops, and would stop an admin's own profiling.
+
+    Args:
+        on_demand [bool:False]: Asked for by a user (?perf), not perf_loop. Needed for vanilla servers.
+        max_age [int:0]: Return last sample instead if it's newer than this many seconds.
+
+    Returns:
+        dict: 'time', 'tps', 'mspt' (None if server's commands don't give it). None if server isn't running, didn't respond, or is vanilla and not on_demand.
+    """
+
+    global perf_last, perf_lock
+
+    if perf_lock is None: perf_lock = asyncio.Lock()
+    async with perf_lock:
+        if perf_last and time.time() - perf_last['time'] < max_age: return perf_last
+        kind = server_type()
+        if kind == 'vanilla' and not on_demand: return None
+        if await status_service.get('online') is not True: return None
+
+        tps, mspt = None, None
+        if kind == 'paper':
+            if event := await mc_command_event('tps', 'perf'): tps = event.tps
+            if event := await mc_command_event('mspt', 'perf'): mspt = event.mspt
+        elif kind == 'forge':
+            if event := await mc_command_event('forge tps', 'perf'): tps, mspt = event.tps, event.mspt
+        else:
+            start = time.time()
+            if not await mc_command('debug start'): return None
+            await asyncio.sleep(perf_debug_seconds)
+            if event := await mc_command_event('debug stop', 'perf'): tps = event.tps
+            await run_blocking(remove_debug_reports, start)
+
+        if tps is None and mspt is None: return None
+        perf_last = {'time': time.time(), 'tps': min(tps, 20) if tps is not None else None, 'mspt': mspt}
+        if tps is not None: await run_blocking(perf_tps.add, perf_last['tps'])
+        if mspt is not None: await run_blocking(perf_mspt.add, mspt)
+        return perf_last
+
+def perf_alert(sample):
+    """
+    Checks sample against perf_alert_tps. Alerts once TPS has been under it for perf_alert_samples samples in a row,
+    then not again until TPS is back up to it.
+
+    Returns:
+        str: 'low' for new alert, 'recovered' when alert ends, or None.
+    """
+
+    global perf_low_count, perf_alerting
+
+    if not sample or sample['tps'] is None: return None
+    if sample['tps'] < perf_alert_tps:
+        perf_low_count += 1
+        if perf_low_count >= perf_alert_samples and not perf_alerting:
+            perf_alerting = True
+            return 'low'
+    else:
+        perf_low_count = 0
+        if perf_alerting:
+            perf_alerting = False
+            return 'recovered'
+    return None
+
+def get_perf(since):
+    """
+    Percentiles of TPS and MSPT samples since time.
+
+    Returns:
+        dict: 'tps' and 'mspt', each None if no samples, else dict with 'count', 'min', 'max', and percentiles 1, 5, 50, 95, 99.
+    """
+
+    points = [1, 5, 50, 95, 99]
+    result = {}
+    for key, series in [('tps', perf_tps), ('mspt', perf_mspt)]:
+        values = series.values(since)
+        result[key] = dict(stats_functions.percentiles(values, points), count=len(values), min=min(values), max=max(values)) if values else None
+    return result
+
+def get_log_lines(lines=None, category=None):
+    """
+    Gets recent server output lines from log feed's in memory buffer, no disk reads.
+
+    Args:
+        lines [int:None]: Max number of lines.
+        category [str:None]: Only get lines from a LogBuffer category: chat, join, death, ban, command, warning.
+
+    Returns:
+        list: LogEvents, oldest first. Empty if there's no log feed.
+    """
+
+    feed = get_log_feed()
+    if feed is None: return []
+    return feed.recent(lines, category)
+
+def read_log_backwards(file_path, lines):
+    """Yields up to x lines from end of file, newest first. If file_path is None, reads from log feed's in memory lines."""
+
+    if file_path is None:
+        for line in reversed(log_feed.recent(lines)):
+            yield line.text + '\n'
+        return
+
+    with FileReadBackwards(file_path) as file:
+        for i in range(lines):
+            yield file.readline()
 
 # Gets server output by reading log file, can also find response from command in log by finding matching string.
 def mc_log(match=None, file_path=None, lines=50, normal_read=False, log_mode=False, filter_mode=False, match_lines=10, stopgap_str=None, return_reversed=False):
     """
-    Read latest.log file under server/logs folder.
+    Read latest.log file under server/logs folder. If log feed is running, server output lines come from memory instead.
 
     Args:
         match [str]: Check for matching string.
@@ -149,75 +651,227 @@ def mc_log(match=None, file_path=None, lines=50, normal_read=False, log_mode=Fal
         match = 'placeholder_match'
     match = match.lower()
 
-    if file_path is None: file_path = f"{server_path}/logs/latest.log"
+    # Reads server output from log feed's in memory lines (starts it if needed), file is only read if there's no feed.
+    if file_path is None and get_log_feed() is None: file_path = f"{server_path}/logs/latest.log"
 
     if stopgap_str is None:
         stopgap_str = 'placeholder_stopgap'
     stopgap_str = stopgap_str.lower()
 
-    if not os.path.isfile(file_path): return False
+    if file_path is not None and not os.path.isfile(file_path): return False
 
     if filter_mode is True: lines = log_lines_limit
 
     log_data = ''
-    if normal_read is True:
+    if normal_read is True and file_path is not None:
         with open(file_path, 'r') as file:
             for line in file:
                 if match in line: return line
     else:
-        with FileReadBackwards(file_path) as file:
-            for i in range(lines):
-                line = file.readline()
-                if 'banlist' in match:
-                    if 'was banned by' in line:  # finds log lines that shows banned players.
-                        log_data += line
-                    elif ']: There are' in line:  # finds the end so it doesn't return everything from log other then banned users.
-                        log_data += line
-                        break
-                elif log_mode:
+        for line in read_log_backwards(file_path, lines):
+            if 'banlist' in match:
+                if 'was banned by' in line:  # finds log lines that shows banned players.
                     log_data += line
-                elif match in line.lower():
+                elif ']: There are' in line:  # finds the end so it doesn't return everything from log other then banned users.
                     log_data += line
-                    if filter_mode is True and match_lines >= 1:
-                        match_lines -= 1
-                    else: break
-                if stopgap_str.lower() in line.lower(): break
+                    break
+            elif log_mode:
+                log_data += line
+            elif match in line.lower():
+                log_data += line
+                if filter_mode is True and match_lines >= 1:
+                    match_lines -= 1
+                else: break
+            if stopgap_str.lower() in line.lower(): break
 
     if log_data:
         if return_reversed is True:
             log_data = '\n'.join(list(reversed(log_data.split('\n'))))[1:]  # Reversed line ordering, so most recent lines are at bottom.
         return log_data
 
+# Full-text index of all of server's logs, including rotated .log.gz files. See log_functions.LogIndex.
+log_index = None
+
+def get_log_index():
+    """Gets LogIndex of selected server's logs, makes new one if selected server changed (e.g. ?serverselect)."""
+
+    global log_index
+
+    if log_index is None or log_index.logs_path != f"{server_path}/logs":
+        log_index = log_functions.LogIndex(f"{server_path}/logs", log_index_file.format(server=server_selected[0]))
+    return log_index
+
+def search_logs(query):
+    """
+    Indexes new server log lines, then searches all logs.
+
+    Args:
+        query list: Words from ?logsearch, all must be in line. Filters: since:/until: (7d, 12h, 2021-04-24), limit:<n> (max log_lines_limit).
+            Last word can also be since time without 'since:', e.g. ?logsearch Steve joined 7d.
+
+    Returns:
+        list: Match dicts, newest first, see LogIndex.search(). False if a filter couldn't be parsed.
+    """
+
+    query = list(query)
+    filters, terms = {'limit': 20}, []
+    if len(query) > 1 and re.match(r'^(\d+[mhdw]|\d{4}-\d\d-\d\d.*)$', query[-1]):
+        query[-1] = 'since:' + query[-1]
+
+    for word in query:
+        key, _, value = word.partition(':')
+        if not value or key not in ('since', 'until', 'limit'):
+            terms.append(word)
+            continue
+
+        if key == 'limit':
+            try: value = max(1, min(int(value), log_lines_limit))
+            except ValueError: return False
+        else:
+            value = parse_time_arg(value)
+            if value is None: return False
+        filters[key] = value
+
+    index = get_log_index()
+    index.update()
+    return index.search(terms, **filters)
+
 
 # ========== Getting Info: output, ping, reading files.
 
 # Get server active status, motd, and version information. Either using PINGClient or reading from local server files.
 async def mc_status():
     """
-    Gets server active status, by sending command to server and checking server log.
+    Gets server active status, by sending status_checker markers to server and waiting for them in server log.
 
     Returns:
         bool: returns True if server is online.
     """
 
-    status_checker = 'debug status_checker' + str(random.random())
-    log_data = await mc_command(status_checker)
-    if status_checker in str(log_data): return True
+    if use_rcon is True:
+        status_checker = 'debug status_checker' + str(random.random())
+        log_data = await mc_command(status_checker)
+        online = status_checker in str(log_data)
+    else: online = await mc_command_response('') is not False
 
-# Gets server stats from mctools PINGClient. Returned dictionary data contains ansi escape chars.
-def mc_ping():
+    status_service.set('online', online)  # Keeps cached status fresh for free.
+    if online: return True
+
+async def mc_save_flush(timeout=None):
     """
-    Gets server information using mctools.PINGClient()
+    Sends save-all flush and waits for server to log "Saved the game", which means all chunks are written to disk.
+
+    Args:
+        timeout [int:save_flush_timeout]: Max seconds to wait.
 
     Returns:
-        dict: Dictionary containing 'version', and 'description' (motd).
+        bool: True if save finished before timeout.
+    """
 
+    timeout = timeout or save_flush_timeout
+    if use_rcon is True: return 'Saved the game' in str(await run_blocking(mc_rcon, 'save-all flush'))
+
+    feed = get_log_feed()
+    if feed is None: return False
+    deadline = time.monotonic() + timeout
+
+    # Subscribed before sending so "Saved the game" can't be missed, server can log it before or after the command's closing marker.
+    queue, callback = feed.subscribe_queue()
+    try:
+        if await mc_command_response('save-all flush', timeout) is False: return False
+        while True:
+            line = await asyncio.wait_for(queue.get(), deadline - time.monotonic())
+            if 'Saved the game' in line.message: return True
+    except asyncio.TimeoutError: return False
+    finally: feed.unsubscribe(callback)
+
+# Recent save pauses from saving_paused(), dicts with 'time', 'seconds' (how long world saving was off), and 'flushed'.
+save_pause_history = collections.deque(maxlen=50)
+
+@contextlib.asynccontextmanager
+async def saving_paused(announce=None):
     """
+    Turns off server's world saving for a consistent backup: save-off, save-all flush, wait for "Saved the game". Saving is turned back on
+    with save-on when block exits, even if backup failed. How long saving was off gets added to save_pause_history.
+
+    Args:
+        announce [str:None]: Message to send in game with say command first, if server is running.
+
+    Usage:
+        async with saving_paused() as pause:
+            backup_world()
+
+    Yields:
+        dict: 'flushed' is True if server saved everything to disk, False if server isn't running or didn't respond in time (files get copied as they are).
+              'seconds' is set after block exits.
+    """
+
+    pause = {'time': datetime.datetime.now().isoformat(timespec='seconds'), 'seconds': None, 'flushed': False}
+    if await mc_status() is not True:
+        yield pause
+        return
+
+    if announce: await mc_command(f"say {announce}")
+    start = time.monotonic()
+    await mc_command('save-off')
     try:
-        stats = mctools.PINGClient(server_ip).get_stats()
-    except ConnectionRefusedError:
-        lprint("Ping Error: Connection Refused.")
-    else: return stats
+        pause['flushed'] = await mc_save_flush()
+        if not pause['flushed']: lprint("Save flush didn't finish in time, backing up anyway.")
+        yield pause
+    finally:
+        await mc_command('save-on')
+        pause['seconds'] = round(time.monotonic() - start, 2)
+        save_pause_history.append(pause)
+        lprint(f"World saving was off for {pause['seconds']}s")
+
+def server_address(name=None):
+    """
+    Address to ping server at. Port is read from server's server.properties, so each server in server_list can be pinged.
+
+    Args:
+        name [str:server_selected]: Server's folder name.
+
+    Returns:
+        tuple: Host and port.
+    """
+
+    host = 'localhost' if server_files_access is True else (server_ip or server_url)
+    port = read_properties(f"{mc_path}/{name or server_selected[0]}/server.properties").get('server-port', '').strip()
+    return host, int(port) if port.isdigit() else 25565
+
+async def mc_ping_async(name=None):
+    """Server List Ping without using server console, see ping_functions.ping(). Returns None if server didn't answer."""
+
+    return await ping_functions.ping(*server_address(name), timeout=ping_timeout, legacy=ping_legacy)
+
+# Blocking version, for code running in thread pool (e.g. backups), use mc_ping_async() from event loop.
+def mc_ping():
+    """
+    Gets server information using Server List Ping. If called from event loop's thread, which can't block on a ping (asyncio.run() would raise),
+    returns last ping result cached by status_service instead.
+
+    Returns:
+        dict: Dictionary containing 'version', 'players', and 'description' (motd). None if server didn't answer.
+    """
+
+    try: asyncio.get_running_loop()
+    except RuntimeError: stats = asyncio.run(mc_ping_async())
+    else: stats = status_service.values.get('ping')
+    if stats is None: lprint("Ping Error: No response.")
+    return stats
+
+async def ping_servers():
+    """
+    Pings every server in server_list at once, servers sharing an address only get pinged once.
+
+    Returns:
+        dict: Server name: (host, port), ping result or None.
+    """
+
+    addresses = {name: server_address(server[0]) for name, server in server_list.items()}
+    unique = list(dict.fromkeys(addresses.values()))
+    results = dict(zip(unique, await ping_functions.ping_all(unique, ping_timeout, ping_legacy)))
+    return {name: (address, results[address]) for name, address in addresses.items()}
 
 def get_mc_motd():
     """
@@ -230,13 +884,14 @@ def get_mc_motd():
     if server_files_access is True:
         return edit_file('motd')[1]
     elif use_rcon is True:
-        return remove_ansi(mc_ping()['description'])
+        stats = mc_ping()
+        return stats['description'] if stats else 'N/A'
     else: return "N/A"
 
 def get_server_ip():
     """Updates server ip address varable using request.get()"""
     global server_ip
-    server_ip = requests.get('http://ip.42.pl/raw').text
+    server_ip = requests.get('http://ip.42.pl/raw', timeout=10).text
     return server_ip
 
 def check_server_url():
@@ -257,10 +912,11 @@ def mc_version():
     """
 
     if use_rcon is True:
-        return mc_ping()['version']['name']
-    elif server_files_access is True:
+        stats = mc_ping()
+        if stats: return stats['version']['name']
+    if server_files_access is True:
         return edit_file('version')[1]
-    else: return 'N/A'
+    return 'N/A'
 
 def get_latest_version():
     """
@@ -275,6 +931,165 @@ def get_latest_version():
         if i.string and 'minecraft_server' in i.string:
             return '.'.join(i.string.split('.')[1:][:-1])  # Extract version number.
 
+def read_properties(file_path=None):
+    """
+    Reads server.properties into dict, without rewriting it like edit_file() does.
+
+    Returns:
+        dict: Property names and values, empty if file can't be read.
+    """
+
+    properties = {}
+    try:
+        with open(file_path or f"{server_path}/server.properties", 'r') as file:
+            for line in file:
+                if line.startswith('#') or '=' not in line: continue
+                key, value = line.rstrip('\n').split('=', 1)
+                properties[key.strip()] = value
+    except OSError: pass
+    return properties
+
+async def port_open(host, port, timeout=2):
+    """Checks if something's listening on TCP port, without sending anything."""
+
+    try: _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError): return False
+    writer.close()
+    return True
+
+class StatusService:
+    """
+    Cached snapshot of server status, so ?serverstatus, autosave, etc don't each wait on log round trips, file reads, HTTP, and ping.
+    Each value has its own TTL (status_ttl), background task refreshes values once they get older than that, stale ones concurrently.
+    Values: 'online' (bool), 'info' (dict with motd and version), 'ip' (public IP), 'url' ('working' or 'inactive'),
+    'ping' (Server List Ping result or None, updated with 'online').
+    """
+
+    def __init__(self, ttls):
+        self.ttls = ttls
+        self.values, self.updated = {}, {}  # Value and time.monotonic() it was fetched.
+        self.pending = {}  # Fetches in progress, so callers share them.
+        self.task = None
+        self.fetchers = {'online': self.fetch_online, 'info': self.fetch_info, 'ip': self.fetch_ip, 'url': self.fetch_url}
+
+    def start(self):
+        """Starts background refresh task, must be called from event loop."""
+
+        if self.task is None: self.task = asyncio.ensure_future(self.run())
+        return self
+
+    async def run(self):
+        while True:
+            try: await self.refresh()
+            except Exception as e: lprint(f"Status refresh error: {e}")
+            await asyncio.sleep(1)
+
+    def age(self, key):
+        """Seconds since value was fetched, None if never."""
+
+        if key not in self.updated: return None
+        return time.monotonic() - self.updated[key]
+
+    def set(self, key, value):
+        self.values[key] = value
+        self.updated[key] = time.monotonic()
+
+    def invalidate(self, key):
+        """Makes next refresh fetch value again, e.g. after starting/stopping server."""
+
+        self.updated.pop(key, None)
+
+    async def fetch(self, key):
+        """Fetches value now, or waits for fetch already in progress."""
+
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(self.fetchers[key]())
+        task = self.pending[key]
+        try: value = await asyncio.shield(task)
+        finally:
+            if self.pending.get(key) is task and task.done(): del self.pending[key]
+        self.set(key, value)
+        return value
+
+    async def refresh(self, keys=None):
+        """Fetches values that are missing or older than their TTL, concurrently."""
+
+        stale = [key for key in (keys or self.fetchers) if key not in self.updated or self.age(key) >= self.ttls.get(key, 60)]
+        if stale: await asyncio.gather(*[self.fetch(key) for key in stale], return_exceptions=True)
+
+    async def get(self, key):
+        """Cached value, only waits if there's none yet."""
+
+        if key not in self.values: await self.refresh([key])
+        return self.values.get(key)
+
+    async def snapshot(self):
+        """
+        Returns all values, fetching only ones that have never been fetched.
+
+        Returns:
+            dict: Values, and 'age' dict with seconds since each value was fetched.
+        """
+
+        await self.refresh([key for key in self.fetchers if key not in self.values])
+        snapshot = dict(self.values)
+        snapshot['age'] = {key: round(self.age(key) or 0) for key in self.values}
+        return snapshot
+
+    async def fetch_online(self):
+        # Server List Ping answers without going through console, and gives MOTD, version, and players too.
+        stats = await mc_ping_async()
+        self.set('ping', stats)
+        if stats:
+            self.set('info', {'motd': stats['description'], 'version': stats['version']['name']})
+            return True
+
+        # Ping failed (e.g. blocked or disabled), falls back to checking if server's ports are open.
+        # Never uses mc_status(), its status markers would go into server console (and latest.log) every refresh. Commands still use it when asked.
+        if use_subprocess is True and (mc_subprocess is None or mc_subprocess.returncode is not None): return False
+        host, port = await run_blocking(server_address)
+        if await port_open(host, port): return True
+        return use_rcon is True and await port_open(server_ip or server_url, rcon_port)
+
+    async def fetch_info(self):
+        if self.values.get('ping'): return {'motd': self.values['ping']['description'], 'version': self.values['ping']['version']['name']}
+        if server_files_access is True:
+            properties = await run_blocking(read_properties)
+            version = next((value for key, value in properties.items() if 'version' in key), 'N/A')
+            return {'motd': properties.get('motd', 'N/A'), 'version': version}
+        elif use_rcon is True:
+            stats = await mc_ping_async()
+            if stats: return {'motd': remove_ansi(stats['description']), 'version': stats['version']['name']}
+        return {'motd': 'N/A', 'version': 'N/A'}
+
+    async def fetch_ip(self):
+        try: return await run_blocking(get_server_ip)
+        except: return self.values.get('ip', 'N/A')
+
+    async def fetch_url(self):
+        if 'ip' not in self.values: await self.fetch('ip')
+        return await run_blocking(check_server_url)
+
+status_service = StatusService(status_ttl)
+
+def code_blocks(lines, max_chars=1900):
+    """
+    Packs lines into as few Discord code blocks as fit under message size limit, instead of a message per line.
+
+    Returns:
+        list: Message strings.
+    """
+
+    messages, block = [], ''
+    for line in lines:
+        line = line.replace('`', "'")[:max_chars - 10]
+        if block and len(block) + len(line) + 9 > max_chars:
+            messages.append(f"```\n{block}```")
+            block = ''
+        block += line + '\n'
+    if block: messages.append(f"```\n{block}```")
+    return messages
+
 # Used so Discord command arguments don't need qoutes.
 def format_args(args, return_empty_str=False):
     """
@@ -394,94 +1209,280 @@ def edit_file(target_property=None, value='', file_path=f"{server_path}/server.p
         return return_line, return_line.split('=')[1].strip()
     else: return "Match not found.", 'Match not found.'
 
+def get_copy_mode(src, dst):
+    """Returns copy mode for folder backups of src into dst: backup_copy_mode, or detected with backup_functions.detect_copy_mode() if 'auto'."""
+
+    if backup_copy_mode != 'auto': return backup_copy_mode
+    return backup_functions.detect_copy_mode(src, dst)
+
+def detect_copy_modes():
+    """Detects which copy modes folder backups of world and server can use, called on bot startup. Returns dict of modes for 'world' and 'server'."""
+
+    modes = {}
+    for backup_type, src, dst in [('world', server_path + '/world', world_backups_path), ('server', server_path, server_backups_path)]:
+        try: modes[backup_type] = get_copy_mode(src, dst)
+        except: modes[backup_type] = None
+    lprint(f"Folder backup copy modes: world {modes['world']}, server {modes['server']}")
+    return modes
+
+backup_catalogs = {}
+def get_catalog(path):
+    """
+    Gets backup catalog for world or server backups folder, syncing it with folder contents the first time it's opened.
+
+    Args:
+        path str: Path of world or server backups location.
+
+    Returns:
+        BackupCatalog: None if folder doesn't exist.
+    """
+
+    if path in backup_catalogs: return backup_catalogs[path]
+    if not os.path.isdir(path): return None
+
+    catalog = backup_catalogs[path] = backup_functions.BackupCatalog(path)
+    added, removed = catalog.sync()
+    if added or removed: lprint(f"Backup catalog synced: {path} (+{added} -{removed})")
+    return catalog
+
 def get_from_index(path, index):
     """
-    Get server or world backup folder name from passed in index number
+    Get server or world backup name from its ID, IDs don't change when other backups are added or deleted.
 
     Args:
         path str: Location to find world or server backups.
-        index int: Select specific folder, get index from other functions like ?worldbackupslist, ?serverbackupslist
+        index int: Backup ID, get from ?worldbackupslist, ?serverbackupslist
 
     Returns:
-            str: file path of selected folder.
+            str: Name of selected backup, None if there's no backup with that ID.
     """
 
-    return os.listdir(path)[index]
+    catalog = get_catalog(path)
+    if catalog is None: return None
+    backup = catalog.get(index)
+    if backup is None:  # Could've been added outside the bot.
+        catalog.sync()
+        backup = catalog.get(index)
+    if backup: return backup['name']
 
-def fetch_backups(path):
+def fetch_backups(path, amount=None, sort='created', search=None, **filters):
     """
-    Gets x amount of backups. Usually to show in list.
+    Gets x amount of backups from catalog. Usually to show in list. Includes folder, incremental, and archive backups.
 
     Args:
         path str: Path of world or server backups location.
+        amount [int:None]: Max number of backups, None for all.
+        sort [str:created]: Sort by created, size, stored_size, name, or id. Most recent/biggest are last.
+        search [str:None]: Only backups with this in their name.
+        filters: Exact matches, e.g. version='1.16.5', format='archive'.
+
+    Returns:
+        list: [id, name, info] for each backup, info is dict of catalog columns (created, format, version, server, size, stored_size, file_count).
     """
 
-    backups = []
-    if not os.path.isdir(path): return False
+    catalog = get_catalog(path)
+    if catalog is None: return False
 
-    for index, item in enumerate(os.listdir(path)):
-        if os.path.isdir(path + '/' + item):
-            backups.append([index, item])
-    return backups
+    backups = catalog.list(amount, sort, True, search, **filters)
+    return [[backup['id'], backup['name'], backup] for backup in reversed(backups)]
 
-def create_backup(name, src, dst):
+def create_backup(name, src, dst, progress=None):
     """
-    Create a new world or server backup, by copying and renaming folder.
+    Create a new world or server backup. Depending on backup_mode, either stores it incrementally (unchanged files are only stored once),
+    as a compressed archive, or copies and renames folder.
 
     Args:
         name str: Name of new backup. Final name will have date and time prefixed.
         src str: Folder to backup, whether it's a world folder or a entire server folder.
         dst str: Destination for backup.
+        progress [callable:None]: Called with backup_functions.Progress object as files are copied.
     """
 
     if not os.path.isdir(dst): os.makedirs(dst)
 
     folder_timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H-%M')
-    new_name = f"({folder_timestamp}) {mc_version()} {name}"
+    version = mc_version()
+    new_name = f"({folder_timestamp}) {version} {name}"
     new_backup_path = dst + '/' + new_name
-    shutil.copytree(src, new_backup_path)
 
-    if os.path.isdir(new_backup_path):
-        lprint("Backed up to: " + new_backup_path)
+    info = {'version': version, 'server': server_selected[0]}
+    try:
+        if backup_mode == 'incremental':
+            backup_functions.create_incremental_backup(src, dst, new_name, info, backup_workers, progress)
+            success = backup_functions.backup_format(dst, new_name) == 'incremental'
+        elif backup_mode == 'archive':
+            backup_functions.create_archive_backup(src, dst, new_name, info, backup_compression, backup_compression_level, backup_compression_threads, progress)
+            success = backup_functions.backup_format(dst, new_name) == 'archive'
+        else:
+            copied = backup_functions.create_folder_backup(src, dst, new_name, backup_workers, progress, get_copy_mode(src, dst))
+            info.update(copy_mode=copied['copy_mode'], stored_size=copied['stored_size'])
+            success = os.path.isdir(new_backup_path)
+    except Exception as e:  # E.g. disk full, permissions, unreadable region file.
+        lprint(f"Error creating backup: {new_name} ({e})")
+        try: backup_functions.discard_backup(dst, new_name, backup_workers)
+        except: lprint("Error removing failed backup: " + new_backup_path)
+        return False
+
+    if success:
+        entry = backup_functions.catalog_entry(dst, new_name)
+        entry.update(info)
+        get_catalog(dst).add(entry)
+        lprint(f"Backed up to: {new_backup_path}" + (f" ({info['copy_mode']})" if 'copy_mode' in info else ''))
         return new_name
     else:
         lprint("Error creating backup at: " + new_backup_path)
         return False
 
-def restore_backup(src, dst, reset=False):
+def restore_work_path(dst):
     """
-    Restores world or server backup. Overwrites existing files.
+    Folder for dst's staging and rollback folders. Outside server folder so server backups don't include them, but under mc_path so renames work.
+    Also moves ones older versions left next to dst (e.g. world.rollback in server folder) into it.
+    """
+
+    work_path = f"{mc_path}/restore_staging/{server_selected[0]}"
+    try: backup_functions.move_restore_folders(dst, work_path)
+    except OSError: lprint("Error moving old restore folders for: " + dst)
+    return work_path
+
+def stage_restore(src, dst, progress=None):
+    """
+    Restores world or server backup into staging folder (see restore_work_path), server can keep running meanwhile. Use swap_restore() once server is stopped.
 
     Args:
-        src str: Backed up folder to copy to current server.
-        dst str: Location to copy backup to.
-        reset [bool:False]: Leave src folder empty and not copy backup to dst.
+        src str: Path of backup to restore.
+        dst str: Folder backup will replace.
+        progress [callable:None]: Called with backup_functions.Progress object as files are copied.
     """
 
-    try: shutil.rmtree(dst)
-    except: pass
+    backups_path, name = os.path.split(src)
+    try:
+        backup_functions.stage_restore(backups_path, name, dst, backup_workers, progress, restore_work_path(dst))
+        return True
+    except: lprint("Error staging restore: " + str(src + ' > ' + dst))
 
-    # Used in ?worldreset and ?serverreset Discord command to clear all world or server files.
-    if reset is True: return True
+def swap_restore(dst):
+    """Swaps staged restore in for dst with renames (takes seconds), dst is kept as rollback folder."""
 
     try:
-        shutil.copytree(src, dst)
-        return True
-    except: lprint("Error restoring: " + str(src + ' > ' + dst))
+        if backup_functions.swap_restore(dst, backup_workers, restore_work_path(dst)): return True
+        lprint("No staged restore for: " + dst)
+    except: lprint("Error swapping in restore: " + dst)
+
+def rollback_restore(dst):
+    """Swaps dst back with its rollback folder, undoing last restore or reset."""
+
+    try:
+        if backup_functions.rollback_restore(dst, restore_work_path(dst)): return True
+        lprint("No rollback folder for: " + dst)
+    except: lprint("Error rolling back: " + dst)
+
+def restore_backup(src, dst, reset=False, progress=None):
+    """
+    Restores world or server backup. Backup is staged first then swapped in, so dst is only replaced once the whole backup is restored. Old dst is kept for rollback.
+
+    Args:
+        src str: Path of backup to copy to current server.
+        dst str: Location to copy backup to.
+        reset [bool:False]: Swap in empty folder instead of restoring backup.
+        progress [callable:None]: Called with backup_functions.Progress object as files are copied.
+    """
+
+    # Used in ?worldreset and ?serverreset Discord command to clear all world or server files.
+    if reset is True:
+        try: return backup_functions.reset_folder(dst, backup_workers, restore_work_path(dst))
+        except: lprint("Error resetting: " + dst)
+        return False
+
+    return stage_restore(src, dst, progress) and swap_restore(dst)
 
 def delete_backup(backup):
     """
-    Delete world or server backup.
+    Delete world or server backup (folder, archive, or incremental). Stored files of incremental backups get deleted once no other backup uses them.
 
     Args:
         backup str: Path of backup to delete.
     """
 
+    backups_path, name = os.path.split(backup)
     try:
-        shutil.rmtree(backup)
+        backup_functions.delete_backup(backups_path, name, backup_workers)
+        get_catalog(backups_path).remove(name)
         return True
     except: lprint("Error deleting: " + str(backup))
 
+def verify_backup(backup, progress=None):
+    """
+    Re-hashes world or server backup's files and compares them to hashes saved when it was made.
+
+    Args:
+        backup str: Path of backup.
+        progress [callable:None]: Called with backup_functions.Progress object as files are checked.
+
+    Returns:
+        dict: See backup_functions.verify_backup(). None if backup has no saved hashes, False if it couldn't be verified.
+    """
+
+    backups_path, name = os.path.split(backup)
+    try: result = backup_functions.verify_backup(backups_path, name, backup_workers, progress)
+    except:
+        lprint("Error verifying: " + backup)
+        return False
+
+    if result is None: lprint("No hashes to verify: " + backup)
+    elif result['ok']: lprint(f"Verified {result['checked']} files: {backup}")
+    else: lprint(f"Backup verification failed: {backup} ({len(result['missing'])} missing, {len(result['corrupt'])} corrupt, error: {result['error']})")
+    return result
+
+def tag_backup(path, index, tags):
+    """
+    Sets tags of world or server backup, e.g. to protect it from retention pruning.
+
+    Args:
+        path str: Path of world or server backups location.
+        index int: Backup ID.
+        tags list: New tags, empty list clears them.
+    """
+
+    catalog = get_catalog(path)
+    if catalog: return catalog.set_tags(index, tags)
+
+def retention_plan(path):
+    """Returns list of catalog rows (oldest first) that retention policy would prune from world or server backups folder."""
+
+    catalog = get_catalog(path)
+    if catalog is None: return []
+
+    objects = None  # Incremental backups' stored objects, so shared ones count once for size cap.
+    if retention_max_size_gb:
+        try: objects = backup_functions.incremental_objects(path)
+        except: lprint("Error reading backup manifests in: " + path)
+    return backup_functions.select_prune(catalog.list(), retention_keep_last, retention_hourly, retention_daily, retention_weekly, retention_monthly,
+                                         int(retention_max_size_gb * 1024 ** 3), retention_protected_tags, objects)
+
+def prune_backups(path, dry_run=False):
+    """
+    Deletes backups retention policy doesn't keep, using idle I/O priority.
+
+    Args:
+        path str: Path of world or server backups location.
+        dry_run [bool:False]: Only return what would be pruned.
+
+    Returns:
+        list: Names of pruned backups.
+    """
+
+    names = [backup['name'] for backup in retention_plan(path)]
+    if dry_run or not names: return names
+
+    try: names = backup_functions.prune_backups(path, names)
+    except:
+        lprint("Error pruning backups in: " + path)
+        # Only ones deleted before error.
+        names = [name for name in names if not os.path.isfile(backup_functions.manifest_path(path, name)) and not os.path.isdir(os.path.join(path, name))]
+    get_catalog(path).sync()
+    if names: lprint(f"Pruned {len(names)} backups from: {path}")
+    return names
+
 
 # ========== Discord commands.
 def get_server_from_index(index):
@@ -491,19 +1492,19 @@ def get_server_from_index(index):
 def get_world_from_index(index):
     return get_from_index(world_backups_path, index)
 
-def fetch_servers():
+def fetch_servers(amount=None, sort='created', search=None):
     """Returns list of x number of backed up server."""
-    return fetch_backups(server_backups_path)
+    return fetch_backups(server_backups_path, amount, sort, search)
 
-def fetch_worlds():
-    return fetch_backups(world_backups_path)
+def fetch_worlds(amount=None, sort='created', search=None):
+    return fetch_backups(world_backups_path, amount, sort, search)
 
-def backup_server(name='server_backup'):
+def backup_server(name='server_backup', progress=None):
     """Create new server backup with specified name."""
-    return create_backup(name, server_path, server_backups_path)
+    return create_backup(name, server_path, server_backups_path, progress)
 
-def backup_world(name="world_backup"):
-    return create_backup(name, server_path + '/world', world_backups_path)
+def backup_world(name="world_backup", progress=None):
+    return create_backup(name, server_path + '/world', world_backups_path, progress)
 
 def delete_server(server):
     """Delete specified server with specified index."""
@@ -512,11 +1513,41 @@ def delete_server(server):
 def delete_world(world):
     return delete_backup(world_backups_path + '/' + world)
 
-def restore_server(server=None, reset=False):
+def verify_server(server, progress=None):
+    """Verify server backup's files."""
+    return verify_backup(f"{server_backups_path}/{server}", progress)
+
+def verify_world(world, progress=None):
+    return verify_backup(f"{world_backups_path}/{world}", progress)
+
+def prune_all(dry_run=False):
+    """Applies retention policy to world and server backups. Returns dict of pruned backup names for 'world' and 'server'."""
+    return {'world': prune_backups(world_backups_path, dry_run), 'server': prune_backups(server_backups_path, dry_run)}
+
+def restore_server(server=None, reset=False, progress=None):
     """Restore server with specified index."""
-    os.chdir(server_backups_path)
-    return restore_backup(server, server_path, reset)
+    return restore_backup(f"{server_backups_path}/{server}", server_path, reset, progress)
+
+def restore_world(world=None, reset=False, progress=None):
+    return restore_backup(f"{world_backups_path}/{world}", server_path + '/world', reset, progress)
+
+def stage_server_restore(server, progress=None):
+    """Restore server backup into staging folder, server can keep running."""
+    return stage_restore(f"{server_backups_path}/{server}", server_path, progress)
+
+def stage_world_restore(world, progress=None):
+    return stage_restore(f"{world_backups_path}/{world}", server_path + '/world', progress)
+
+def swap_server_restore():
+    """Swap in staged server restore, server must be stopped."""
+    return swap_restore(server_path)
+
+def swap_world_restore():
+    return swap_restore(server_path + '/world')
+
+def rollback_server():
+    """Undo last server restore or reset."""
+    return rollback_restore(server_path)
 
-def restore_world(world=None, reset=False):
-    os.chdir(world_backups_path)
-    return restore_backup(world, server_path + '/world', reset)
+def rollback_world():
+    return rollback_restore(server_path + '/world')
@@ -18,6 +18,7 @@ use_tmux = True
 # Uses subprocess.Popen(). If script halts, server halts also. Useful if not using Tmux, recommend using Tmux if can.
 # Prioritize use_subprocess over Tmux option.
 use_subprocess = False
+subprocess_log_file = None  # Optionally also save server's output to file when using subprocess, e.g. f"{bot_files_path}/server_output.txt"
 
 # If you have local access to server files but not using Tmux, use RCON to send commands to server. You won't be able to use some features like reading server logs.
 use_rcon = False
@@ -25,6 +26,10 @@ server_ip = ''  # Will be updated by get_server_ip function in server_functions.
 server_url = 'arcpy.asuscomm.com'
 rcon_pass = 'rconpass69'
 rcon_port = 25575
+rcon_timeout = 5  # Seconds to wait for RCON connection and responses.
+rcon_retry_max = 60  # Max seconds between reconnect attempts, backoff doubles after each failed attempt.
+ping_timeout = 3  # Seconds to wait for Server List Ping (status in multiplayer menu) response, used for status, MOTD, version, and players.
+ping_legacy = True  # Try pre-1.7 ping format if server doesn't answer normal one.
 
 # ========== Minecraft Server Config
 
@@ -44,6 +49,30 @@ server_path = f"{mc_path}/{server_selected[0]}"
 world_backups_path = f"{mc_path}/world_backups/{server_selected[0]}"
 server_backups_path = f"{mc_path}/server_backups/{server_selected[0]}"
 
+# 'incremental': Stores files by content, unchanged files (most region files, libraries, mods) are only stored once across all backups.
+# 'archive': Single compressed .tar file per backup, smallest for backups that get moved off-site.
+# 'folder': Copy of whole folder for each backup. Uses reflinks (instant copy-on-write clones) on btrfs/XFS, or hard links to previous backup for unchanged files.
+backup_mode = 'incremental'
+backup_copy_mode = 'auto'  # For folder backups: 'auto' detects best of 'reflink', 'hardlink', or 'copy' on startup, or set one.
+backup_compression = 'zstd'  # For archive backups: 'zstd' (needs zstandard module, falls back to gzip), 'xz', or 'gzip'.
+backup_compression_level = 3  # zstd: 1-22, xz/gzip: 1-9.
+backup_compression_threads = -1  # zstd compression threads, -1 uses all cores.
+backup_workers = 8  # Threads used to copy/store files for backups and restores, more helps on NVMe/RAID storage.
+backup_verify_restore = True  # Check backup's file hashes before restoring, restore is refused if files are missing or corrupt (unless forced).
+
+# Retention: Automatically prunes old backups, keeping newest backup from each of the last x hours/days/weeks/months (0 to not keep by that period).
+retention_status = False
+# Automatic retention only previews what it would prune until admin confirms with ?backupprune now, which sets this to True.
+retention_confirmed = False
+retention_interval = 60  # Minutes between retention checks.
+retention_keep_last = 3  # Always keep this many newest backups.
+retention_hourly = 24
+retention_daily = 7
+retention_weekly = 4
+retention_monthly = 6
+retention_max_size_gb = 0  # Prune oldest backups once a backups folder takes up more than this (approximate), 0 for no cap.
+retention_protected_tags = ['keep']  # Backups tagged with one of these (?backuptag) never get pruned.
+
 # ========== Bot Config
 
 # Default values.
@@ -54,9 +83,33 @@ enable_inputs = ['enable', 'activate', 'true', 'on']
 disable_inputs = ['disable', 'deactivate', 'false', 'off']
 
 bot_log_file = f"{bot_files_path}/bot_log.txt"
+bot_log_max_kb = 5120  # Bot log gets compressed to bot_log.<date>.txt.gz and a new one started when it's over this size, or a new day starts.
+bot_log_rotate_daily = True
+bot_log_backups = 14  # Number of compressed old bot logs to keep.
+bot_records_file = f"{bot_files_path}/bot_log.jsonl"  # Structured log of commands used (user, command, args, duration, outcome), rotated same as bot log.
+bot_records_index = f"{bot_files_path}/bot_log.sqlite3"  # Index of those for ?botlog queries.
 mc_active_status = False
 mc_subprocess = None
 log_lines_limit = 100  # Limit how max number of log lines to read.
+log_buffer_lines = 1000  # Recent server output lines kept in memory, used by ?chatlog, ?serverlog, etc.
+log_buffer_max_kb = 1024  # Memory cap for those lines, oldest lines are dropped first.
+log_poll_interval = 0.2  # Seconds between log tailer checks for new lines.
+log_index_file = f"{bot_files_path}/log_index_{{server}}.sqlite3"  # Full-text index of selected server's logs (latest.log and logs/*.log.gz) for ?logsearch, {server} is server's name.
+stats_path = f"{bot_files_path}/stats/{server_selected[0]}"  # Player count history and play sessions, for ?playtime, ?peak, ?activity.
+stats_interval = 60  # Seconds between player count samples.
+stats_raw_days = 30  # Days of samples kept at full detail, older ones get downsampled to hourly min/max/average.
+# Tick performance monitor, samples TPS/MSPT with server's commands: Paper (tps, mspt), Forge (forge tps), vanilla (debug start/stop).
+# Only Paper and Forge servers get sampled in background, vanilla's profiler is only used when ?perf asks for a sample.
+perf_status = False
+perf_interval = 60  # Seconds between samples.
+perf_debug_seconds = 10  # Vanilla only, seconds between debug start and debug stop for ?perf sample.
+perf_alert_tps = 15  # Post alert to channel_id when TPS stays under this...
+perf_alert_samples = 3  # ...for this many samples in a row.
+server_types = {}  # Optional, server name: 'paper', 'forge', or 'vanilla'. Else guessed from server's name and start command.
+command_timeout = 5  # Max seconds to wait for server to respond to a command.
+save_flush_timeout = 60  # Max seconds to wait for save-all flush to finish before backups, big worlds can take a while.
+# Seconds cached status values are kept before background refresh, ?serverstatus and autosave read from cache instead of asking server.
+status_ttl = {'online': 15, 'info': 300, 'ip': 3600, 'url': 600}
 
 useful_websites = {'Forge Downnload (Download 35.1.13 Installer)': 'https://files.minecraftforge.net/',
                    'CurseForge Download': 'https://curseforge.overwolf.com/',
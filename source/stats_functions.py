@@ -0,0 +1,270 @@
+import datetime, threading, array, math, time, os
+
+missing = 0xFFFF  # Marks slots without a sample.
+hourly_missing = 0xFFFFFFFF  # Same for hourly files, which are uint32 so average*10 fits for any sample value.
+
+class TimeSeries:
+    """
+    Samples taken at fixed interval (e.g. players online every minute), stored as uint16 arrays on disk with one file per day,
+    so a sample's position in its file is just its time of day and nothing needs an index.
+    Days older than raw_days get downsampled to hourly min/max/average, one file per year. Reads only touch files in the queried range.
+    Days and slots are UTC, so daylight saving time changes don't make an hour repeat (overwriting samples) or go missing.
+    """
+
+    def __init__(self, path, interval=60, raw_days=30, scale=1):
+        """
+        Args:
+            path str: Folder for data files.
+            interval [int:60]: Seconds between samples.
+            raw_days [int:30]: Days kept at full detail.
+            scale [int:1]: Values get multiplied by this before stored as ints, e.g. 100 to keep 2 decimals.
+        """
+
+        self.path, self.interval, self.raw_days, self.scale = path, interval, raw_days, scale
+        self.slots = 86400 // interval
+        self.lock = threading.Lock()
+        self.last_day = None  # Day of last add(), downsample() runs when it changes.
+
+    def day_path(self, day): return f"{self.path}/{day.isoformat()}.bin"
+
+    def year_path(self, year): return f"{self.path}/{year}.hourly.bin"
+
+    def encode(self, value): return min(missing - 1, max(0, round(value * self.scale)))
+
+    def add(self, value, timestamp=None):
+        """Stores sample in its time slot, replacing any sample already there."""
+
+        moment = datetime.datetime.fromtimestamp(timestamp or time.time(), datetime.timezone.utc)
+        slot = (moment.hour * 3600 + moment.minute * 60 + moment.second) // self.interval
+        file_path = self.day_path(moment.date())
+
+        with self.lock:
+            if not os.path.isfile(file_path):
+                os.makedirs(self.path, exist_ok=True)
+                with open(file_path, 'wb') as file: array.array('H', [missing] * self.slots).tofile(file)
+            with open(file_path, 'r+b') as file:
+                file.seek(slot * 2)
+                array.array('H', [self.encode(value)]).tofile(file)
+
+        if moment.date() != self.last_day:
+            self.last_day = moment.date()
+            self.downsample(moment.date())
+
+    def read_day(self, day):
+        """Returns day's samples as array, or None if there's no file for it."""
+
+        samples = array.array('H')
+        try:
+            with open(self.day_path(day), 'rb') as file: samples.frombytes(file.read())
+        except OSError: return None
+        return samples
+
+    def summarize_day(self, samples):
+        """Hourly (min, max, sum, count) from a day's samples, None for hours without samples."""
+
+        per_hour, hours = self.slots // 24, []
+        for hour in range(24):
+            values = [i for i in samples[hour * per_hour:(hour + 1) * per_hour] if i != missing]
+            hours.append((min(values), max(values), sum(values), len(values)) if values else None)
+        return hours
+
+    def downsample(self, today=None):
+        """Rolls day files older than raw_days into yearly hourly files (min, max, average*10 per hour, as uint32), then deletes them."""
+
+        cutoff = (today or datetime.datetime.now(datetime.timezone.utc).date()) - datetime.timedelta(days=self.raw_days)
+        try: names = os.listdir(self.path)
+        except OSError: return
+
+        with self.lock:
+            for name in sorted(names):
+                try: day = datetime.date.fromisoformat(name[:-4]) if name.endswith('.bin') and not name.endswith('.hourly.bin') else None
+                except ValueError: continue
+                if day is None or day >= cutoff: continue
+
+                records = array.array('I')
+                for hour in self.summarize_day(self.read_day(day) or []):
+                    if hour is None: records.extend([hourly_missing] * 3)
+                    else: records.extend([hour[0], hour[1], round(hour[2] * 10 / hour[3])])
+
+                file_path = self.year_path(day.year)
+                if not os.path.isfile(file_path):
+                    with open(file_path, 'wb') as file: array.array('I', [hourly_missing] * (366 * 24 * 3)).tofile(file)
+                with open(file_path, 'r+b') as file:
+                    file.seek((day.timetuple().tm_yday - 1) * 24 * 3 * records.itemsize)
+                    records.tofile(file)
+                os.remove(self.day_path(day))
+
+    def hours(self, since, until=None):
+        """
+        Hourly summaries over time range, from day files for recent days and yearly files for older ones.
+
+        Args:
+            since float: Unix time.
+            until [float:now]: Unix time.
+
+        Yields:
+            tuple: Hour's start (datetime, local time), min, max, average. Hours without samples are skipped.
+        """
+
+        until = until or time.time()
+        start = datetime.datetime.fromtimestamp(since, datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        end = datetime.datetime.fromtimestamp(until, datetime.timezone.utc)
+        day, last_day = start.date(), end.date()
+        year_file, year_records = None, None
+
+        while day <= last_day:
+            samples = self.read_day(day)
+            if samples is not None:
+                hours = [None if i is None else (i[0], i[1], i[2] / i[3]) for i in self.summarize_day(samples)]
+            else:
+                # Reads year's hourly file once, then slices each day out of it.
+                if year_file != day.year:
+                    year_file, year_records = day.year, array.array('I')
+                    try:
+                        with open(self.year_path(day.year), 'rb') as file: year_records.frombytes(file.read())
+                    except OSError: pass
+                offset = (day.timetuple().tm_yday - 1) * 24 * 3
+                records = year_records[offset:offset + 24 * 3]
+                hours = [None if len(records) < (i + 1) * 3 or records[i * 3] == hourly_missing else (records[i * 3], records[i * 3 + 1], records[i * 3 + 2] / 10) for i in range(24)]
+
+            for hour, values in enumerate(hours):
+                moment = datetime.datetime.combine(day, datetime.time(hour), datetime.timezone.utc)
+                if values is None or moment < start or moment > end: continue
+                yield moment.astimezone().replace(tzinfo=None), values[0] / self.scale, values[1] / self.scale, values[2] / self.scale
+            day += datetime.timedelta(days=1)
+
+    def values(self, since, until=None):
+        """Samples in time range at full detail, so only from days not downsampled yet. Returns list of values, oldest first."""
+
+        until = until or time.time()
+        day, last_day = datetime.datetime.fromtimestamp(since, datetime.timezone.utc).date(), datetime.datetime.fromtimestamp(until, datetime.timezone.utc).date()
+        values = []
+        while day <= last_day:
+            samples = self.read_day(day)
+            if samples is not None:
+                day_start = datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc).timestamp()
+                first, last = max(0, int(since - day_start) // self.interval), min(self.slots, int(until - day_start) // self.interval + 1)
+                values.extend(i / self.scale for i in samples[first:last] if i != missing)
+            day += datetime.timedelta(days=1)
+        return values
+
+    def peak(self, since, until=None):
+        """
+        Returns:
+            tuple: Highest value, hour it was in (datetime), and average over range. None if no samples.
+        """
+
+        best, total, count = None, 0, 0
+        for moment, low, high, average in self.hours(since, until):
+            if best is None or high > best[0]: best = (high, moment)
+            total += average
+            count += 1
+        if best is None: return None
+        return best[0], best[1], total / count
+
+    def heatmap(self, since, until=None):
+        """
+        Average value for each weekday and hour of day.
+
+        Returns:
+            list: 7 lists (Monday first) of 24 averages, None where there's no samples.
+        """
+
+        totals = [[0] * 24 for _ in range(7)]
+        counts = [[0] * 24 for _ in range(7)]
+        for moment, low, high, average in self.hours(since, until):
+            totals[moment.weekday()][moment.hour] += average
+            counts[moment.weekday()][moment.hour] += 1
+        return [[totals[day][hour] / counts[day][hour] if counts[day][hour] else None for hour in range(24)] for day in range(7)]
+
+def percentiles(values, points):
+    """
+    Nearest-rank percentiles.
+
+    Args:
+        values list: Numbers, in any order.
+        points list: Percentiles to get, e.g. [50, 95, 99].
+
+    Returns:
+        dict: Percentile: value. Empty if no values.
+    """
+
+    if not values: return {}
+    ordered = sorted(values)
+    return {i: ordered[min(len(ordered), max(1, math.ceil(i / 100 * len(ordered)))) - 1] for i in points}
+
+
+class SessionStore:
+    """
+    Players' play sessions as (start, end) Unix time pairs. One small uint32 array file per player,
+    so a player's playtime only reads that player's file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def file_path(self, name):
+        """Finds player's file case insensitively, since Minecraft names are. Player names are only letters, numbers, and _."""
+
+        exact = f"{self.path}/{name}.bin"
+        if os.path.isfile(exact): return exact
+        try: return next((f"{self.path}/{i}" for i in os.listdir(self.path) if i.lower() == f"{name.lower()}.bin"), exact)
+        except OSError: return exact
+
+    def add(self, name, start, end):
+        """Appends finished session."""
+
+        if not start or end <= start: return
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.file_path(name), 'ab') as file: array.array('I', [int(start), int(end)]).tofile(file)
+
+    def sessions(self, name, since=None, until=None):
+        """
+        Returns:
+            list: (start, end) tuples clipped to time range, oldest first.
+        """
+
+        data = array.array('I')
+        try:
+            with open(self.file_path(name), 'rb') as file: data.frombytes(file.read())
+        except OSError: return []
+
+        since, until = since or 0, until or time.time()
+        return [(max(start, since), min(end, until)) for start, end in zip(data[::2], data[1::2]) if end > since and start < until]
+
+    def playtime(self, name, since=None, until=None, current=None):
+        """
+        Args:
+            current [float:None]: Start of player's session still going on, if online.
+
+        Returns:
+            tuple: Seconds played, number of sessions, and end of last session (None if never played).
+        """
+
+        sessions = self.sessions(name, since, until)
+        if current: sessions.append((max(current, since or 0), until or time.time()))
+        if not sessions: return 0, 0, None
+        return sum(end - start for start, end in sessions), len(sessions), sessions[-1][1]
+
+    def players(self):
+        """Returns list of names of players with sessions."""
+
+        try: return [i[:-4] for i in os.listdir(self.path) if i.endswith('.bin')]
+        except OSError: return []
+
+    def top(self, since=None, limit=10, current=None):
+        """
+        Args:
+            current [dict:None]: Name: session start, for players online now.
+
+        Returns:
+            list: (name, seconds) tuples, most played first.
+        """
+
+        current = {name.lower(): (name, start) for name, start in (current or {}).items()}
+        totals = {name: self.playtime(name, since, current=current.pop(name.lower(), (None, None))[1])[0] for name in self.players()}
+        for name, start in current.values():  # Online players without finished sessions yet.
+            totals[name] = self.playtime(name, since, current=start)[0]
+        return sorted(totals.items(), key=lambda i: -i[1])[:limit]
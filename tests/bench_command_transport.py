@@ -0,0 +1,64 @@
+"""
+Benchmark for server command transport: sends concurrent mc_command() calls through a fake tmux that appends to a tailed latest.log,
+while a ticker task measures how long the event loop gets blocked. Needs the bot's requirements installed.
+
+Usage:
+    python tests/bench_command_transport.py [commands]
+"""
+
+import asyncio, tempfile, time, stat, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+
+fake_tmux = """#!/bin/sh
+# Fake tmux: send-keys -t target KEYS ENTER, answers like server would in latest.log.
+keys="$4"
+case "$keys" in
+  debug*) printf '[12:00:00] [Server thread/INFO]: Incorrect argument for command\\n[12:00:00] [Server thread/INFO]: %s<--[HERE]\\n' "$keys" >> "$LOG";;
+  *) printf '[12:00:00] [Server thread/INFO]: ran %s\\n' "$keys" >> "$LOG";;
+esac
+"""
+
+def setup(path):
+    """Makes fake server folder and tmux, and points slime_vars at them before server_functions gets imported."""
+
+    os.makedirs(f"{path}/bin")
+    os.makedirs(f"{path}/server/logs")
+    open(f"{path}/server/logs/latest.log", 'w').close()
+    with open(f"{path}/bin/tmux", 'w') as file: file.write(fake_tmux)
+    os.chmod(f"{path}/bin/tmux", os.stat(f"{path}/bin/tmux").st_mode | stat.S_IEXEC)
+    os.environ['PATH'] = f"{path}/bin" + os.pathsep + os.environ['PATH']
+    os.environ['LOG'] = f"{path}/server/logs/latest.log"
+
+    import slime_vars
+    slime_vars.use_tmux, slime_vars.use_subprocess, slime_vars.use_rcon = True, False, False
+    slime_vars.server_path = f"{path}/server"
+    slime_vars.command_timeout = 10
+    slime_vars.bot_log_file, slime_vars.bot_records_file, slime_vars.bot_records_index = f"{path}/bot_log.txt", f"{path}/bot_log.jsonl", f"{path}/bot_log.sqlite3"
+
+async def main(count):
+    import server_functions
+    server_functions.get_log_feed()
+    await asyncio.sleep(0.5)  # Let tailer open latest.log.
+
+    lags, running = [], True
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+    ticker_task = asyncio.ensure_future(ticker())
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[server_functions.mc_command(f"say {i}") for i in range(count)])
+    elapsed = time.perf_counter() - start
+    running = False
+    await ticker_task
+
+    matched = sum(1 for i, result in enumerate(results) if result and result[0].endswith(f"ran say {i}"))  # Only its own output between its markers.
+    print(f"{count} concurrent commands: {elapsed:.2f}s, {matched} answered with own output, max event loop lag {max(lags) * 1000:.1f}ms")
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as path:
+        setup(path)
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
+        os._exit(0)  # Log tailer thread doesn't need to finish.
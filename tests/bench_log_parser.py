@@ -0,0 +1,30 @@
+"""
+Throughput benchmark for log_functions.parse_line() and categorize(), on a synthetic log of a few million lines
+where about 10% of lines are events (chat, join, death, leave) and the rest are ordinary server output, like a real latest.log.
+
+Usage:
+    python tests/bench_log_parser.py [lines]
+"""
+
+import random, time, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import log_functions
+
+plain = ['Preparing spawn area: 42%', "Saving chunks for level 'ServerLevel[world]'/minecraft:overworld", "Can't keep up! Is the server overloaded? Running 2043ms or 40 ticks behind",
+         'UUID of player Steve is 0123-4567', 'Loaded 7 recipes', 'Steve has made the advancement [Stone Age]', 'Steve issued server command: /home']
+events = ['<Steve> some chat message here', 'Steve joined the game', 'Alex was shot by Skeleton', 'Alex left the game']
+
+def make_log(count):
+    random.seed(1)
+    return [f"[12:{random.randrange(60):02d}:{random.randrange(60):02d}] [Server thread/INFO]: " + random.choice(events if random.random() < 0.1 else plain) for i in range(count)]
+
+def main(count):
+    lines = make_log(count)
+    for i in range(2):  # Second run is without warm up effects.
+        start = time.perf_counter()
+        for line in lines: log_functions.categorize(log_functions.parse_line(line))
+        elapsed = time.perf_counter() - start
+        print(f"parse_line + categorize, {count} lines: {elapsed:.2f}s, {count / elapsed / 1e6:.2f}M lines/s")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000)
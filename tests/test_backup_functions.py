@@ -0,0 +1,260 @@
+import unittest, tempfile, datetime, shutil, struct, os, sys
+from unittest import mock
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import backup_functions
+
+def write_region(file_path, chunks):
+    """
+    Writes region file the way Minecraft lays them out, each chunk starting on its own sector.
+
+    Args:
+        chunks dict: Chunk index: (timestamp, chunk data).
+    """
+
+    locations, timestamps, body = [0] * 1024, [0] * 1024, b''
+    for index, (timestamp, data) in sorted(chunks.items()):
+        data = struct.pack('>I', len(data)) + data
+        count = -(-len(data) // 4096)
+        locations[index] = (2 + len(body) // 4096) << 8 | count
+        timestamps[index] = timestamp
+        body += data + b'\0' * (count * 4096 - len(data))
+    with open(file_path, 'wb') as file:
+        file.write(struct.pack('>1024I', *locations) + struct.pack('>1024I', *timestamps) + body)
+
+def read_region(file_path):
+    """Returns region file's chunks as {index: (timestamp, chunk data)}, regardless of layout."""
+
+    chunks = {}
+    with open(file_path, 'rb') as file:
+        for index, offset, count, timestamp in backup_functions.read_region_header(file):
+            file.seek(offset * 4096)
+            length = struct.unpack('>I', file.read(4))[0]
+            chunks[index] = (timestamp, file.read(length))
+    return chunks
+
+def stored_objects(backups_path):
+    return {file for root, dirs, files in os.walk(backup_functions.objects_path(backups_path)) for file in files}
+
+
+class RegionBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.TemporaryDirectory()
+        self.addCleanup(self.path.cleanup)
+        self.world, self.backups = os.path.join(self.path.name, 'world'), os.path.join(self.path.name, 'backups')
+        os.makedirs(os.path.join(self.world, 'region'))
+        os.makedirs(self.backups)
+        self.region = os.path.join(self.world, 'region', 'r.0.0.mca')
+        self.chunks = {i: (1000 + i, b'\x02' + os.urandom(100 + i * 50)) for i in (0, 1, 5, 1023)}
+        self.chunks[7] = (1007, b'\x02' + os.urandom(9000))  # Spans several sectors.
+        write_region(self.region, self.chunks)
+
+    def restore(self, name):
+        dst = os.path.join(self.path.name, 'restore_' + name)
+        backup_functions.restore_incremental_backup(self.backups, name, dst)
+        return os.path.join(dst, 'region', 'r.0.0.mca')
+
+    def test_round_trip(self):
+        manifest = backup_functions.create_incremental_backup(self.world, self.backups, 'one')
+        entry = manifest['files'][os.path.join('region', 'r.0.0.mca')]
+        self.assertEqual(sorted(i[0] for i in entry['chunks']), sorted(self.chunks))
+        self.assertEqual(read_region(self.restore('one')), self.chunks)
+
+    def test_only_changed_chunks_stored(self):
+        backup_functions.create_incremental_backup(self.world, self.backups, 'one')
+        before = stored_objects(self.backups)
+
+        self.chunks[5] = (2005, b'\x02' + os.urandom(300))
+        write_region(self.region, self.chunks)
+        manifest = backup_functions.create_incremental_backup(self.world, self.backups, 'two')
+
+        self.assertEqual(len(stored_objects(self.backups) - before), 1)
+        self.assertEqual(manifest['stored_size'], 4 + 301)
+        self.assertEqual(read_region(self.restore('two')), self.chunks)
+
+    def test_same_chunk_data_stored_once(self):
+        self.chunks[1] = (1001, self.chunks[0][1])
+        write_region(self.region, self.chunks)
+        backup_functions.create_incremental_backup(self.world, self.backups, 'one')
+        self.assertEqual(len(stored_objects(self.backups)), len(self.chunks) - 1)
+
+    def test_garbage_collected_after_delete(self):
+        backup_functions.create_incremental_backup(self.world, self.backups, 'one')
+        old_chunk = backup_functions.read_manifest(backup_functions.manifest_path(self.backups, 'one'))['files'][os.path.join('region', 'r.0.0.mca')]['chunks']
+        self.chunks[5] = (2005, b'\x02' + os.urandom(300))
+        write_region(self.region, self.chunks)
+        backup_functions.create_incremental_backup(self.world, self.backups, 'two')
+
+        self.assertEqual(backup_functions.delete_incremental_backup(self.backups, 'one'), 1)  # Only old version of changed chunk.
+        self.assertNotIn([i for i in old_chunk if i[0] == 5][0][3], stored_objects(self.backups))
+        self.assertEqual(read_region(self.restore('two')), self.chunks)
+
+        backup_functions.delete_incremental_backup(self.backups, 'two')
+        self.assertEqual(stored_objects(self.backups), set())
+
+    def check_whole_file(self, data):
+        with open(self.region, 'wb') as file: file.write(data)
+        manifest = backup_functions.create_incremental_backup(self.world, self.backups, 'bad')
+        entry = manifest['files'][os.path.join('region', 'r.0.0.mca')]
+        self.assertIn('hash', entry)
+        self.assertNotIn('chunks', entry)
+        with open(self.restore('bad'), 'rb') as file: self.assertEqual(file.read(), data)
+
+    def test_short_header_stored_whole(self):
+        self.check_whole_file(b'\x00' * 100)
+
+    def test_empty_file_stored_whole(self):
+        self.check_whole_file(b'')
+
+    def test_bad_location_stored_whole(self):
+        with open(self.region, 'rb') as file: data = bytearray(file.read())
+        data[0:4] = struct.pack('>I', 500 << 8 | 1)  # Chunk 0 points past end of file.
+        self.check_whole_file(bytes(data))
+
+    def test_truncated_chunk_stored_whole(self):
+        write_region(self.region, {0: (1000, b'\x02' + os.urandom(9000))})
+        with open(self.region, 'rb') as file: data = bytearray(file.read(4096 * 3))  # Chunk's length needs 3 sectors, only 1 left.
+        data[0:4] = struct.pack('>I', 2 << 8 | 1)
+        self.check_whole_file(bytes(data))
+
+
+class TreeTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.TemporaryDirectory()
+        self.addCleanup(self.path.cleanup)
+        self.src, self.outside = os.path.join(self.path.name, 'src'), os.path.join(self.path.name, 'outside')
+        os.makedirs(os.path.join(self.outside, 'sub'))
+        with open(os.path.join(self.outside, 'sub', 'a.txt'), 'w') as file: file.write('a')
+        os.makedirs(os.path.join(self.src, 'folder'))
+        with open(os.path.join(self.src, 'level.dat'), 'w') as file: file.write('level')
+        os.symlink(self.outside, os.path.join(self.src, 'linked'))
+        os.symlink('/nonexistent/file', os.path.join(self.src, 'broken'))
+        os.symlink('..', os.path.join(self.src, 'folder', 'loop'))
+
+    def test_copy_follows_links(self):
+        dst = os.path.join(self.path.name, 'dst')
+        backup_functions.copy_tree(self.src, dst)
+        self.assertFalse(os.path.islink(os.path.join(dst, 'linked')))
+        with open(os.path.join(dst, 'linked', 'sub', 'a.txt')) as file: self.assertEqual(file.read(), 'a')
+        self.assertEqual(os.readlink(os.path.join(dst, 'broken')), '/nonexistent/file')
+        self.assertEqual(os.readlink(os.path.join(dst, 'folder', 'loop')), '..')
+
+    def test_remove_unlinks(self):
+        backup_functions.remove_tree(self.src)
+        self.assertFalse(os.path.lexists(self.src))
+        self.assertTrue(os.path.isfile(os.path.join(self.outside, 'sub', 'a.txt')))
+
+    def test_discard_failed_backup(self):
+        backups = os.path.join(self.path.name, 'backups')
+        backup_functions.create_incremental_backup(self.src, backups, 'good')
+        backup_functions.copy_tree(self.src, os.path.join(backups, 'partial'))
+        with open(os.path.join(backups, 'failed.tar.gz.tmp'), 'w'): pass
+        with open(os.path.join(self.src, 'level.dat'), 'w') as file: file.write('changed')
+        with open(os.path.join(backups, 'failed.json.tmp'), 'w'): pass
+        backup_functions.store_file(backups, os.path.join(self.src, 'level.dat'))  # Stored, but no manifest got written.
+        objects = len(stored_objects(backups))
+
+        backup_functions.discard_backup(backups, 'partial')
+        backup_functions.discard_backup(backups, 'failed')
+        self.assertEqual(backup_functions.list_backups(backups), ['good'])
+        self.assertEqual(len(stored_objects(backups)), objects - 1)
+        self.assertEqual(sorted(os.listdir(backups)), [backup_functions.objects_folder, 'good.json'])
+
+
+class FolderBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.TemporaryDirectory()
+        self.addCleanup(self.path.cleanup)
+        self.src, self.backups = os.path.join(self.path.name, 'src'), os.path.join(self.path.name, 'backups')
+        os.makedirs(self.src)
+        os.makedirs(self.backups)
+        for i in range(3):
+            with open(os.path.join(self.src, f"{i}.dat"), 'wb') as file: file.write(os.urandom(1000))
+
+    def test_reflink_reuses_hashes(self):
+        hashed = []
+        def hash_file(file_path):
+            hashed.append(os.path.basename(file_path))
+            return real_hash_file(file_path)
+
+        real_hash_file = backup_functions.hash_file
+        # Most filesystems can't reflink, a copy with same times behaves the same for hashing.
+        with mock.patch.object(backup_functions, 'clone_file', shutil.copy2), mock.patch.object(backup_functions, 'hash_file', hash_file):
+            backup_functions.create_folder_backup(self.src, self.backups, 'one', mode='reflink')
+            self.assertEqual(sorted(hashed), ['0.dat', '1.dat', '2.dat'])
+
+            hashed.clear()
+            with open(os.path.join(self.src, '1.dat'), 'wb') as file: file.write(os.urandom(1000))  # Same size, only mtime tells it changed.
+            os.utime(os.path.join(self.src, '1.dat'), ns=(0, os.stat(os.path.join(self.src, '1.dat')).st_mtime_ns + 1))
+            os.utime(os.path.join(self.backups, 'one'), (0, 0))  # So 'two' is found as latest, even within same mtime tick.
+            backup_functions.create_folder_backup(self.src, self.backups, 'two', mode='reflink')
+            self.assertEqual(hashed, ['1.dat'])
+
+        self.assertEqual(backup_functions.verify_backup(self.backups, 'two')['corrupt'], [])
+
+
+def catalog_rows(count, hours=6, stored_size=100):
+    """Catalog rows b0 (newest, 2024-01-31 18:00) to b<count - 1>, one every x hours."""
+
+    newest = datetime.datetime(2024, 1, 31, 18)
+    return [{'name': f"b{i}", 'created': (newest - datetime.timedelta(hours=hours * i)).isoformat(timespec='seconds'), 'stored_size': stored_size, 'tags': None}
+            for i in range(count)]
+
+def names(rows): return [i['name'] for i in rows]
+
+
+class PruneTest(unittest.TestCase):
+    def test_keep_last(self):
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(5), keep_last=2)), ['b4', 'b3', 'b2'])
+
+    def test_grandfather_father_son(self):
+        # 4 backups a day, newest of each of last 2 days, and of last 3 hours.
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(12), keep_last=1, daily=2)), ['b11', 'b10', 'b9', 'b8', 'b7', 'b6', 'b5', 'b3', 'b2', 'b1'])
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(6), keep_last=0, hourly=3)), ['b5', 'b4', 'b3'])
+        # Every 10 days from Jan 31 back: b0-b3 in January, b4-b6 in December, b7 and b8 in November.
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(9, 240), keep_last=0, monthly=2)), ['b8', 'b7', 'b6', 'b5', 'b3', 'b2', 'b1'])
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(9, 240), keep_last=0, weekly=2)), ['b8', 'b7', 'b6', 'b5', 'b4', 'b3', 'b2'])
+
+    def test_protected_and_unknown_age_kept(self):
+        rows = catalog_rows(5)
+        rows[4]['tags'] = 'keep,old'
+        rows[3]['created'] = None
+        self.assertEqual(names(backup_functions.select_prune(rows, keep_last=1, protected_tags=['keep'])), ['b2', 'b1'])
+        self.assertEqual(names(backup_functions.select_prune(rows, keep_last=1, max_size=150, protected_tags=['keep'])), ['b2', 'b1'])
+
+    def test_size_cap(self):
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(5), keep_last=5, max_size=250)), ['b4', 'b3', 'b2'])
+        self.assertEqual(names(backup_functions.select_prune(catalog_rows(5), keep_last=5, max_size=50)), ['b4', 'b3', 'b2', 'b1'])  # Newest is always kept.
+
+        rows = catalog_rows(5)
+        rows[4]['tags'] = 'keep'  # Counts towards size, but can't be pruned.
+        self.assertEqual(names(backup_functions.select_prune(rows, keep_last=5, max_size=250, protected_tags=['keep'])), ['b3', 'b2'])
+
+    def test_size_cap_shared_objects(self):
+        # Oldest incremental backup stored the whole world, newer ones only their changes, but all of them use the world's objects.
+        rows = catalog_rows(4, stored_size=10)
+        rows[3]['stored_size'] = 1010
+        objects = {f"b{i}": {'world': 1000, f"change{i}": 10} for i in range(4)}
+        self.assertEqual(names(backup_functions.select_prune(rows, keep_last=4, max_size=1025)), ['b3'])  # Store would still be 1030.
+        self.assertEqual(names(backup_functions.select_prune(rows, keep_last=4, max_size=1025, objects=objects)), ['b3', 'b2'])
+
+    def test_prune_backups(self):
+        with tempfile.TemporaryDirectory() as path:
+            src, backups = os.path.join(path, 'src'), os.path.join(path, 'backups')
+            os.makedirs(src)
+            for i in range(3):
+                with open(os.path.join(src, 'world.dat'), 'wb') as file: file.write(os.urandom(1000))
+                with open(os.path.join(src, f"file{i}.dat"), 'wb') as file: file.write(os.urandom(100))
+                backup_functions.create_incremental_backup(src, backups, f"inc{i}")
+            backup_functions.create_archive_backup(src, backups, 'archive', compression='gzip')
+
+            objects = backup_functions.incremental_objects(backups)
+            self.assertEqual(sorted(objects), ['inc0', 'inc1', 'inc2'])
+            self.assertEqual(sum(objects['inc2'].values()), 1300)
+
+            self.assertEqual(backup_functions.prune_backups(backups, ['inc0', 'archive']), ['inc0', 'archive'])
+            self.assertEqual(sorted(backup_functions.list_backups(backups)), ['inc1', 'inc2'])
+            self.assertEqual(stored_objects(backups), set(objects['inc1']) | set(objects['inc2']))  # Only inc0's world.dat got collected.
+
+
+if __name__ == '__main__':
+    unittest.main()
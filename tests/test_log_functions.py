@@ -0,0 +1,85 @@
+import unittest, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import log_functions
+
+def line(message, thread='Server thread', level='INFO'):
+    return f"[12:34:56] [{thread}/{level}]: {message}"
+
+
+class ParseLineTest(unittest.TestCase):
+    def check(self, text, kind, **fields):
+        event = log_functions.parse_line(text)
+        self.assertEqual(event.kind, kind)
+        for name, value in fields.items(): self.assertEqual(getattr(event, name), value, name)
+        return event
+
+    def test_header(self):
+        event = self.check(line('Loaded 7 recipes'), 'line', time='12:34:56', thread='Server thread', level='INFO', source=None, message='Loaded 7 recipes')
+        self.assertEqual(log_functions.categorize(event), [])
+
+        # Forge has logger name after level, console output has shorter header.
+        self.check('[23Mar2024 12:34:56.789] [Server thread/WARN] [net.minecraft.server.MinecraftServer/]: Can\'t keep up!', 'line',
+                   time='23Mar2024 12:34:56.789', level='WARN', source='net.minecraft.server.MinecraftServer/', message="Can't keep up!")
+        self.check('[12:34:56 INFO]: Steve joined the game', 'join', time='12:34:56', thread=None, level='INFO', player='Steve')
+
+    def test_no_header(self):
+        event = self.check('\tat java.lang.Thread.run(Thread.java:833)', 'line', time=None, level=None)
+        self.assertEqual(event.message, event.text)
+
+    def test_ansi_removed(self):
+        event = self.check('\x1b[32m' + line('<Steve> hi') + '\x1b[0m', 'chat', player='Steve', chat='hi')
+        self.assertEqual(event.text, line('<Steve> hi'))
+
+    def test_chat(self):
+        event = self.check(line('<Steve> hello: there <3'), 'chat', player='Steve', chat='hello: there <3')
+        self.assertEqual(log_functions.categorize(event), ['chat'])
+        self.check(line('[Not Secure] <Alex> unsigned', 'Async Chat Thread - #0'), 'chat', player='Alex', chat='unsigned', thread='Async Chat Thread - #0')
+
+    def test_join_leave(self):
+        self.assertEqual(log_functions.categorize(self.check(line('Steve joined the game'), 'join', player='Steve')), ['join'])
+        self.check(line('Steve left the game'), 'leave', player='Steve', reason=None)
+        self.check(line('Alex lost connection: Timed out'), 'leave', player='Alex', reason='Timed out')
+        self.check(line('Kicked Alex: Flying is not enabled'), 'kick', player='Alex', reason='Flying is not enabled')
+        self.check(line('Steve joined the game with a friend'), 'line')
+
+    def test_advancement(self):
+        # Not an event of its own, but mustn't be mistaken for chat or death.
+        for message in ['Steve has made the advancement [Stone Age]', 'Steve has completed the challenge [Monster Hunter]', 'Steve has reached the goal [Sky\'s the Limit]']:
+            event = self.check(line(message), 'line', message=message)
+            self.assertEqual(log_functions.categorize(event), [])
+
+    def test_death(self):
+        self.check(line('Alex was shot by Skeleton'), 'death', player='Alex')
+        self.check(line('Steve fell from a high place'), 'death', player='Steve')
+
+    def test_ban(self):
+        event = self.check(line('Banned Griefer: Destroying spawn'), 'ban', player='Griefer', banner='Server', reason='Destroying spawn')
+        self.assertEqual(log_functions.categorize(event), ['ban'])
+        self.check(line('Griefer was banned by Steve: Destroying spawn'), 'ban', player='Griefer', banner='Steve', reason='Destroying spawn')
+        self.check(line('Unbanned Griefer'), 'pardon', player='Griefer')
+        self.check(line('There are 2 bans:'), 'bancount', count=2)
+        self.check(line('There are no bans'), 'bancount', count=0)
+
+    def test_whitelist(self):
+        self.check(line('There are 2 whitelisted players: Steve, Alex'), 'whitelist', count=2, players=['Steve', 'Alex'])
+        self.check(line('There are no whitelisted players'), 'whitelist', count=0, players=[])
+
+    def test_player_list(self):
+        self.check(line('There are 2 of a max of 20 players online: Steve, Alex'), 'players', online=2, max=20, players=['Steve', 'Alex'])
+        self.check(line('There are 0 out of maximum 20 players online.'), 'players', online=0, max=20, players=[])
+
+    def test_perf(self):
+        self.check(line('TPS from last 1m, 5m, 15m: *20.0, 19.98, 19.97'), 'perf', tps=20.0, mspt=None)
+        self.check(line('◴ 12.3/5.1/40.2, 11.0/4.0/50.1, 10.5/3.9/60.0'), 'perf', tps=None, mspt=12.3)
+        self.check(line('Overall: Mean tick time: 8.123 ms. Mean TPS: 20.000'), 'perf', tps=20.0, mspt=8.123)
+
+    def test_start_stop(self):
+        self.check(line('Done (12.345s)! For help, type "help"'), 'start', seconds=12.345)
+        self.check(line('Stopping the server'), 'stop')
+
+    def test_warning_category(self):
+        self.assertEqual(log_functions.categorize(log_functions.parse_line(line('Steve joined the game', level='WARN'))), ['warning', 'join'])
+
+
+if __name__ == '__main__':
+    unittest.main()
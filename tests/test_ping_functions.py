@@ -0,0 +1,102 @@
+import asyncio, unittest, socket, struct, json, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import ping_functions
+
+# Stand-in Minecraft servers answering Server List Ping, one asyncio server per behavior.
+status = {'version': {'name': '§6Paper 1.16.5', 'protocol': 754},
+          'players': {'online': 2, 'max': 20, 'sample': [{'name': 'Steve', 'id': '0'}, {'name': 'Alex', 'id': '1'}]},
+          'description': {'text': '§aHello ', 'extra': [{'text': 'World'}, '§r!']}}
+
+def make_handler(mode):
+    """
+    Args:
+        mode str: 'full' (status and pong), 'nopong' (closes after status), 'legacy' (only answers pre-1.7 ping), 'silent' (never answers).
+    """
+
+    async def handle(reader, writer):
+        try:
+            if mode == 'silent':
+                await asyncio.sleep(10)
+                return
+            first = await reader.readexactly(1)
+            if first == b'\xfe':  # Legacy ping.
+                await reader.readexactly(1)
+                text = '§1\x00127\x001.6.4\x00Legacy MOTD\x003\x0010'.encode('utf-16-be')
+                writer.write(b'\xff' + struct.pack('>H', len(text) // 2) + text)
+                await writer.drain()
+                return
+            if mode == 'legacy': return  # Old servers drop modern handshake.
+
+            await reader.readexactly(first[0])  # Rest of handshake, short enough for 1 byte length.
+            await ping_functions.read_varint(reader)  # Status request.
+            await reader.readexactly(1)
+            writer.write(ping_functions.pack_packet(0x00, ping_functions.pack_string(json.dumps(status))))
+            await writer.drain()
+            if mode == 'nopong': return
+
+            length = await ping_functions.read_varint(reader)
+            data = await reader.readexactly(length)
+            writer.write(ping_functions.pack_packet(0x01, data[1:]))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally: writer.close()
+    return handle
+
+def closed_port():
+    """Port nothing is listening on."""
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PingTest(unittest.IsolatedAsyncioTestCase):
+    async def serve(self, mode):
+        server = await asyncio.start_server(make_handler(mode), '127.0.0.1', 0)
+        self.addAsyncCleanup(self.close_server, server)
+        return server.sockets[0].getsockname()[1]
+
+    async def close_server(self, server):
+        server.close()
+        await server.wait_closed()
+
+    async def test_full_protocol(self):
+        result = await ping_functions.ping('127.0.0.1', await self.serve('full'), timeout=2)
+        self.assertEqual(result['version'], {'name': 'Paper 1.16.5', 'protocol': 754})
+        self.assertEqual(result['players'], {'online': 2, 'max': 20, 'sample': ['Steve', 'Alex']})
+        self.assertEqual(result['description'], 'Hello World!')
+        self.assertFalse(result['legacy'])
+        self.assertGreaterEqual(result['latency'], 0)
+
+    async def test_no_pong(self):
+        # Status round trip is used for latency instead.
+        result = await ping_functions.ping('127.0.0.1', await self.serve('nopong'), timeout=2)
+        self.assertEqual(result['players']['online'], 2)
+        self.assertFalse(result['legacy'])
+
+    async def test_legacy_only(self):
+        port = await self.serve('legacy')
+        result = await ping_functions.ping('127.0.0.1', port, timeout=2)
+        self.assertEqual(result['version'], {'name': '1.6.4', 'protocol': 127})
+        self.assertEqual(result['players'], {'online': 3, 'max': 10, 'sample': []})
+        self.assertEqual(result['description'], 'Legacy MOTD')
+        self.assertTrue(result['legacy'])
+        self.assertIsNone(await ping_functions.ping('127.0.0.1', port, timeout=2, legacy=False))
+
+    async def test_silent(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertIsNone(await ping_functions.ping('127.0.0.1', await self.serve('silent'), timeout=0.2))
+        self.assertLess(loop.time() - start, 2)  # Timeout applies to each attempt, normal and legacy.
+
+    async def test_connection_refused(self):
+        self.assertIsNone(await ping_functions.ping('127.0.0.1', closed_port(), timeout=2))
+
+    async def test_ping_all(self):
+        ports = [await self.serve('full'), await self.serve('legacy'), closed_port()]
+        results = await ping_functions.ping_all([('127.0.0.1', port) for port in ports], timeout=2)
+        self.assertEqual([None if i is None else i['legacy'] for i in results], [False, True, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
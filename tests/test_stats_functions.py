@@ -0,0 +1,41 @@
+import unittest, tempfile, datetime, time, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import stats_functions
+
+def utc(*args): return datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp()
+
+
+class TimeSeriesTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.TemporaryDirectory()
+        self.addCleanup(self.path.cleanup)
+
+    def series(self, name, **kwargs): return stats_functions.TimeSeries(os.path.join(self.path.name, name), **kwargs)
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "Needs time.tzset() to change time zone.")
+    def test_daylight_saving_time(self):
+        old = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+        self.addCleanup(time.tzset)
+        self.addCleanup(lambda: os.environ.pop('TZ') if old is None else os.environ.update(TZ=old))
+
+        # 01:00-02:00 local happens twice on 2024-11-03, one minute samples through both of them.
+        series, start = self.series('players'), utc(2024, 11, 3, 5)
+        for minute in range(120): series.add(minute % 10, start + minute * 60)
+        self.assertEqual(len(series.values(start, start + 119 * 60)), 120)
+        self.assertEqual([moment.hour for moment, *values in series.hours(start, start + 119 * 60)], [1, 1])
+
+    def test_downsampled_average_not_clamped(self):
+        series = self.series('mspt', scale=10)
+        for minute in range(60): series.add(900 + minute * 0.5, utc(2024, 1, 1, 12, minute))
+        series.downsample(datetime.date(2024, 3, 1))
+
+        self.assertEqual(series.read_day(datetime.date(2024, 1, 1)), None)  # Only in year file now.
+        (moment, low, high, average), = series.hours(utc(2024, 1, 1), utc(2024, 1, 2))
+        self.assertEqual((low, high), (900, 929.5))
+        self.assertAlmostEqual(average, 914.75, places=1)
+
+
+if __name__ == '__main__':
+    unittest.main()